@@ -0,0 +1,82 @@
+"""
+Requests per second for GET /api/contacts/all and GET /api/contacts/{contact_id} when the client has no copy (200)
+and when it sends back the ETag of a current copy (304, no database query, nothing serialized).
+
+The app is driven in-process over ASGI against a throwaway SQLite database and an in-memory fake Redis.
+
+Run from the project root::
+
+    python -m benchmarks.bench_conditional_get --contacts 200 --requests 500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date
+
+from benchmarks import env  # noqa: F401
+
+
+async def run(args) -> None:
+    import fakeredis
+    import fakeredis.aioredis
+    import httpx
+
+    from main import app
+    from src.database.connect import engine, SessionLocal
+    from src.database.models import Base, User
+    from src.repository.contacts import create_contacts
+    from src.schemas import ContactModel
+    from src.services.auth import auth_service
+    from src.services.cache import user_cache, contact_versions
+    from src.services.rate_limit import rate_limiter
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    redis = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True,
+                                         single_connection_client=True)
+    user_cache.redis = redis
+    contact_versions.redis = redis
+    rate_limiter.enabled = False
+
+    async with SessionLocal() as db:
+        user = User(username="bench", email="bench@example.com", password="x", confirmed=True)
+        db.add(user)
+        await db.commit()
+        await create_contacts([ContactModel(first_name=f"Name{number}", last_name=f"Bench{number}",
+                                            email=f"contact{number}@example.com", phone=f"+{number:012d}",
+                                            birthday=date(1990, 1, 1), additional_info="bench")
+                               for number in range(args.contacts)], user, db)
+    token = await auth_service.create_access_token(data={"sub": user.email})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        for label, url in (("all", f"/api/contacts/all?limit={args.contacts}"), ("contact", "/api/contacts/1")):
+            etag = (await client.get(url, headers=headers)).headers["ETag"]
+            for status, request_headers in ((200, headers), (304, {**headers, "If-None-Match": etag})):
+                start = time.perf_counter()
+                for _ in range(args.requests):
+                    response = await client.get(url, headers=request_headers)
+                    assert response.status_code == status, response.status_code
+                elapsed = time.perf_counter() - start
+                print(f"{label:<8} {status}  {args.requests / elapsed:>8.1f} req/s  "
+                      f"{elapsed / args.requests * 1000:>6.2f}ms per request")
+
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=200, help="contacts of the user, all on one page")
+    parser.add_argument("--requests", type=int, default=500, help="requests per case")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
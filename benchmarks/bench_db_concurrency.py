@@ -0,0 +1,99 @@
+"""
+Concurrent-request throughput of an ``async def`` handler backed by a blocking ``Session``
+(the old ``get_db``) versus one backed by an ``AsyncSession`` (the current ``get_db``).
+
+Every query waits ``--latency`` ms inside the database (a ``db_sleep()`` SQL function) to stand in for
+a Postgres round-trip: the blocking variant serialises those waits on the event loop, the async one
+overlaps them.
+
+Run from the project root::
+
+    python -m benchmarks.bench_db_concurrency --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI, Depends
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+QUERY = text("SELECT db_sleep(:ms)")
+
+
+def _register_sleep(dbapi_connection, connection_record):
+    dbapi_connection.create_function("db_sleep", 1, lambda ms: time.sleep(ms / 1000) or 1)
+
+
+def build_app(path: str, latency: float, pool_size: int) -> FastAPI:
+    sync_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False},
+                                pool_size=pool_size)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=pool_size)
+    event.listen(sync_engine, "connect", _register_sleep)
+    event.listen(async_engine.sync_engine, "connect", _register_sleep)
+    sync_session = sessionmaker(bind=sync_engine)
+    async_session = async_sessionmaker(bind=async_engine, class_=AsyncSession)
+
+    def get_sync_db():
+        db = sync_session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with async_session() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/sync")
+    async def sync_route(db: Session = Depends(get_sync_db)):
+        return {"result": db.execute(QUERY, {"ms": latency}).scalar()}
+
+    @app.get("/async")
+    async def async_route(db: AsyncSession = Depends(get_async_db)):
+        return {"result": (await db.execute(QUERY, {"ms": latency})).scalar()}
+
+    app.state.async_engine = async_engine
+    return app
+
+
+async def run(app: FastAPI, url: str, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                response = await client.get(url)
+                response.raise_for_status()
+
+        await client.get(url)
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+    await app.state.async_engine.dispose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=20, help="simulated per-query database latency, ms")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(os.path.join(tmp, "bench.db"), args.latency, args.concurrency)
+        for url in ("/sync", "/async"):
+            elapsed = asyncio.run(run(app, url, args.requests, args.concurrency))
+            print(f"{url:<7} {args.requests} requests, concurrency {args.concurrency}: "
+                  f"{elapsed:.2f}s, {args.requests / elapsed:.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
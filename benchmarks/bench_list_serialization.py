@@ -0,0 +1,91 @@
+"""
+Time to load and serialize a list of contacts the way the list routes did before (Contact objects validated
+through List[ContactResponse] and encoded with the json module) and the way they do now (plain rows
+turned into dictionaries by contact_dicts and encoded with orjson), at 1k, 10k and 100k contacts.
+
+Both variants read from the same throwaway SQLite database, and their response bodies are checked to be equal.
+
+Run from the project root::
+
+    python -m benchmarks.bench_list_serialization --sizes 1000 10000 100000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date
+from typing import List
+
+from benchmarks import env  # noqa: F401
+
+
+async def run(args) -> None:
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    from sqlalchemy import select
+
+    from src.database.connect import engine, SessionLocal
+    from src.database.models import Base, Contact, User
+    from src.repository.contacts import create_contacts
+    from src.schemas import ContactModel, ContactResponse
+    from src.services.export import EXPORT_FIELDS, contact_dicts
+
+    field = create_response_field(name="bench", type_=List[ContactResponse])
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as db:
+        user = User(username="bench", email="bench@example.com", password="x", confirmed=True)
+        db.add(user)
+        await db.commit()
+        total = max(args.sizes)
+        for start in range(0, total, 5000):
+            await create_contacts([ContactModel(first_name=f"Name{number}", last_name=f"Bench{number}",
+                                                email=f"contact{number}@example.com", phone=f"+{number:012d}",
+                                                birthday=date(1990, 1, 1), additional_info="bench")
+                                   for number in range(start, min(start + 5000, total))], user, db)
+
+    print(f"{'contacts':>9} {'model ms':>10} {'orjson ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        timings = {}
+        bodies = {}
+        for label in ("model", "orjson"):
+            best = float("inf")
+            for _ in range(args.repeat):
+                async with SessionLocal() as db:
+                    start = time.perf_counter()
+                    if label == "model":
+                        contacts = (await db.execute(select(Contact).where(Contact.user_id == user.id)
+                                                     .order_by(Contact.id).limit(size))).scalars().all()
+                        content = await serialize_response(field=field, response_content=contacts)
+                        body = JSONResponse(content).body
+                    else:
+                        rows = (await db.execute(select(*(getattr(Contact, name) for name in EXPORT_FIELDS))
+                                                 .where(Contact.user_id == user.id)
+                                                 .order_by(Contact.id).limit(size))).all()
+                        body = ORJSONResponse(contact_dicts(rows)).body
+                    best = min(best, time.perf_counter() - start)
+            timings[label] = best
+            bodies[label] = body
+        assert bodies["model"] == bodies["orjson"]
+        print(f"{size:>9} {timings['model'] * 1000:>10.1f} {timings['orjson'] * 1000:>10.1f} "
+              f"{timings['model'] / timings['orjson']:>7.1f}x")
+
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="contacts per response")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the best one is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Per-request overhead of the request timing middleware on GET /: a bare app, the previous
+@app.middleware("http") implementation (BaseHTTPMiddleware) and the ASGI TimingMiddleware.
+
+Each app is called directly over ASGI, without a server or an HTTP client, so the difference between
+the rows is the middleware itself.
+
+Run from the project root::
+
+    python -m benchmarks.bench_middleware --requests 20000
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks import env  # noqa: F401
+
+
+def build_apps() -> dict:
+    from fastapi import FastAPI, Request
+
+    from src.services import metrics
+
+    def read_root():
+        return {"message": "REST APP v-1.0"}
+
+    def make_app() -> FastAPI:
+        app = FastAPI()
+        app.get("/")(read_root)
+        return app
+
+    bare = make_app()
+
+    base_http = make_app()
+
+    @base_http.middleware("http")
+    async def add_process_time_header(request: Request, call_next):
+        stats = metrics.start_request()
+        metrics.IN_FLIGHT.inc()
+        start = time.perf_counter_ns()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            metrics.IN_FLIGHT.dec()
+            metrics.observe_request(request.method, metrics.route_label(request.scope), status_code, elapsed, stats)
+        response.headers["My-Process-Time"] = str(elapsed / 1e9)
+        response.headers["Server-Timing"] = metrics.server_timing(stats, elapsed)
+        return response
+
+    asgi = make_app()
+    asgi.add_middleware(metrics.TimingMiddleware)
+
+    return {"none": bare, "BaseHTTPMiddleware": base_http, "TimingMiddleware": asgi}
+
+
+async def call(app) -> int:
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+             "path": "/", "raw_path": b"/", "root_path": "", "query_string": b"", "headers": [],
+             "client": ("127.0.0.1", 1234), "server": ("bench", 80)}
+    status_code = 0
+    messages = [{"type": "http.disconnect"}, {"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        return messages.pop() if len(messages) > 1 else messages[0]
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    await app(scope, receive, send)
+    return status_code
+
+
+async def run(args) -> None:
+    apps = build_apps()
+    baseline = None
+    for label, app in apps.items():
+        for _ in range(args.requests // 10):
+            await call(app)
+        start = time.perf_counter_ns()
+        for _ in range(args.requests):
+            assert await call(app) == 200
+        per_request = (time.perf_counter_ns() - start) / args.requests / 1000
+        if baseline is None:
+            baseline = per_request
+        print(f"{label:<20} {per_request:>8.1f}us per request  overhead {per_request - baseline:>7.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000, help="requests per app")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Login latency (from the moment the whole burst is sent) during a burst of logins, with bcrypt verification run inline on the event loop
+(the old Auth.verify_password) versus on the PasswordHashPool (the current one), and how a cheap
+non-auth route (/ping, polled every 5ms) is answered while the burst is in progress.
+
+Run from the project root::
+
+    python -m benchmarks.bench_password_hashing --logins 40 --workers 4
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+from passlib.context import CryptContext
+
+from src.services.hashing import PasswordHashPool
+
+
+def percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, round(pct / 100 * (len(values) - 1)))]
+
+
+def build_app(workers: int, max_queue: int) -> FastAPI:
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    hashed = pwd_context.hash("123456789")
+    pool = PasswordHashPool(workers, max_queue)
+    app = FastAPI()
+
+    @app.post("/inline")
+    async def inline():
+        return {"ok": pwd_context.verify("123456789", hashed)}
+
+    @app.post("/pool")
+    async def pooled():
+        return {"ok": await pool.run(pwd_context.verify, "123456789", hashed)}
+
+    @app.get("/ping")
+    async def ping():
+        return {}
+
+    return app
+
+
+async def timed_request(client: httpx.AsyncClient, method: str, url: str, sent_at: float) -> float:
+    response = await client.request(method, url)
+    response.raise_for_status()
+    return time.perf_counter() - sent_at
+
+
+async def run(app: FastAPI, url: str, logins: int):
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        await client.post(url)
+        done = asyncio.Event()
+        pings = []
+
+        async def pinger():
+            while not done.is_set():
+                await timed_request(client, "GET", "/ping", time.perf_counter())
+                pings.append(time.perf_counter())
+                await asyncio.sleep(0.005)
+
+        ping_task = asyncio.create_task(pinger())
+        await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(timed_request(client, "POST", url, start) for _ in range(logins)))
+        end = time.perf_counter()
+        done.set()
+        await ping_task
+    answered = [start] + [at for at in pings if start < at < end] + [end]
+    longest_gap = max(later - earlier for earlier, later in zip(answered, answered[1:]))
+    return end - start, latencies, len(answered) - 2, longest_gap
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=40, help="concurrent logins in the burst")
+    parser.add_argument("--workers", type=int, default=4, help="password hashing threads")
+    args = parser.parse_args()
+
+    app = build_app(args.workers, args.logins)
+    for url in ("/inline", "/pool"):
+        elapsed, latencies, pings, longest_gap = asyncio.run(run(app, url, args.logins))
+        ms = [value * 1000 for value in latencies]
+        print(f"{url:<7} {args.logins} logins in {elapsed:.2f}s | login p50 {statistics.median(ms):.0f}ms "
+              f"p99 {percentile(ms, 99):.0f}ms | /ping answered {pings} times during the burst, "
+              f"longest gap {longest_gap * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Cost of the local rate limiter: one limit check on the request path, and one sync of all buckets with Redis
+(an in-memory fake Redis, so the sync time excludes the network round trip).
+
+Run from the project root::
+
+    python -m benchmarks.bench_rate_limit --users 1000 --checks 1000000
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks import env  # noqa: F401
+from src.services.rate_limit import RateLimitEngine
+
+
+def bench_checks(engine: RateLimitEngine, users: int, checks: int) -> float:
+    keys = [str(user) for user in range(users)]
+    acquire = engine.acquire
+    start = time.perf_counter_ns()
+    for number in range(checks):
+        acquire("/api/contacts/all", keys[number % users], 10, 60)
+    return (time.perf_counter_ns() - start) / checks
+
+
+async def bench_sync(users: int, checks: int, rounds: int) -> float:
+    import fakeredis
+    import fakeredis.aioredis
+
+    engine = RateLimitEngine(fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer()))
+    bench_checks(engine, users, checks)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await engine.sync()
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="distinct users, one bucket each")
+    parser.add_argument("--checks", type=int, default=1_000_000)
+    parser.add_argument("--rounds", type=int, default=10, help="syncs to time")
+    args = parser.parse_args()
+
+    engine = RateLimitEngine()
+    bench_checks(engine, args.users, args.users)
+    print(f"check  {bench_checks(engine, args.users, args.checks):>10.0f}ns per call")
+    print(f"sync   {asyncio.run(bench_sync(args.users, args.users, args.rounds)) * 1000:>10.2f}ms "
+          f"per sync of {args.users} buckets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""
+Placeholder settings so that benchmarks can import config without a .env file.
+Import this module before anything that imports config; real environment variables still win.
+"""
+import os
+
+for name, value in {
+    "SQLALCHEMY_DATABASE_URL": "sqlite+aiosqlite:///./bench.db",
+    "SECRET_KEY": "benchmark-secret",
+    "ALGORITHM": "HS256",
+    "MAIL_USERNAME": "bench@example.com",
+    "MAIL_PASSWORD": "password",
+    "MAIL_FROM": "bench@example.com",
+    "MAIL_PORT": "465",
+    "MAIL_SERVER": "localhost",
+    "CLOUDINARY_NAME": "bench",
+    "CLOUDINARY_API_KEY": "bench",
+    "CLOUDINARY_API_SECRET": "bench",
+}.items():
+    os.environ.setdefault(name, value)
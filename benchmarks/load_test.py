@@ -0,0 +1,245 @@
+"""
+End-to-end HTTP load test of main.app.
+
+The app is driven in-process over ASGI against a throwaway SQLite database (or the database given with --url)
+and an in-memory fake Redis, so no services need to be running. Every virtual user signs up, confirms its email,
+logs in and refreshes its token, then repeatedly creates, lists, reads, updates, searches and deletes contacts.
+The RateLimit dependency still runs on every contact route, but rate_limiter is disabled, so no request is counted
+or rejected. Confirmation emails are only added to the outbox, as no outbox worker runs.
+
+Throughput and p50/p95/p99 latency per route are printed and written to --output as JSON. Passing the JSON of an
+earlier run with --compare prints the change per route and exits with status 1 if any p95 got worse by more than
+--threshold percent.
+
+Run from the project root::
+
+    python -m benchmarks.load_test --users 20 --iterations 5 --output load_test.json
+    python -m benchmarks.load_test --users 20 --iterations 5 --compare load_test.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, timedelta
+
+from benchmarks import env  # noqa: F401
+
+ROUTES = [
+    "POST /api/auth/signup",
+    "GET /api/auth/confirmed_email/{token}",
+    "POST /api/auth/login",
+    "GET /api/auth/refresh_token",
+    "POST /api/contacts/create",
+    "GET /api/contacts/all",
+    "GET /api/contacts/{contact_id}",
+    "PUT /api/contacts/update/{contact_id}",
+    "GET /api/contacts/search_field{field_to_search}",
+    "GET /api/contacts/birthday_search",
+    "DELETE /api/contacts/delete/{contact_id}",
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, round(pct / 100 * (len(values) - 1)))]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client, route: str, method: str, url: str, expected: int = 200, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[route].append(time.perf_counter() - start)
+        if response.status_code != expected:
+            self.errors[route] += 1
+        return response
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for route in ROUTES:
+            values = self.latencies.get(route)
+            if not values:
+                continue
+            ms = [value * 1000 for value in values]
+            routes[route] = {
+                "count": len(values),
+                "errors": self.errors[route],
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "mean_ms": round(sum(ms) / len(ms), 2),
+                "p50_ms": round(percentile(ms, 50), 2),
+                "p95_ms": round(percentile(ms, 95), 2),
+                "p99_ms": round(percentile(ms, 99), 2),
+            }
+        return routes
+
+
+async def virtual_user(client, recorder: Recorder, number: int, run_id: str, iterations: int, contacts: int):
+    from src.services.auth import auth_service
+
+    email = f"load{number}-{run_id}@example.com"
+    password = "12345678"
+    await recorder.call(client, "POST /api/auth/signup", "POST", "/api/auth/signup", 201,
+                        json={"username": f"load{number:07d}", "email": email, "password": password})
+    token = auth_service.create_email_token({"sub": email})
+    await recorder.call(client, "GET /api/auth/confirmed_email/{token}", "GET", f"/api/auth/confirmed_email/{token}")
+    response = await recorder.call(client, "POST /api/auth/login", "POST", "/api/auth/login",
+                                   data={"username": email, "password": password})
+    tokens = response.json()
+    response = await recorder.call(client, "GET /api/auth/refresh_token", "GET", "/api/auth/refresh_token",
+                                   headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    today = date.today()
+    for iteration in range(iterations):
+        ids = []
+        for index in range(contacts):
+            serial = (number * iterations + iteration) * contacts + index
+            body = {"first_name": f"Name{index}", "last_name": f"Load{serial}",
+                    "email": f"contact{serial}-{run_id}@example.com", "phone": f"+{serial:012d}",
+                    "birthday": (today + timedelta(days=index % 10)).replace(year=1990).isoformat(),
+                    "additional_info": "load test contact"}
+            response = await recorder.call(client, "POST /api/contacts/create", "POST", "/api/contacts/create", 201,
+                                           json=body, headers=headers)
+            if response.status_code == 201:
+                ids.append(response.json()["id"])
+
+        cursor = None
+        while True:
+            params = {"limit": 50} if cursor is None else {"limit": 50, "cursor": cursor}
+            response = await recorder.call(client, "GET /api/contacts/all", "GET", "/api/contacts/all",
+                                           params=params, headers=headers)
+            cursor = response.json().get("next_cursor") if response.status_code == 200 else None
+            if cursor is None:
+                break
+
+        for contact_id in ids[:3]:
+            await recorder.call(client, "GET /api/contacts/{contact_id}", "GET", f"/api/contacts/{contact_id}",
+                                headers=headers)
+        if ids:
+            await recorder.call(client, "PUT /api/contacts/update/{contact_id}", "PUT",
+                                f"/api/contacts/update/{ids[0]}", headers=headers,
+                                json={"first_name": "Updated", "last_name": f"Load{number}",
+                                      "email": f"updated{number}-{iteration}-{run_id}@example.com",
+                                      "phone": f"+9{number:05d}{iteration:05d}", "birthday": "1990-01-01",
+                                      "additional_info": "updated by the load test"})
+        await recorder.call(client, "GET /api/contacts/search_field{field_to_search}", "GET",
+                            "/api/contacts/search_field_", params={"part_to_search": "name1"}, headers=headers)
+        await recorder.call(client, "GET /api/contacts/birthday_search", "GET", "/api/contacts/birthday_search",
+                            headers=headers)
+        for contact_id in ids[contacts // 2:]:
+            await recorder.call(client, "DELETE /api/contacts/delete/{contact_id}", "DELETE",
+                                f"/api/contacts/delete/{contact_id}", 204, headers=headers)
+
+
+async def run(args) -> dict:
+    import fakeredis
+    import fakeredis.aioredis
+    import httpx
+
+    from main import app
+    from src.database.connect import engine
+    from src.database.models import Base
+    from src.services.cache import user_cache
+    from src.services.rate_limit import rate_limiter
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    redis = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True,
+                                         single_connection_client=True)
+    user_cache.redis = redis
+    # the RateLimit dependency still runs, but lets every request through without counting it
+    rate_limiter.enabled = False
+
+    recorder = Recorder()
+    run_id = uuid.uuid4().hex[:8]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(number):
+        async with semaphore:
+            await virtual_user(client, recorder, number, run_id, args.iterations, args.contacts)
+
+    async with httpx.AsyncClient(app=app, base_url="http://loadtest", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(limited(number) for number in range(args.users)))
+        elapsed = time.perf_counter() - start
+
+    await engine.dispose()
+    return {
+        "meta": {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "database": engine.url.get_backend_name(),
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "iterations": args.iterations,
+            "contacts": args.contacts,
+            "elapsed_s": round(elapsed, 3),
+            "requests": sum(len(values) for values in recorder.latencies.values()),
+        },
+        "routes": recorder.report(elapsed),
+    }
+
+
+def print_report(result: dict) -> None:
+    print(f"{'route':<50} {'count':>6} {'err':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, row in result["routes"].items():
+        print(f"{route:<50} {row['count']:>6} {row['errors']:>4} {row['throughput_rps']:>8.1f} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+    meta = result["meta"]
+    print(f"{meta['requests']} requests in {meta['elapsed_s']}s, {meta['requests'] / meta['elapsed_s']:.1f} req/s")
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> bool:
+    regressed = False
+    print(f"\n{'route':<50} {'p95 before':>10} {'p95 now':>10} {'change':>8}")
+    for route, row in result["routes"].items():
+        before = baseline["routes"].get(route)
+        if before is None or not before["p95_ms"]:
+            continue
+        change = (row["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+        flag = " REGRESSION" if change > threshold else ""
+        regressed = regressed or bool(flag)
+        print(f"{route:<50} {before['p95_ms']:>10.1f} {row['p95_ms']:>10.1f} {change:>+7.1f}%{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="number of virtual users")
+    parser.add_argument("--concurrency", type=int, default=10, help="virtual users running at the same time")
+    parser.add_argument("--iterations", type=int, default=5, help="contact workload rounds per virtual user")
+    parser.add_argument("--contacts", type=int, default=10, help="contacts created per round")
+    parser.add_argument("--url", help="async database URL, a temporary SQLite file by default")
+    parser.add_argument("--output", default="load_test.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=20, help="allowed p95 slowdown per route, percent")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["SQLALCHEMY_DATABASE_URL"] = args.url or f"sqlite+aiosqlite:///{os.path.join(tmp, 'load.db')}"
+        result = asyncio.run(run(args))
+
+    print_report(result)
+    regressed = False
+    if args.compare:
+        with open(args.compare) as file:
+            regressed = compare(result, json.load(file), args.threshold)
+    with open(args.output, "w") as file:
+        json.dump(result, file, indent=2)
+    print(f"\nResults written to {args.output}")
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,10 @@ BASE_DIR = Path(__file__).parent
 
 class Settings(BaseSettings):
     sqlalchemy_database_url: str
+    sqlalchemy_echo: bool = False
+    slow_query_ms: float = 100
+    query_log_sample_rate: float = 0.0
+    query_repeat_threshold: int = 10
     secret_key: str
     algorithm: str
     mail_username: str
@@ -14,11 +18,36 @@ class Settings(BaseSettings):
     mail_from: str
     mail_port: int
     mail_server: str
+    mail_pool_size: int = 2
+    mail_batch_size: int = 20
+    mail_max_retries: int = 3
+    mail_retry_backoff: float = 1.0
+    outbox_batch_size: int = 100
+    outbox_poll_interval: float = 1.0
+    outbox_lease: float = 300
+    outbox_max_attempts: int = 5
+    outbox_retry_delay: float = 60
+    outbox_metrics_port: int = 9101
     redis_host: str = 'localhost'
     redis_port: int = 6379
+    redis_max_connections: int = 20
+    redis_pool_timeout: float = 5
+    fuzzy_search_threshold: float = 0.3
+    fuzzy_search_limit: int = 10
+    rate_limit_enabled: bool = True
+    rate_limit_sync_interval: float = 1.0
+    password_hash_workers: int = 4
+    password_hash_max_queue: int = 64
+    token_cache_size: int = 10000
     cloudinary_name: str
     cloudinary_api_key: str
     cloudinary_api_secret: str
+    avatar_storage: str = 'cloudinary'
+    avatar_local_dir: str = 'static/avatars'
+    avatar_local_url: str = '/static/avatars'
+    avatar_max_bytes: int = 5 * 1024 * 1024
+    avatar_size: int = 250
+    avatar_workers: int = 2
 
     class Config:
         env_file = BASE_DIR / ".env"
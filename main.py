@@ -1,15 +1,19 @@
-import time
-import redis.asyncio as redis
-
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Response
 from sqlalchemy import text
-from sqlalchemy.orm import Session
-from fastapi_limiter import FastAPILimiter
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, generate_latest
 
 from config import settings
-from src.database.connect import get_db
+from src.database.connect import get_db, engine
 from src.routes import contacts, auth, users
+from src.services import redis_client, metrics
+from src.services.auth import auth_service
+from src.services.avatars import avatar_service
+from src.services.cache import user_cache, contact_versions
+from src.services.query_log import query_log
+from src.services.rate_limit import rate_limiter
 
 app = FastAPI()
 
@@ -24,29 +28,24 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.TimingMiddleware)
+
+metrics.instrument_engine(engine)
+REGISTRY.register(metrics.StatsCollector({
+    "db_pool": lambda: metrics.engine_pool_stats(engine),
+    "redis_pool": redis_client.pool_stats,
+    "password_hashing": auth_service.hash_pool.stats,
+    "token_cache": auth_service.token_cache.stats,
+    "rate_limit": rate_limiter.stats,
+}))
 
 app.include_router(auth.router, prefix='/api')
 app.include_router(contacts.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
 
-
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    """
-    The add_process_time_header function adds a header to the response called &quot;My-Process-Time&quot;
-    that contains the time it took for this function to run. This is useful for debugging purposes.
-
-    :param request: Request: Access the request object
-    :param call_next: Call the next middleware in the chain
-    :return: The response object
-    :doc-author: Trelent
-    """
-
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["My-Process-Time"] = str(process_time)
-    return response
+if settings.avatar_storage == 'local':
+    app.mount(settings.avatar_local_url, StaticFiles(directory=settings.avatar_local_dir, check_dir=False),
+              name="avatars")
 
 
 @app.on_event("startup")
@@ -58,9 +57,29 @@ async def startup():
     :return: A future object, which is a special type of object that represents the result of an asynchronous operation
     :doc-author: Trelent
     """
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
-                          decode_responses=True)
-    await FastAPILimiter.init(r)
+    query_log.start()
+    r = await redis_client.init_redis()
+    user_cache.redis = r
+    contact_versions.redis = r
+    rate_limiter.start(r)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    The shutdown function is called when the application stops.
+    It pushes the last rate limit counts to Redis, closes the shared Redis connection pool created at startup
+    and stops the avatar resizing processes.
+
+    :return: None
+    :doc-author: Trelent
+    """
+    await rate_limiter.stop()
+    avatar_service.close()
+    query_log.stop()
+    user_cache.redis = None
+    contact_versions.redis = None
+    await redis_client.close_redis()
 
 
 @app.get("/", name="Contacts app homework")
@@ -75,20 +94,47 @@ def read_root():
     return {"message": "REST APP v-1.0"}
 
 
+@app.get("/api/stats")
+def stats():
+    """
+    The stats function returns this worker's counters for the Redis connection pool, the password hashing pool,
+    the verified token cache and the rate limiter, which help to size redis_max_connections, password_hash_workers,
+    token_cache_size and rate_limit_sync_interval per worker.
+
+    :return: A dictionary of counters
+    :doc-author: Trelent
+    """
+    return {"redis": redis_client.pool_stats(), "password_hashing": auth_service.hash_pool.stats(),
+            "token_cache": auth_service.token_cache.stats(), "rate_limit": rate_limiter.stats()}
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """
+    The prometheus_metrics function returns this worker's metrics in the Prometheus text format:
+    request counts and latencies per route, requests in flight, SQL statements and their time per route,
+    Redis command latencies, rate limiter rejections, the database pool and the counters of /api/stats.
+
+    :return: The metrics as text
+    :doc-author: Trelent
+    """
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/api/healthchecker")
-def healthchecker(db: Session = Depends(get_db)):
+async def healthchecker(db: AsyncSession = Depends(get_db)):
     """
     The healthchecker function is a simple function that checks the health of the database.
     It does this by making a request to the database and checking if it returns any results.
     If there are no results, then we know something is wrong with our connection to the database.
 
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A dictionary with a message key
     :doc-author: Trelent
     """
     try:
         # Make request
-        result = db.execute(text("SELECT 1")).fetchone()
+        result = (await db.execute(text("SELECT 1"))).fetchone()
         if result is None:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                                 detail="Database is not configured correctly")
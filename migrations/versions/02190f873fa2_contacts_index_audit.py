@@ -0,0 +1,42 @@
+"""contacts index audit
+
+Every query on contacts filters on user_id first and is served by the (user_id, ...) composite indexes,
+so the single-column indexes on id (already the primary key), first_name, last_name, birthday
+and additional_info only cost B-tree writes on every insert and update. The unique indexes on email and phone
+stay: they enforce uniqueness and serve the duplicate checks of the import. The composite on (user_id, id)
+serves the export, which walks a user's contacts in id order.
+
+Revision ID: 02190f873fa2
+Revises: fe1a05620b3f
+Create Date: 2026-10-18 10:31:07.914562
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '02190f873fa2'
+down_revision = 'fe1a05620b3f'
+branch_labels = None
+depends_on = None
+
+DROPPED = {
+    'ix_contacts_id': 'id',
+    'ix_contacts_first_name': 'first_name',
+    'ix_contacts_last_name': 'last_name',
+    'ix_contacts_birthday': 'birthday',
+    'ix_contacts_additional_info': 'additional_info',
+}
+
+
+def upgrade() -> None:
+    op.create_index('ix_contacts_user_id_id', 'contacts', ['user_id', 'id'])
+    for name in DROPPED:
+        op.drop_index(name, table_name='contacts')
+
+
+def downgrade() -> None:
+    for name, column in DROPPED.items():
+        op.create_index(name, 'contacts', [column])
+    op.drop_index('ix_contacts_user_id_id', table_name='contacts')
@@ -0,0 +1,61 @@
+"""contacts name trigram index
+
+An FTS5 trigram index of first_name and last_name on SQLite, and its fts5vocab table, for fuzzy name matching.
+Postgres already has the pg_trgm GIN indexes added by fe1a05620b3f. The statements are a frozen copy of
+CONTACT_NAME_TRIGRAM_DDL and CONTACT_NAME_TRIGRAM_DROP_DDL of the models as of this revision.
+
+Revision ID: 28519cda804d
+Revises: 96a01eb57239
+Create Date: 2026-10-18 11:52:18.402955
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '28519cda804d'
+down_revision = '96a01eb57239'
+branch_labels = None
+depends_on = None
+
+NAME_TRIGRAM_DDL = {
+    'sqlite': (
+        "CREATE VIRTUAL TABLE contacts_names_fts USING fts5(first_name, last_name, "
+        "content='contacts', content_rowid='id', tokenize='trigram')",
+        "CREATE VIRTUAL TABLE contacts_names_vocab USING fts5vocab(contacts_names_fts, 'row')",
+        "CREATE TRIGGER contacts_names_fts_insert AFTER INSERT ON contacts BEGIN "
+        "INSERT INTO contacts_names_fts (rowid, first_name, last_name) "
+        "VALUES (new.id, new.first_name, new.last_name); END",
+        "CREATE TRIGGER contacts_names_fts_delete AFTER DELETE ON contacts BEGIN "
+        "INSERT INTO contacts_names_fts (contacts_names_fts, rowid, first_name, last_name) "
+        "VALUES ('delete', old.id, old.first_name, old.last_name); END",
+        "CREATE TRIGGER contacts_names_fts_update AFTER UPDATE OF first_name, last_name ON contacts BEGIN "
+        "INSERT INTO contacts_names_fts (contacts_names_fts, rowid, first_name, last_name) "
+        "VALUES ('delete', old.id, old.first_name, old.last_name); "
+        "INSERT INTO contacts_names_fts (rowid, first_name, last_name) "
+        "VALUES (new.id, new.first_name, new.last_name); END",
+    ),
+}
+NAME_TRIGRAM_DROP_DDL = {
+    'sqlite': (
+        "DROP TRIGGER contacts_names_fts_update",
+        "DROP TRIGGER contacts_names_fts_delete",
+        "DROP TRIGGER contacts_names_fts_insert",
+        "DROP TABLE contacts_names_vocab",
+        "DROP TABLE contacts_names_fts",
+    ),
+}
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    for statement in NAME_TRIGRAM_DDL.get(dialect, ()):
+        op.execute(statement)
+    if dialect == 'sqlite':
+        # index the contacts that already exist
+        op.execute("INSERT INTO contacts_names_fts (contacts_names_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    for statement in NAME_TRIGRAM_DROP_DDL.get(op.get_bind().dialect.name, ()):
+        op.execute(statement)
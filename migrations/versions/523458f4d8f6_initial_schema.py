@@ -0,0 +1,55 @@
+"""initial schema
+
+users and contacts as the models created them with metadata.create_all before migrations were introduced,
+so an existing database can be stamped at this revision.
+
+Revision ID: 523458f4d8f6
+Revises: 
+Create Date: 2026-10-18 10:12:41.305177
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '523458f4d8f6'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('users',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('username', sa.String(length=50), nullable=True),
+                    sa.Column('email', sa.String(length=250), nullable=False),
+                    sa.Column('password', sa.String(length=255), nullable=False),
+                    sa.Column('crated_at', sa.DateTime(), nullable=True),
+                    sa.Column('avatar', sa.String(length=255), nullable=True),
+                    sa.Column('refresh_token', sa.String(length=255), nullable=True),
+                    sa.Column('confirmed', sa.Boolean(), nullable=True),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('email'))
+    op.create_table('contacts',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('first_name', sa.String(), nullable=False),
+                    sa.Column('last_name', sa.String(), nullable=False),
+                    sa.Column('email', sa.String(), nullable=False),
+                    sa.Column('phone', sa.String(), nullable=False),
+                    sa.Column('birthday', sa.DateTime(), nullable=False),
+                    sa.Column('additional_info', sa.String(), nullable=True),
+                    sa.Column('user_id', sa.Integer(), nullable=True),
+                    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_contacts_id', 'contacts', ['id'])
+    op.create_index('ix_contacts_first_name', 'contacts', ['first_name'])
+    op.create_index('ix_contacts_last_name', 'contacts', ['last_name'])
+    op.create_index('ix_contacts_email', 'contacts', ['email'], unique=True)
+    op.create_index('ix_contacts_phone', 'contacts', ['phone'], unique=True)
+    op.create_index('ix_contacts_birthday', 'contacts', ['birthday'])
+    op.create_index('ix_contacts_additional_info', 'contacts', ['additional_info'])
+
+
+def downgrade() -> None:
+    op.drop_table('contacts')
+    op.drop_table('users')
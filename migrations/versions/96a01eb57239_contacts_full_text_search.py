@@ -0,0 +1,70 @@
+"""contacts full-text search
+
+A generated tsvector column with a GIN index on Postgres, an FTS5 table kept in sync by triggers on SQLite.
+The statements are a frozen copy of CONTACT_SEARCH_DDL and CONTACT_SEARCH_DROP_DDL of the models
+as of this revision.
+
+Revision ID: 96a01eb57239
+Revises: 02190f873fa2
+Create Date: 2026-10-18 11:04:52.617340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '96a01eb57239'
+down_revision = '02190f873fa2'
+branch_labels = None
+depends_on = None
+
+SEARCH_DDL = {
+    'postgresql': (
+        "ALTER TABLE contacts ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', first_name || ' ' || last_name), 'A') || "
+        "setweight(to_tsvector('simple', email), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(additional_info, '')), 'C')) STORED",
+        "CREATE INDEX ix_contacts_search_vector ON contacts USING gin (search_vector)",
+    ),
+    'sqlite': (
+        "CREATE VIRTUAL TABLE contacts_fts USING fts5(first_name, last_name, email, additional_info, "
+        "content='contacts', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER contacts_fts_insert AFTER INSERT ON contacts BEGIN "
+        "INSERT INTO contacts_fts (rowid, first_name, last_name, email, additional_info) "
+        "VALUES (new.id, new.first_name, new.last_name, new.email, new.additional_info); END",
+        "CREATE TRIGGER contacts_fts_delete AFTER DELETE ON contacts BEGIN "
+        "INSERT INTO contacts_fts (contacts_fts, rowid, first_name, last_name, email, additional_info) "
+        "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.additional_info); END",
+        "CREATE TRIGGER contacts_fts_update AFTER UPDATE ON contacts BEGIN "
+        "INSERT INTO contacts_fts (contacts_fts, rowid, first_name, last_name, email, additional_info) "
+        "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.additional_info); "
+        "INSERT INTO contacts_fts (rowid, first_name, last_name, email, additional_info) "
+        "VALUES (new.id, new.first_name, new.last_name, new.email, new.additional_info); END",
+    ),
+}
+SEARCH_DROP_DDL = {
+    'postgresql': (
+        "DROP INDEX ix_contacts_search_vector",
+        "ALTER TABLE contacts DROP COLUMN search_vector",
+    ),
+    'sqlite': (
+        "DROP TRIGGER contacts_fts_update",
+        "DROP TRIGGER contacts_fts_delete",
+        "DROP TRIGGER contacts_fts_insert",
+        "DROP TABLE contacts_fts",
+    ),
+}
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    for statement in SEARCH_DDL.get(dialect, ()):
+        op.execute(statement)
+    if dialect == 'sqlite':
+        # index the contacts that already exist
+        op.execute("INSERT INTO contacts_fts (contacts_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    for statement in SEARCH_DROP_DDL.get(op.get_bind().dialect.name, ()):
+        op.execute(statement)
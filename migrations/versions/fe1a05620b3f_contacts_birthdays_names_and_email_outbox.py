@@ -0,0 +1,73 @@
+"""contacts birthdays, names and email outbox
+
+The schema changes of the features built on the initial schema:
+- the birth_mmdd generated column (month * 100 + day of the birthday) and the (user_id, birth_mmdd) index
+  the upcoming-birthdays query runs on;
+- the (user_id, last_name, first_name, id) index of the keyset-paginated contact list;
+- on Postgres, the pg_trgm GIN indexes of the substring search on names and email;
+- the email_outbox table of the outbox worker and its index of pending emails.
+
+SQLite can't add a stored generated column to an existing table, so there contacts is rebuilt in batch mode.
+
+Revision ID: fe1a05620b3f
+Revises: 523458f4d8f6
+Create Date: 2026-10-18 10:21:36.480213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fe1a05620b3f'
+down_revision = '523458f4d8f6'
+branch_labels = None
+depends_on = None
+
+# month * 100 + day of the birthday, a frozen copy of month_day of the models as of this revision
+BIRTH_MMDD = {
+    'postgresql': "CAST(EXTRACT(MONTH FROM birthday) * 100 + EXTRACT(DAY FROM birthday) AS INTEGER)",
+    'default': "CAST(strftime('%m%d', birthday) AS INTEGER)",
+}
+TRIGRAM_COLUMNS = ('first_name', 'last_name', 'email')
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    birth_mmdd = sa.text(BIRTH_MMDD.get(dialect, BIRTH_MMDD['default']))
+    with op.batch_alter_table('contacts', recreate='always' if dialect == 'sqlite' else 'auto') as batch_op:
+        batch_op.add_column(sa.Column('birth_mmdd', sa.Integer(), sa.Computed(birth_mmdd, persisted=True),
+                                      nullable=True))
+    op.create_index('ix_contacts_user_id_birth_mmdd', 'contacts', ['user_id', 'birth_mmdd'])
+    op.create_index('ix_contacts_user_id_name', 'contacts', ['user_id', 'last_name', 'first_name', 'id'])
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for column in TRIGRAM_COLUMNS:
+            op.create_index(f'ix_contacts_{column}_trgm', 'contacts', [column], postgresql_using='gin',
+                            postgresql_ops={column: 'gin_trgm_ops'})
+    op.create_table('email_outbox',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('kind', sa.String(length=50), nullable=False),
+                    sa.Column('email', sa.String(length=250), nullable=False),
+                    sa.Column('username', sa.String(length=50), nullable=True),
+                    sa.Column('host', sa.String(length=255), nullable=False),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.Column('available_at', sa.DateTime(), nullable=False),
+                    sa.Column('attempts', sa.Integer(), nullable=False),
+                    sa.Column('sent_at', sa.DateTime(), nullable=True),
+                    sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_email_outbox_pending', 'email_outbox', ['available_at', 'id'],
+                    postgresql_where=sa.text('sent_at IS NULL'), sqlite_where=sa.text('sent_at IS NULL'))
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    op.drop_index('ix_email_outbox_pending', table_name='email_outbox')
+    op.drop_table('email_outbox')
+    if dialect == 'postgresql':
+        for column in TRIGRAM_COLUMNS:
+            op.drop_index(f'ix_contacts_{column}_trgm', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_name', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_birth_mmdd', table_name='contacts')
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.drop_column('birth_mmdd')
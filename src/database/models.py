@@ -1,19 +1,138 @@
-from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey, Boolean
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey, Boolean, Index, DDL, event, Computed
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.sql.functions import FunctionElement
 
 Base = declarative_base()
 
 
+class month_day(FunctionElement):
+    """
+    month * 100 + day of a date/datetime column as an integer (e.g. 1231 for December 31st),
+    rendered per dialect so it can back a generated column.
+    """
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(month_day)
+def _month_day_default(element, compiler, **kw):
+    return "CAST(strftime('%%m%%d', %s) AS INTEGER)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(month_day, 'postgresql')
+def _month_day_postgresql(element, compiler, **kw):
+    column = compiler.process(element.clauses, **kw)
+    return "CAST(EXTRACT(MONTH FROM %s) * 100 + EXTRACT(DAY FROM %s) AS INTEGER)" % (column, column)
+
+
 class Contact(Base):
     __tablename__ = "contacts"
-    id = Column(Integer, primary_key=True, index=True)
-    first_name = Column(String, index=True, nullable=False)
-    last_name = Column(String, index=True, nullable=False)
+    id = Column(Integer, primary_key=True)
+    first_name = Column(String, nullable=False)
+    last_name = Column(String, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     phone = Column(String, unique=True, index=True, nullable=False)
-    birthday = Column(DateTime, index=True, nullable=False)
-    additional_info = Column(String, index=True, nullable=True)
+    birthday = Column(DateTime, nullable=False)
+    additional_info = Column(String, nullable=True)
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
+    birth_mmdd = Column(Integer, Computed(month_day(birthday), persisted=True))
+
+    # every query filters on user_id first, so apart from the unique email and phone
+    # the indexes lead with it; see the contacts index audit migration
+    __table_args__ = (
+        Index('ix_contacts_user_id_birth_mmdd', user_id, birth_mmdd),
+        Index('ix_contacts_user_id_name', user_id, last_name, first_name, id),
+        Index('ix_contacts_user_id_id', user_id, id),
+        Index('ix_contacts_first_name_trgm', first_name, postgresql_using='gin',
+              postgresql_ops={'first_name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_contacts_last_name_trgm', last_name, postgresql_using='gin',
+              postgresql_ops={'last_name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        Index('ix_contacts_email_trgm', email, postgresql_using='gin',
+              postgresql_ops={'email': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+    )
+
+
+event.listen(Contact.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+# Full-text search over names, email and additional_info, maintained by the database itself.
+# On Postgres a generated tsvector column with a GIN index, names weighted above the email and the email above
+# the notes; on SQLite an external content FTS5 table kept in sync by triggers. Neither is mapped on Contact.
+CONTACT_SEARCH_DDL = {
+    'postgresql': (
+        "ALTER TABLE contacts ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', first_name || ' ' || last_name), 'A') || "
+        "setweight(to_tsvector('simple', email), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(additional_info, '')), 'C')) STORED",
+        "CREATE INDEX ix_contacts_search_vector ON contacts USING gin (search_vector)",
+    ),
+    'sqlite': (
+        "CREATE VIRTUAL TABLE contacts_fts USING fts5(first_name, last_name, email, additional_info, "
+        "content='contacts', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER contacts_fts_insert AFTER INSERT ON contacts BEGIN "
+        "INSERT INTO contacts_fts (rowid, first_name, last_name, email, additional_info) "
+        "VALUES (new.id, new.first_name, new.last_name, new.email, new.additional_info); END",
+        "CREATE TRIGGER contacts_fts_delete AFTER DELETE ON contacts BEGIN "
+        "INSERT INTO contacts_fts (contacts_fts, rowid, first_name, last_name, email, additional_info) "
+        "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.additional_info); END",
+        "CREATE TRIGGER contacts_fts_update AFTER UPDATE ON contacts BEGIN "
+        "INSERT INTO contacts_fts (contacts_fts, rowid, first_name, last_name, email, additional_info) "
+        "VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.additional_info); "
+        "INSERT INTO contacts_fts (rowid, first_name, last_name, email, additional_info) "
+        "VALUES (new.id, new.first_name, new.last_name, new.email, new.additional_info); END",
+    ),
+}
+CONTACT_SEARCH_DROP_DDL = {
+    'postgresql': (
+        "DROP INDEX ix_contacts_search_vector",
+        "ALTER TABLE contacts DROP COLUMN search_vector",
+    ),
+    'sqlite': (
+        "DROP TRIGGER contacts_fts_update",
+        "DROP TRIGGER contacts_fts_delete",
+        "DROP TRIGGER contacts_fts_insert",
+        "DROP TABLE contacts_fts",
+    ),
+}
+# Fuzzy name matching. Postgres uses the pg_trgm indexes above; SQLite gets an FTS5 trigram index of the names
+# to find the candidates that share a trigram with the query, and an fts5vocab table to count them up front.
+CONTACT_NAME_TRIGRAM_DDL = {
+    'sqlite': (
+        "CREATE VIRTUAL TABLE contacts_names_fts USING fts5(first_name, last_name, "
+        "content='contacts', content_rowid='id', tokenize='trigram')",
+        "CREATE VIRTUAL TABLE contacts_names_vocab USING fts5vocab(contacts_names_fts, 'row')",
+        "CREATE TRIGGER contacts_names_fts_insert AFTER INSERT ON contacts BEGIN "
+        "INSERT INTO contacts_names_fts (rowid, first_name, last_name) "
+        "VALUES (new.id, new.first_name, new.last_name); END",
+        "CREATE TRIGGER contacts_names_fts_delete AFTER DELETE ON contacts BEGIN "
+        "INSERT INTO contacts_names_fts (contacts_names_fts, rowid, first_name, last_name) "
+        "VALUES ('delete', old.id, old.first_name, old.last_name); END",
+        "CREATE TRIGGER contacts_names_fts_update AFTER UPDATE OF first_name, last_name ON contacts BEGIN "
+        "INSERT INTO contacts_names_fts (contacts_names_fts, rowid, first_name, last_name) "
+        "VALUES ('delete', old.id, old.first_name, old.last_name); "
+        "INSERT INTO contacts_names_fts (rowid, first_name, last_name) "
+        "VALUES (new.id, new.first_name, new.last_name); END",
+    ),
+}
+CONTACT_NAME_TRIGRAM_DROP_DDL = {
+    'sqlite': (
+        "DROP TRIGGER contacts_names_fts_update",
+        "DROP TRIGGER contacts_names_fts_delete",
+        "DROP TRIGGER contacts_names_fts_insert",
+        "DROP TABLE contacts_names_vocab",
+        "DROP TABLE contacts_names_fts",
+    ),
+}
+for _ddl in (CONTACT_SEARCH_DDL, CONTACT_NAME_TRIGRAM_DDL):
+    for _dialect, _statements in _ddl.items():
+        for _statement in _statements:
+            event.listen(Contact.__table__, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+# on SQLite the FTS tables aren't dropped with contacts
+for _table in ('contacts_names_vocab', 'contacts_fts', 'contacts_names_fts'):
+    event.listen(Contact.__table__, 'before_drop', DDL(f'DROP TABLE IF EXISTS {_table}').execute_if(dialect='sqlite'))
 
 
 class User(Base):
@@ -26,3 +145,25 @@ class User(Base):
     avatar = Column(String(255), nullable=True)
     refresh_token = Column(String(255), nullable=True)
     confirmed = Column(Boolean, default=False)
+
+
+class OutboxEmail(Base):
+    """
+    An email waiting to be sent by the outbox worker. Rows are added in the same transaction as the user change
+    they announce, so the email is sent if and only if the change is committed.
+    """
+    __tablename__ = "email_outbox"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)
+    email = Column(String(250), nullable=False)
+    username = Column(String(50))
+    host = Column(String(255), nullable=False)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    available_at = Column(DateTime, default=datetime.now, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_email_outbox_pending', available_at, id,
+              postgresql_where=sent_at.is_(None), sqlite_where=sent_at.is_(None)),
+    )
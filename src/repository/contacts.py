@@ -1,14 +1,23 @@
-from datetime import datetime, timedelta
+import base64
+import binascii
+import calendar
+import json
+import re
+from datetime import date, timedelta
 from typing import List
 
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, column, delete, func, literal_column, or_, select, table, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Contact, User
 from src.schemas import ContactModel
+from src.services.cache import contact_versions
+from src.services.fuzzy import index_trigrams, rank_names
 
 
-async def create_contact(body: ContactModel, user: User, db: Session):
+async def create_contact(body: ContactModel, user: User, db: AsyncSession):
     """
     The create_contact function creates a new contact in the database.
         Args:
@@ -17,32 +26,154 @@ async def create_contact(body: ContactModel, user: User, db: Session):
 
     :param body: ContactModel: Get the data from the request body
     :param user: User: Get the user_id from the token
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: The contact object
     :doc-author: Trelent
     """
     contact = Contact(**body.dict(), user_id=user.id)
     db.add(contact)
-    db.commit()
-    db.refresh(contact)
+    await db.commit()
+    await db.refresh(contact)
+    await contact_versions.bump(user.id, contact.id)
     return contact
 
 
-async def get_contacts(user: User, db: Session):
+async def create_contacts(bodies: list[ContactModel], user: User, db: AsyncSession) -> list[int | None]:
     """
-    The get_contacts function returns a list of contacts for the user with the given id.
+    The create_contacts function inserts many contacts with a single multi-row INSERT ... ON CONFLICT DO NOTHING
+    and commits them as one transaction. Rows that clash with the unique email or phone of an existing contact
+    are skipped instead of failing the whole batch.
+        Args:
+            bodies (list[ContactModel]): The contacts to create, with no email or phone repeated.
+            user (User): The current user, who is creating the contacts.
+
+    :param bodies: list[ContactModel]: The contacts to create
+    :param user: User: Get the user_id from the token
+    :param db: AsyncSession: Access the database
+    :return: The id of each created contact, None for the rows that were skipped, in the order of bodies
+    :doc-author: Trelent
+    """
+    insert = postgresql_insert if db.get_bind().dialect.name == 'postgresql' else sqlite_insert
+    stmt = (insert(Contact)
+            .values([{**body.dict(), 'user_id': user.id} for body in bodies])
+            .on_conflict_do_nothing()
+            .returning(Contact.id, Contact.email))
+    result = await db.execute(stmt)
+    ids = {email: contact_id for contact_id, email in result.all()}
+    await db.commit()
+    if ids:
+        await contact_versions.bump(user.id, *ids.values())
+    return [ids.get(body.email) for body in bodies]
+
+
+async def get_taken_emails_and_phones(emails: list[str], phones: list[str],
+                                      db: AsyncSession) -> tuple[set[str], set[str]]:
+    """
+    The get_taken_emails_and_phones function finds which of the given emails and phones already belong to a contact.
+
+    :param emails: list[str]: Emails to look up
+    :param phones: list[str]: Phones to look up
+    :param db: AsyncSession: Access the database
+    :return: A tuple of the taken emails and the taken phones
+    :doc-author: Trelent
+    """
+    result = await db.execute(select(Contact.email, Contact.phone)
+                              .where(or_(Contact.email.in_(emails), Contact.phone.in_(phones))))
+    taken_emails, taken_phones = set(), set()
+    for email, phone in result.all():
+        taken_emails.add(email)
+        taken_phones.add(phone)
+    return taken_emails, taken_phones
+
+
+def _select_contacts(fields: list[str] | None):
+    if fields is None:
+        return select(Contact)
+    return select(*(getattr(Contact, field) for field in fields))
+
+
+def encode_cursor(contact: Contact) -> str:
+    """
+    The encode_cursor function builds the opaque pagination cursor that points just past the given contact
+    in (last_name, first_name, id) order.
+
+    :param contact: Contact: The last contact of the current page, or a row with its id and names
+    :return: A url-safe cursor string
+    :doc-author: Trelent
+    """
+    key = json.dumps([contact.last_name, contact.first_name, contact.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, str, int]:
+    """
+    The decode_cursor function turns a cursor produced by encode_cursor back into its sort key.
+
+    :param cursor: str: The cursor received from the client
+    :return: A tuple of last_name, first_name and id
+    :raises ValueError: If the cursor is malformed
+    :doc-author: Trelent
+    """
+    try:
+        last_name, first_name, contact_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(last_name, str) or not isinstance(first_name, str) or not isinstance(contact_id, int):
+        raise ValueError('Invalid cursor')
+    return last_name, first_name, contact_id
+
+
+async def get_contacts(user: User, db: AsyncSession, limit: int = 50, cursor: str | None = None,
+                       fields: list[str] | None = None):
+    """
+    The get_contacts function returns one page of contacts for the user with the given id.
+    Pages are keyset-paginated over (last_name, first_name, id), so every page is a range scan
+    of the (user_id, last_name, first_name, id) index no matter how deep it is.
+
+    :param user: User: Get the user's id from the database
+    :param db: AsyncSession: Pass the database session to the function
+    :param limit: int: Maximum number of contacts on the page
+    :param cursor: str | None: Cursor returned with the previous page, None for the first page
+    :param fields: list[str] | None: Contact columns to select as plain rows, which must include id, first_name
+        and last_name; None to load Contact objects
+    :return: A tuple of the contacts on the page and the cursor of the next page (None on the last page)
+    :raises ValueError: If the cursor is malformed
+    :doc-author: Trelent
+    """
+    stmt = _select_contacts(fields).where(Contact.user_id == user.id)
+    if cursor is not None:
+        stmt = stmt.where(tuple_(Contact.last_name, Contact.first_name, Contact.id) > tuple_(*decode_cursor(cursor)))
+    contacts = await db.execute(stmt.order_by(Contact.last_name, Contact.first_name, Contact.id).limit(limit + 1))
+    contacts = contacts.scalars().all() if fields is None else contacts.all()
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        return contacts, encode_cursor(contacts[-1])
+    return contacts, None
+
 
+async def stream_contacts(user: User, db: AsyncSession, fields: list[str], batch_size: int = 1000):
+    """
+    The stream_contacts function yields every contact of the user as a plain row of the given columns.
+    Rows come from a server-side cursor in batches of batch_size, so memory stays flat however large
+    the address book is and the first rows are available before the query has finished.
 
     :param user: User: Get the user's id from the database
-    :param db: Session: Pass the database session to the function
-    :return: A list of contacts for a given user
+    :param db: AsyncSession: Pass the database session to the function
+    :param fields: list[str]: Names of the Contact columns to select
+    :param batch_size: int: Number of rows fetched from the cursor at a time
+    :return: An async iterator of rows
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter(Contact.user_id == user.id).all()
-    return contacts
+    stmt = (_select_contacts(fields)
+            .where(Contact.user_id == user.id)
+            .order_by(Contact.id)
+            .execution_options(yield_per=batch_size))
+    rows = await db.stream(stmt)
+    async for row in rows:
+        yield row
 
 
-async def get_contact(contact_id: int, user: User, db: Session):
+async def get_contact(contact_id: int, user: User, db: AsyncSession):
     """
     The get_contact function takes in a contact_id and user object, and returns the contact with that id.
         Args:
@@ -51,17 +182,19 @@ async def get_contact(contact_id: int, user: User, db: Session):
 
     :param contact_id: int: Get a specific contact from the database
     :param user: User: Get the user from the database
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A contact object from the database
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter_by(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    return contact
+    contact = await db.execute(select(Contact).where(and_(Contact.id == contact_id, Contact.user_id == user.id)))
+    return contact.scalar_one_or_none()
 
 
-async def update_contact(body: ContactModel, contact_id: int, user: User, db: Session):
+async def update_contact(body: ContactModel, contact_id: int, user: User, db: AsyncSession):
     """
     The update_contact function updates a contact in the database.
+    It is a single UPDATE ... RETURNING statement, so the contact is neither read first nor loaded
+    into the session.
         Args:
             body (ContactModel): The updated contact information.
             contact_id (int): The id of the contact to update.
@@ -70,25 +203,25 @@ async def update_contact(body: ContactModel, contact_id: int, user: User, db: Se
     :param body: ContactModel: Pass the contact information to be updated
     :param contact_id: int: Find the contact in the database
     :param user: User: Get the user_id of the logged in user
-    :param db: Session: Access the database
-    :return: The contact object
+    :param db: AsyncSession: Access the database
+    :return: A row with the columns of the updated contact, or None if the user has no such contact
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter_by(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    result = await db.execute(update(Contact)
+                              .where(and_(Contact.id == contact_id, Contact.user_id == user.id))
+                              .values(**body.dict())
+                              .returning(*Contact.__table__.columns)
+                              .execution_options(synchronize_session=False))
+    contact = result.one_or_none()
     if contact:
-        contact.first_name = body.first_name
-        contact.last_name = body.last_name
-        contact.email = body.email
-        contact.phone = body.phone
-        contact.birthday = body.birthday
-        contact.additional_info = body.additional_info
-        db.commit()
+        await db.commit()
+        await contact_versions.bump(user.id, contact_id)
     return contact
 
 
-async def remove_contact(contact_id: int, user: User, db: Session):
+async def remove_contact(contact_id: int, user: User, db: AsyncSession):
     """
-    The remove_contact function removes a contact from the database.
+    The remove_contact function removes a contact from the database with a single DELETE ... RETURNING statement.
         Args:
             contact_id (int): The id of the contact to be removed.
             user (User): The user who is removing the contact. This is used to ensure that only contacts belonging to this
@@ -96,59 +229,227 @@ async def remove_contact(contact_id: int, user: User, db: Session):
 
     :param contact_id: int: Identify the contact to be deleted
     :param user: User: Get the user id of the user who is logged in
-    :param db: Session: Access the database
-    :return: The contact object that was deleted
+    :param db: AsyncSession: Access the database
+    :return: A row with the columns of the deleted contact, or None if the user has no such contact
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter_by(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    result = await db.execute(delete(Contact)
+                              .where(and_(Contact.id == contact_id, Contact.user_id == user.id))
+                              .returning(*Contact.__table__.columns)
+                              .execution_options(synchronize_session=False))
+    contact = result.one_or_none()
     if contact:
-        db.delete(contact)
-        db.commit()
+        await db.commit()
+        await contact_versions.bump(user.id, contact_id)
     return contact
 
 
-async def search_field(field_to_search: str, user: User, db: Session):
+async def search_field(field_to_search: str, user: User, db: AsyncSession, limit: int = 50, offset: int = 0,
+                       fields: list[str] | None = None):
     """
     The search_field function searches for a field in the database and returns all contacts that contain it.
+    The case-insensitive substring match runs in the database (ILIKE on Postgres, backed by pg_trgm GIN indexes,
+    lower() LIKE lower() on SQLite), so only the requested page of contacts is loaded.
         Args:
             field_to_search (str): The string to search for.
             user (User): The user whose contacts are being searched through.
 
     :param field_to_search: str: Specify the field to search for
     :param user: User: Get the user's id from the database
-    :param db: Session: Create a database session, which is used to query the database
+    :param db: AsyncSession: Create a database session, which is used to query the database
+    :param limit: int: Maximum number of contacts to return
+    :param offset: int: Number of matching contacts to skip
+    :param fields: list[str] | None: Contact columns to select as plain rows, None to load Contact objects
     :return: A list of contacts that have the field_to_search in their name, surname or email
     :doc-author: Trelent
     """
-    contacts_list = []
-    contacts_all = db.query(Contact).filter(Contact.user_id == user.id).all()
-    for contact in contacts_all:
-        if field_to_search.capitalize() in contact.first_name.capitalize() and contact not in contacts_list:
-            contacts_list.append(contact)
-        if field_to_search.capitalize() in contact.last_name.capitalize() and contact not in contacts_list:
-            contacts_list.append(contact)
-        if field_to_search.capitalize() in contact.email.capitalize() and contact not in contacts_list:
-            contacts_list.append(contact)
+    escaped = field_to_search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    pattern = f'%{escaped}%'
+    contacts = await db.execute(
+        _select_contacts(fields)
+        .where(and_(Contact.user_id == user.id,
+                    or_(Contact.first_name.ilike(pattern, escape='\\'),
+                        Contact.last_name.ilike(pattern, escape='\\'),
+                        Contact.email.ilike(pattern, escape='\\'))))
+        .order_by(Contact.last_name, Contact.first_name, Contact.id)
+        .limit(limit)
+        .offset(offset)
+    )
+    return contacts.scalars().all() if fields is None else contacts.all()
+
+
+contacts_fts = table('contacts_fts', column('rowid'), column('contacts_fts'))
 
-    return contacts_list
+
+def search_terms(query: str) -> list[str]:
+    """
+    The search_terms function splits a search query into the words it is matched on. Everything but letters
+    and digits is dropped, so user input can't inject full-text query syntax.
+
+    :param query: str: The search query
+    :return: The lower-cased words of the query
+    :doc-author: Trelent
+    """
+    return re.findall(r'[^\W_]+', query.lower())
+
+
+async def search_contacts(query: str, user: User, db: AsyncSession, limit: int = 50, offset: int = 0,
+                          fields: list[str] | None = None):
+    """
+    The search_contacts function runs a ranked full-text search over the names, email and additional_info
+    of the user's contacts. A contact matches when it has every word of the query, each as a prefix of a word;
+    matches in the names rank above matches in the email, which rank above matches in additional_info.
+    On Postgres the search_vector column and its GIN index are used, on SQLite the contacts_fts table,
+    so the cost grows with the number of matches rather than with the size of the address book.
+
+    :param query: str: Words to search for
+    :param user: User: Get the user's id from the database
+    :param db: AsyncSession: Access the database
+    :param limit: int: Maximum number of contacts to return
+    :param offset: int: Number of matching contacts to skip
+    :param fields: list[str] | None: Contact columns to select as plain rows, None to load Contact objects
+    :return: A list of contacts, best match first
+    :doc-author: Trelent
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    stmt = _select_contacts(fields).where(Contact.user_id == user.id)
+    if db.get_bind().dialect.name == 'postgresql':
+        vector = literal_column('contacts.search_vector')
+        tsquery = func.to_tsquery(literal_column("'simple'::regconfig"), ' & '.join(f'{term}:*' for term in terms))
+        stmt = stmt.where(vector.op('@@')(tsquery)).order_by(func.ts_rank(vector, tsquery).desc(), Contact.id)
+    else:
+        match = ' '.join(f'"{term}"*' for term in terms)
+        stmt = (stmt.join(contacts_fts, contacts_fts.c.rowid == Contact.id)
+                .where(contacts_fts.c.contacts_fts.op('MATCH')(match))
+                .order_by(func.bm25(literal_column('contacts_fts'), 10.0, 10.0, 5.0, 1.0), Contact.id))
+    contacts = await db.execute(stmt.limit(limit).offset(offset))
+    return contacts.scalars().all() if fields is None else contacts.all()
+
+
+contacts_names_fts = table('contacts_names_fts', column('rowid'), column('contacts_names_fts'))
+contacts_names_vocab = table('contacts_names_vocab', column('term'), column('doc'))
+
+
+async def fuzzy_search(query: str, user: User, db: AsyncSession, threshold: float = 0.3, limit: int = 10,
+                       fields: list[str] | None = None, candidates: int = 300, postings: int = 5000):
+    """
+    The fuzzy_search function finds the user's contacts whose first name, last name or full name is similar
+    to the query, so misspelled names still match. Contacts are ranked by trigram similarity, the best first,
+    and those scoring below threshold are left out.
+    Only contacts the index hands over are scored. On Postgres these are the ones the pg_trgm GIN indexes
+    of the names find with the % operator, and the database scores them. On SQLite the rarest trigrams
+    of the query are looked up in contacts_names_fts, only as many as add up to postings index entries
+    (counted over all users), and the best candidates by bm25 are scored here with the same similarity
+    as pg_trgm. That bounds the work however many contacts the user has. Words shorter than three characters
+    have no trigram in that index, so on SQLite the contacts with a first or last name starting with one of them
+    are scored too, up to candidates of them.
+
+    :param query: str: The name to search for, possibly misspelled
+    :param user: User: Get the user's id from the database
+    :param db: AsyncSession: Access the database
+    :param threshold: float: Lowest similarity, from 0 to 1, of a contact to be returned
+    :param limit: int: Maximum number of contacts to return
+    :param fields: list[str] | None: Contact columns, with id, to select as plain rows, None to load Contact objects
+    :param candidates: int: Maximum number of contacts SQLite scores
+    :param postings: int: Index entries of the trigrams SQLite looks up, the rarest trigram is always looked up
+    :return: A list of contacts, most similar first
+    :doc-author: Trelent
+    """
+    words = search_terms(query)
+    if not words:
+        return []
+    query = ' '.join(words)
+    stmt = _select_contacts(fields).where(Contact.user_id == user.id)
+    if db.get_bind().dialect.name == 'postgresql':
+        # % compares with pg_trgm.similarity_threshold; set it for this transaction only
+        await db.execute(select(func.set_config('pg_trgm.similarity_threshold', str(threshold), True)))
+        score = func.greatest(func.similarity(Contact.first_name, query), func.similarity(Contact.last_name, query),
+                              func.similarity(func.concat_ws(' ', Contact.first_name, Contact.last_name), query))
+        stmt = (stmt.where(or_(*(name.op('%')(word) for word in words
+                                 for name in (Contact.first_name, Contact.last_name))), score >= threshold)
+                .order_by(score.desc(), Contact.id)
+                .limit(limit))
+        contacts = await db.execute(stmt)
+        return contacts.scalars().all() if fields is None else contacts.all()
+
+    names = select(Contact.id, Contact.first_name, Contact.last_name).where(Contact.user_id == user.id)
+    found = {}
+    grams = index_trigrams(query)
+    if grams:
+        counts = await db.execute(select(contacts_names_vocab.c.term, contacts_names_vocab.c.doc)
+                                  .where(contacts_names_vocab.c.term.in_(grams)))
+        rare, total = [], 0
+        for gram, count in sorted(counts.all(), key=lambda item: item[1]):
+            if rare and total + count > postings:
+                break
+            rare.append(gram)
+            total += count
+        if rare:
+            rows = await db.execute(
+                names.join(contacts_names_fts, contacts_names_fts.c.rowid == Contact.id)
+                .where(contacts_names_fts.c.contacts_names_fts.op('MATCH')(' OR '.join(f'"{gram}"' for gram in rare)))
+                .order_by(func.bm25(literal_column('contacts_names_fts')))
+                .limit(max(candidates, limit))
+            )
+            found.update((row[0], row) for row in rows.all())
+    short = [word for word in words if len(word) < 3]
+    if short:
+        # search_terms leaves only letters and digits, so the words need no LIKE escaping
+        rows = await db.execute(
+            names.where(or_(*(name.ilike(f'{word}%') for word in short
+                              for name in (Contact.first_name, Contact.last_name))))
+            .order_by(Contact.id)
+            .limit(max(candidates, limit))
+        )
+        found.update((row[0], row) for row in rows.all())
+    ids = rank_names(query, found.values(), threshold, limit)
+    if not ids:
+        return []
+    contacts = await db.execute(stmt.where(Contact.id.in_(ids)))
+    contacts = contacts.scalars().all() if fields is None else contacts.all()
+    rank = {contact_id: position for position, contact_id in enumerate(ids)}
+    return sorted(contacts, key=lambda contact: rank[contact.id])
+
+
+def _birthday_window(today: date, days: int = 7) -> tuple[int, int]:
+    """
+    The _birthday_window function returns the month-day bounds (month * 100 + day) of the
+    birthday window starting today and ending days later, both inclusive.
+    The upper bound is smaller than the lower one when the window wraps past December 31st.
+    In a non-leap year a window that ends on February 28th also covers February 29th birthdays.
+
+    :param today: date: The first day of the window
+    :param days: int: Length of the window in days, not counting today
+    :return: A tuple of the lower and upper month-day bounds
+    :doc-author: Trelent
+    """
+    end = today + timedelta(days=days)
+    lower = today.month * 100 + today.day
+    upper = end.month * 100 + end.day
+    if upper == 228 and not calendar.isleap(end.year):
+        upper = 229
+    return lower, upper
 
 
-async def birthday_list(user: User, db: Session):
+async def birthday_list(user: User, db: AsyncSession, fields: list[str] | None = None):
     """
     The birthday_list function takes a user and database session as arguments.
     It returns a list of contacts whose birthdays are within the next 7 days.
+    The window is matched against the birth_mmdd column, so the query is a range scan
+    over the (user_id, birth_mmdd) index.
 
     :param user: User: Get the user id from the database
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
+    :param fields: list[str] | None: Contact columns to select as plain rows, None to load Contact objects
     :return: A list of contacts with birthdays in the next week
     :doc-author: Trelent
     """
-    contacts_list = []
-    dt_now = datetime.now()
-    now_year = datetime.now().strftime('%Y')
-    contacts_all = db.query(Contact).filter(Contact.user_id == user.id).all()
-    for contact in contacts_all:
-        delta = contact.birthday.replace(year=int(now_year)) - dt_now
-        if timedelta(days=-1) < delta < timedelta(days=7):
-            contacts_list.append(contact)
-    return contacts_list
+    lower, upper = _birthday_window(date.today())
+    if lower <= upper:
+        in_window = Contact.birth_mmdd.between(lower, upper)
+    else:
+        in_window = or_(Contact.birth_mmdd >= lower, Contact.birth_mmdd <= upper)
+    contacts = await db.execute(_select_contacts(fields).where(and_(Contact.user_id == user.id, in_window)))
+    return contacts.scalars().all() if fields is None else contacts.all()
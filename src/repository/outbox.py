@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import OutboxEmail
+
+
+async def add_email(kind: str, email: str, username: str | None, host: str, db: AsyncSession,
+                    commit: bool = False) -> OutboxEmail:
+    """
+    The add_email function adds an email to the outbox. Unless commit is set, the row is only added to the session
+    and is committed together with the caller's next change, so the email can't be sent for a change
+    that was rolled back.
+
+    :param kind: str: Which email to send, a key of src.services.email.EMAILS
+    :param email: str: The recipient
+    :param username: str | None: Username of the recipient, used in the greeting
+    :param host: str: Base url of the server, used for the links in the email
+    :param db: AsyncSession: Pass the database session to the function
+    :param commit: bool: Commit the session right away
+    :return: The new outbox row
+    :doc-author: Trelent
+    """
+    row = OutboxEmail(kind=kind, email=email, username=username, host=str(host))
+    db.add(row)
+    if commit:
+        await db.commit()
+    return row
+
+
+async def claim_emails(limit: int, lease: float, max_attempts: int, db: AsyncSession) -> list[OutboxEmail]:
+    """
+    The claim_emails function takes up to limit unsent emails that are due and leases them to the caller
+    for lease seconds. Rows locked by another worker are skipped (SKIP LOCKED on PostgreSQL),
+    so any number of workers can claim at the same time. A row whose worker died before marking it sent
+    becomes due again once its lease is over.
+
+    :param limit: int: The maximum number of emails to claim
+    :param lease: float: Seconds before the emails can be claimed again
+    :param max_attempts: int: Emails claimed this many times already are skipped
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The claimed outbox rows
+    :doc-author: Trelent
+    """
+    now = datetime.now()
+    stmt = (select(OutboxEmail)
+            .where(OutboxEmail.sent_at.is_(None), OutboxEmail.available_at <= now,
+                   OutboxEmail.attempts < max_attempts)
+            .order_by(OutboxEmail.available_at, OutboxEmail.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True))
+    rows = (await db.execute(stmt)).scalars().all()
+    for row in rows:
+        row.attempts += 1
+        row.available_at = now + timedelta(seconds=lease)
+    await db.commit()
+    return rows
+
+
+async def mark_sent(ids: list[int], db: AsyncSession) -> None:
+    """
+    The mark_sent function marks the emails with the given ids as sent.
+
+    :param ids: list[int]: Ids of the sent outbox rows
+    :param db: AsyncSession: Pass the database session to the function
+    :return: None
+    :doc-author: Trelent
+    """
+    if not ids:
+        return
+    await db.execute(update(OutboxEmail).where(OutboxEmail.id.in_(ids)).values(sent_at=datetime.now()))
+    await db.commit()
+
+
+async def retry_later(ids: list[int], delay: float, db: AsyncSession) -> None:
+    """
+    The retry_later function makes the emails with the given ids due again after delay seconds.
+
+    :param ids: list[int]: Ids of the outbox rows that failed to send
+    :param delay: float: Seconds to wait before the next attempt
+    :param db: AsyncSession: Pass the database session to the function
+    :return: None
+    :doc-author: Trelent
+    """
+    if not ids:
+        return
+    await db.execute(update(OutboxEmail).where(OutboxEmail.id.in_(ids))
+                     .values(available_at=datetime.now() + timedelta(seconds=delay)))
+    await db.commit()
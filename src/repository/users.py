@@ -1,32 +1,35 @@
 from libgravatar import Gravatar
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
-from src.schemas import UserModel, UserModelPassword
+from src.schemas import UserModel
+from src.services.cache import user_cache
 
 
-async def get_user_by_email(email: str, db: Session) -> User | None:
+async def get_user_by_email(email: str, db: AsyncSession) -> User | None:
     """
     The get_user_by_email function takes in an email and a database session,
     and returns the user associated with that email. If no such user exists, it returns None.
 
     :param email: str: Pass the email of the user to be retrieved
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A user object if the user exists, and none if it doesn't
     :doc-author: Trelent
     """
-    return db.query(User).filter(User.email == email).first()
+    user = await db.execute(select(User).where(User.email == email))
+    return user.scalar_one_or_none()
 
 
-async def create_user(body: UserModel, db: Session) -> User:
+async def create_user(body: UserModel, db: AsyncSession) -> User:
     """
     The create_user function creates a new user in the database.
         Args:
             body (UserModel): The UserModel object containing the data to be inserted into the database.
-            db (Session): The SQLAlchemy Session object used to interact with our PostgreSQL database.
+            db (AsyncSession): The SQLAlchemy AsyncSession object used to interact with our PostgreSQL database.
 
     :param body: UserModel: Validate the data that is passed in
-    :param db: Session: Create a database session
+    :param db: AsyncSession: Create a database session
     :return: The new user object
     :doc-author: Trelent
     """
@@ -38,58 +41,79 @@ async def create_user(body: UserModel, db: Session) -> User:
         print(e)
     new_user = User(**body.dict(), avatar=avatar)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
-async def update_token(user: User, token: str | None, db: Session) -> None:
+async def update_token(user: User, token: str | None, db: AsyncSession) -> None:
     """
     The update_token function updates the refresh token for a user.
 
     :param user: User: Get the user's id, which is used to find the user in the database
     :param token: str | None: Update the refresh token in the database
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: None
     :doc-author: Trelent
     """
     user.refresh_token = token
-    db.commit()
+    await db.commit()
+    await user_cache.invalidate(user.email)
 
 
-async def confirmed_email(email: str, db: Session) -> None:
+async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
     The confirmed_email function takes in an email and a database session,
     and sets the confirmed field of the user with that email to True.
 
 
     :param email: str: Pass in the email of the user that is being confirmed
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: None
     :doc-author: Trelent
     """
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await db.commit()
+    await user_cache.invalidate(email)
 
 
-async def update_avatar(email, url: str, db: Session) -> User:
+async def update_avatar(email, url: str, db: AsyncSession) -> User:
     """
     The update_avatar function updates the avatar of a user.
 
     :param email: Find the user in the database
     :param url: str: Specify the type of data that is being passed into the function
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A user object
     :doc-author: Trelent
     """
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
+    await db.commit()
+    await user_cache.invalidate(email)
     return user
 
 
-async def update_user_password(email, password: str, db: Session) -> User:
+async def restore_avatar(email: str, url: str, previous_url: str | None, db: AsyncSession) -> bool:
+    """
+    The restore_avatar function puts back the previous avatar of a user whose new avatar could not be stored.
+    It changes nothing if the user has set another avatar since.
+
+    :param email: str: Email of the user
+    :param url: str: The avatar URL that could not be stored
+    :param previous_url: str | None: The avatar URL to put back
+    :param db: AsyncSession: Pass the database session to the function
+    :return: True if the avatar was put back, False otherwise
+    :doc-author: Trelent
+    """
+    result = await db.execute(update(User).where(User.email == email, User.avatar == url).values(avatar=previous_url))
+    await db.commit()
+    await user_cache.invalidate(email)
+    return result.rowcount > 0
+
+
+async def update_user_password(email, password: str, db: AsyncSession) -> User:
     """
     The update_user_password function updates a user's password in the database.
         Args:
@@ -98,12 +122,13 @@ async def update_user_password(email, password: str, db: Session) -> User:
 
     :param email: Find the user in the database and update their password
     :param password: str: Pass the new password to the function
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: The updated user
     :doc-author: Trelent
     """
     user = await get_user_by_email(email, db)
     user.password = password
-    db.commit()
+    await db.commit()
+    await user_cache.invalidate(email)
     return user
 
@@ -1,53 +1,53 @@
 from typing import List
 
-from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request
+from fastapi import APIRouter, HTTPException, Depends, status, Security, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.connect import get_db
 from src.schemas import UserModel, UserResponse, TokenModel, RequestEmail
 from src.repository import users as repository_users
+from src.repository import outbox as repository_outbox
 from src.services.auth import auth_service
-from src.services.email import send_email
 
 router = APIRouter(prefix='/auth', tags=["auth"])
 security = HTTPBearer()
 
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+async def signup(body: UserModel, request: Request, db: AsyncSession = Depends(get_db)):
     """
     The signup function creates a new user in the database.
         It takes a UserModel object as input, which is validated by pydantic.
         If the email address already exists in the database, an HTTP 409 error is raised.
         The password field of the UserModel object is hashed using Argon2 and stored in that form.
         A new user record is created with this information and returned to the client.
+        The confirmation email is added to the outbox in the same transaction.
 
     :param body: UserModel: Get the body of the request
-    :param background_tasks: BackgroundTasks: Add a task to the background tasks queue
     :param request: Request: Get the base url of the server
-    :param db: Session: Get the database connection
+    :param db: AsyncSession: Get the database connection
     :return: A dictionary with two keys: user and detail
     :doc-author: Trelent
     """
     exist_user = await repository_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
+    await repository_outbox.add_email("confirm_email", body.email, body.username, request.base_url, db)
     new_user = await repository_users.create_user(body, db)
-    background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
     return {"user": new_user, "detail": "User successfully created. Check your email for confirmation."}
 
 
 @router.post("/login", response_model=TokenModel)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     The login function is used to authenticate a user.
         It takes the username and password from the request body,
         verifies them against the database, and returns an access token if successful.
 
     :param body: OAuth2PasswordRequestForm: Get the username and password from the request body
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: The access token and refresh token
     :doc-author: Trelent
     """
@@ -56,7 +56,7 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
-    if not auth_service.verify_password(body.password, user.password):
+    if not await auth_service.verify_password(body.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
     # Generate JWT
     access_token = await auth_service.create_access_token(data={"sub": user.email})
@@ -66,14 +66,14 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
 
 
 @router.get('/refresh_token', response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: AsyncSession = Depends(get_db)):
     """
     The refresh_token function is used to refresh the access token.
         The function takes in a refresh token and returns an access_token, a new refresh_token, and the type of token.
         If the user's current refresh_token does not match what was passed into this function then it will return an error.
 
     :param credentials: HTTPAuthorizationCredentials: Get the token from the request header
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A dictionary with the access_token, refresh_token and token type
     :doc-author: Trelent
     """
@@ -91,7 +91,7 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(sec
 
 
 @router.get('/confirmed_email/{token}')
-async def confirmed_email(token: str, db: Session = Depends(get_db)):
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     """
     The confirmed_email function is used to confirm a user's email address.
         It takes the token from the URL and uses it to get the user's email address.
@@ -101,7 +101,7 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
         confirmed_email function which sets the 'confirmed' field of that particular record to True
 
     :param token: str: Get the token from the url
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A message that the email has been confirmed
     :doc-author: Trelent
     """
@@ -116,19 +116,17 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
 
 
 @router.post('/request_email')
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: Session = Depends(get_db)):
+async def request_email(body: RequestEmail, request: Request, db: AsyncSession = Depends(get_db)):
     """
     The request_email function is used to send an email to the user with a link that they can click on
     to confirm their email address. The function takes in a RequestEmail object, which contains the
     email of the user who wants to confirm their account. It then checks if there is already a confirmed
     user with that email address, and if so returns an error message saying as much. If not, it sends
-    an email containing a confirmation link.
+    an email containing a confirmation link through the outbox.
 
     :param body: RequestEmail: Get the email from the request body
-    :param background_tasks: BackgroundTasks: Add a task to the background tasks queue
     :param request: Request: Get the base url of the server
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A message to the user
     :doc-author: Trelent
     """
@@ -137,5 +135,6 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
     if user:
-        background_tasks.add_task(send_email, user.email, user.username, request.base_url)
+        await repository_outbox.add_email("confirm_email", user.email, user.username, request.base_url, db,
+                                          commit=True)
     return {"message": "Check your email for confirmation."}
\ No newline at end of file
@@ -1,89 +1,206 @@
+import hashlib
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status, Path
-from sqlalchemy.orm import Session
-from fastapi_limiter.depends import RateLimiter
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Header, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from config import settings
 from src.database.connect import get_db
 from src.repository import contacts as repository_contacts
-from src.schemas import ContactResponse, ContactModel
+from src.schemas import ContactResponse, ContactModel, ContactPageResponse, ContactImportResponse
 from src.services.auth import auth_service
+from src.services.cache import contact_versions, etag_matches
+from src.services.rate_limit import RateLimit
+from src.services.export import EXPORT_FIELDS, contact_dicts, ndjson_lines, csv_lines
+from src.services import contacts_import
 from src.database.models import User
 
 router = APIRouter(prefix='/contacts', tags=['contacts'])
 
 
+def make_etag(version: str, *parts) -> str:
+    """
+    The make_etag function builds a strong ETag from a contact version and whatever else shapes the response.
+
+    :param version: str: Version from contact_versions
+    :param *parts: Query parameters the response depends on
+    :return: The quoted ETag
+    :doc-author: Trelent
+    """
+    if not parts:
+        return f'"{version}"'
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                    headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+
 @router.get("/birthday_search", response_model=List[ContactResponse], description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def birthday_list(db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+            dependencies=[Depends(RateLimit(times=10, seconds=60))])
+async def birthday_list(db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     The birthday_list function returns a list of contacts with birthdays in the current month.
         The function takes two parameters: db and current_user.
         The db parameter is used to access the database, while the current_user parameter is used to identify which user's contact list should be returned.
 
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param current_user: User: Get the current user from the database
     :return: A list of contacts with a birthday in the next 30 days
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.birthday_list(current_user, db)
+    contacts = await repository_contacts.birthday_list(current_user, db, EXPORT_FIELDS)
     if contacts is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return contacts
+    return ORJSONResponse(contact_dicts(contacts))
 
 
 @router.get("/search_field{field_to_search}", response_model=List[ContactResponse],
             description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def search_field(part_to_search: str, db: Session = Depends(get_db),
-                       current_user: User = Depends(auth_service.get_current_user)):
+            dependencies=[Depends(RateLimit(times=10, seconds=60))])
+async def search_field(part_to_search: str, limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0),
+                       db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     The search_field function searches for a contact in the database.
         It takes a string as an argument and returns all contacts that contain this string in any of their fields.
         If no such contacts are found, it raises an HTTPException with status code 404.
 
     :param part_to_search: str: Specify the part of the field to search for
-    :param db: Session: Get the database session
+    :param limit: int: Maximum number of contacts to return
+    :param offset: int: Number of matching contacts to skip
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the user_id of the logged in user
     :return: A list of contacts that contain the string in any field
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.search_field(part_to_search, current_user, db)
+    contacts = await repository_contacts.search_field(part_to_search, current_user, db, limit, offset, EXPORT_FIELDS)
     if len(contacts) == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return contacts
+    return ORJSONResponse(contact_dicts(contacts))
 
 
-@router.get("/all", response_model=List[ContactResponse], description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def get_contacts(db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+@router.get("/search", response_model=List[ContactResponse], description='No more than 10 requests per minute',
+            dependencies=[Depends(RateLimit(times=10, seconds=60))])
+async def search_contacts(q: str = Query(min_length=1, max_length=100), limit: int = Query(50, ge=1, le=500),
+                          offset: int = Query(0, ge=0), db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
     """
-    The get_contacts function returns a list of contacts for the current user.
+    The search_contacts function runs a ranked full-text search over the names, email and additional info
+    of the current user's contacts. Every word of q must match the start of a word in the contact;
+    the best matches come first.
 
-    :param db: Session: Get the database session
+    :param q: str: Words to search for
+    :param limit: int: Maximum number of contacts to return
+    :param offset: int: Number of matching contacts to skip
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the current user from the auth_service
-    :return: A list of contacts
+    :return: A list of contacts, best match first
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.get_contacts(current_user, db)
-    if contacts is None:
+    contacts = await repository_contacts.search_contacts(q, current_user, db, limit, offset, EXPORT_FIELDS)
+    if len(contacts) == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return contacts
+    return ORJSONResponse(contact_dicts(contacts))
+
+
+@router.get("/search/fuzzy", response_model=List[ContactResponse], description='No more than 10 requests per minute',
+            dependencies=[Depends(RateLimit(times=10, seconds=60))])
+async def fuzzy_search(q: str = Query(min_length=1, max_length=100),
+                       threshold: float = Query(settings.fuzzy_search_threshold, gt=0, le=1),
+                       limit: int = Query(settings.fuzzy_search_limit, ge=1, le=100),
+                       db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The fuzzy_search function finds the current user's contacts by a name that may be misspelled.
+    Contacts whose first, last or full name is at least threshold similar to q are returned, most similar first.
+
+    :param q: str: Name to search for
+    :param threshold: float: Lowest similarity, from 0 to 1, of a returned contact
+    :param limit: int: Maximum number of contacts to return
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user from the auth_service
+    :return: A list of contacts, most similar first
+    :doc-author: Trelent
+    """
+    contacts = await repository_contacts.fuzzy_search(q, current_user, db, threshold, limit, EXPORT_FIELDS)
+    if len(contacts) == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return ORJSONResponse(contact_dicts(contacts))
+
+
+@router.get("/all", response_model=ContactPageResponse, description='No more than 10 requests per minute',
+            dependencies=[Depends(RateLimit(times=10, seconds=60))])
+async def get_contacts(limit: int = Query(50, ge=1, le=500), cursor: str | None = None,
+                       if_none_match: str | None = Header(None), db: AsyncSession = Depends(get_db),
+                       current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_contacts function returns a page of contacts for the current user.
+        Pass the next_cursor of a page as cursor to get the following one; it is null on the last page.
+        The page carries an ETag derived from the version of the user's contacts; sending it back
+        in If-None-Match gets a 304 without a database query while no contact has changed.
+        Contacts are selected as plain rows and encoded with orjson, without going through the response model.
+
+    :param limit: int: Maximum number of contacts on the page
+    :param cursor: str | None: Cursor of the page to return, omitted for the first page
+    :param if_none_match: str | None: ETag of the copy the client already has
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user from the auth_service
+    :return: A page of contacts and the cursor of the next page
+    :doc-author: Trelent
+    """
+    headers = {}
+    version = await contact_versions.collection(current_user.id)
+    if version is not None:
+        etag = make_etag(version, limit, cursor)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    try:
+        contacts, next_cursor = await repository_contacts.get_contacts(current_user, db, limit, cursor, EXPORT_FIELDS)
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    return ORJSONResponse({"contacts": contact_dicts(contacts), "next_cursor": next_cursor}, headers=headers)
+
+
+@router.get("/export", response_class=StreamingResponse, description='No more than 10 requests per minute',
+            dependencies=[Depends(RateLimit(times=10, seconds=60))])
+async def export_contacts(export_format: str = Query('ndjson', alias='format', regex='^(ndjson|csv)$'),
+                          db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The export_contacts function streams all contacts of the current user as NDJSON or CSV.
+        Rows are read from a server-side cursor and written out as they arrive,
+        so the whole address book is never held in memory.
+
+    :param export_format: str: Either ndjson or csv
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user from the auth_service
+    :return: A streaming response with the contacts
+    :doc-author: Trelent
+    """
+    rows = repository_contacts.stream_contacts(current_user, db, EXPORT_FIELDS)
+    if export_format == 'csv':
+        return StreamingResponse(csv_lines(rows), media_type='text/csv',
+                                 headers={'Content-Disposition': 'attachment; filename="contacts.csv"'})
+    return StreamingResponse(ndjson_lines(rows), media_type='application/x-ndjson',
+                             headers={'Content-Disposition': 'attachment; filename="contacts.ndjson"'})
 
 
 @router.post("/create", response_model=ContactResponse, status_code=status.HTTP_201_CREATED,
              description='No more than 10 requests per minute',
-             dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def create_contact(body: ContactModel, db: Session = Depends(get_db),
+             dependencies=[Depends(RateLimit(times=10, seconds=60))])
+async def create_contact(body: ContactModel, db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     The create_contact function creates a new contact in the database.
         The function takes a ContactModel object as input, which is validated by pydantic.
-        The function also takes an optional db Session object and current_user User object as inputs,
+        The function also takes an optional db AsyncSession object and current_user User object as inputs,
         both of which are provided by dependency injection via FastAPI's Depends decorator.
 
     :param body: ContactModel: Pass the contact data in a json format
-    :param db: Session: Pass the database session to the repository
+    :param db: AsyncSession: Pass the database session to the repository
     :param current_user: User: Get the current user from the database
     :return: A contactmodel object
     :doc-author: Trelent
@@ -92,40 +209,74 @@ async def create_contact(body: ContactModel, db: Session = Depends(get_db),
     return contact
 
 
+@router.post("/import", response_model=ContactImportResponse, description='No more than 10 requests per minute',
+             dependencies=[Depends(RateLimit(times=10, seconds=60))])
+async def import_contacts(file: UploadFile = File(),
+                          import_format: str = Query('ndjson', alias='format', regex='^(ndjson|csv)$'),
+                          db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The import_contacts function creates contacts in bulk from an uploaded NDJSON or CSV file.
+        Every row is validated like the body of /create. Valid rows are inserted in batches,
+        the rest are reported back with their row number and the reason they were rejected.
+
+    :param file: UploadFile: The NDJSON file, or CSV file with a header line, to import
+    :param import_format: str: Either ndjson or csv
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user from the auth_service
+    :return: The number of inserted contacts and the per-row errors
+    :doc-author: Trelent
+    """
+    return await contacts_import.import_contacts(file.file, import_format, current_user, db)
+
+
 @router.get("/{contact_id}", response_model=ContactResponse, description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def get_contact(contact_id: int, db: Session = Depends(get_db),
-                      current_user: User = Depends(auth_service.get_current_user)):
+            dependencies=[Depends(RateLimit(times=10, seconds=60))])
+async def get_contact(contact_id: int, response: Response, if_none_match: str | None = Header(None),
+                      db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     The get_contact function is used to retrieve a single contact from the database.
     It takes in an integer representing the ID of the contact, and returns a Contact object.
+    The contact carries an ETag derived from its version; sending it back in If-None-Match
+    gets a 304 without a database query while the contact is unchanged.
 
     :param contact_id: int: Specify the contact_id that is passed in the url
-    :param db: Session: Get the database session
+    :param response: Response: Set the ETag header
+    :param if_none_match: str | None: ETag of the copy the client already has
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the current user from the database
     :return: A contact based on the given id
     :doc-author: Trelent
     """
+    version = await contact_versions.contact(current_user.id, contact_id)
+    if version is not None:
+        etag = make_etag(version)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
     contact = await repository_contacts.get_contact(contact_id, current_user, db)
     if contact is None:
+        # the version was read before the query so that it can't be newer than the contact; drop it again
+        await contact_versions.forget(current_user.id, contact_id)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
     return contact
 
 
 @router.put("/update/{contact_id}", response_model=ContactResponse, description='No more than 10 requests per minute',
-            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def update_contact(body: ContactModel, contact_id: int, db: Session = Depends(get_db),
+            dependencies=[Depends(RateLimit(times=10, seconds=60))])
+async def update_contact(body: ContactModel, contact_id: int, db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     The update_contact function updates a contact in the database.
         The function takes three arguments:
             body: A ContactModel object containing the new values for the contact.
             contact_id: An integer representing the id of an existing contact to be updated.
-            db (optional): A Session object used to connect to and query a database, defaults to None if not provided.
+            db (optional): An AsyncSession object used to connect to and query a database, defaults to None if not provided.
 
     :param body: ContactModel: Get the contact data from the request body
     :param contact_id: int: Specify the id of the contact to delete
-    :param db: Session: Get a database session
+    :param db: AsyncSession: Get a database session
     :param current_user: User: Get the current user
     :return: The updated contact
     :doc-author: Trelent
@@ -138,21 +289,21 @@ async def update_contact(body: ContactModel, contact_id: int, db: Session = Depe
 
 @router.delete("/delete/{contact_id}", status_code=status.HTTP_204_NO_CONTENT,
                description='No more than 10 requests per minute',
-               dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def remove_contact(contact_id: int, db: Session = Depends(get_db),
+               dependencies=[Depends(RateLimit(times=10, seconds=60))])
+async def remove_contact(contact_id: int, db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     The remove_contact function removes a contact from the database.
-        The function takes in an integer representing the id of the contact to be removed,
-        and returns a dictionary containing information about that contact.
+        The function takes in an integer representing the id of the contact to be removed
+        and answers with an empty 204 response.
 
     :param contact_id: int: Specify the id of the contact to be removed
-    :param db: Session: Pass the database session to the repository layer
+    :param db: AsyncSession: Pass the database session to the repository layer
     :param current_user: User: Get the current user from the database
-    :return: A contact object
+    :return: An empty 204 response
     :doc-author: Trelent
     """
     contact = await repository_contacts.remove_contact(contact_id, current_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return contact
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
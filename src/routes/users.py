@@ -1,15 +1,13 @@
-from fastapi import APIRouter, Depends, status, UploadFile, File, BackgroundTasks, HTTPException, Request
-from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
+from fastapi import APIRouter, Depends, status, UploadFile, File, HTTPException, Request, BackgroundTasks
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.connect import get_db
+from src.database.connect import SessionLocal, get_db
 from src.database.models import User
 from src.repository import users as repository_users
+from src.repository import outbox as repository_outbox
 from src.services.auth import auth_service
-from config import settings
+from src.services.avatars import avatar_service
 from src.schemas import UserDb
-from src.services.email import send_email_password
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -26,55 +24,77 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
     return current_user
 
 
+async def store_avatar(key: str, data: bytes, email: str, url: str, previous_url: str | None) -> None:
+    """
+    The store_avatar function stores an avatar after the response has been sent, and puts back the previous
+    avatar of the user if that fails, so the user is never left with a URL that points to nothing.
+    The request's session is closed by then, so it opens its own.
+
+    :param key: str: The storage key of the avatar
+    :param data: bytes: The uploaded image
+    :param email: str: Email of the user
+    :param url: str: The URL of the new avatar
+    :param previous_url: str | None: The URL of the avatar it replaces
+    :return: None
+    :doc-author: Trelent
+    """
+    if await avatar_service.store(key, data):
+        return
+    async with SessionLocal() as db:
+        await repository_users.restore_avatar(email, url, previous_url, db)
+
+
 @router.patch('/avatar', response_model=UserDb)
-async def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user),
-                             db: Session = Depends(get_db)):
+async def update_avatar_user(background_tasks: BackgroundTasks, file: UploadFile = File(),
+                             current_user: User = Depends(auth_service.get_current_user),
+                             db: AsyncSession = Depends(get_db)):
     """
     The update_avatar_user function updates the avatar of a user.
         Args:
             file (UploadFile): The image to be uploaded as an avatar.
             current_user (User): The user whose avatar is being updated.  This is passed in by the auth_service dependency, which uses JWT tokens to authenticate users and pass them into functions that require authentication.  See auth_service for more details on how this works.
-            db (Session): A database session object used for querying and updating data in the database using SQLAlchemy's ORM methods, such as .query() or .add().
+            db (AsyncSession): A database session object used for querying and updating data in the database using SQLAlchemy's ORM methods, such as .execute() or .add().
+        The avatar URL is derived from the content of the file, so it is returned right away and the image is
+        resized and uploaded after the response. If that fails, the previous avatar is put back.
+        Uploading the current avatar again changes nothing.
 
-    :param file: UploadFile: Upload the file to cloudinary
+    :param background_tasks: BackgroundTasks: Resize and upload the image after the response
+    :param file: UploadFile: The image to use as the avatar
     :param current_user: User: Get the current user's email and username
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A user object
     :doc-author: Trelent
     """
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-
-    cloudinary.uploader.upload(file.file, public_id=f'ContactsApp/{current_user.username}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'ContactsApp/{current_user.username}') \
-        .build_url(width=250, height=250, crop='fill')
+    data = await avatar_service.read_upload(file)
+    key = avatar_service.key_for(current_user.id, data)
+    src_url = avatar_service.url_for(key)
+    if current_user.avatar == src_url:
+        return current_user
+    background_tasks.add_task(store_avatar, key, data, current_user.email, src_url, current_user.avatar)
     user = await repository_users.update_avatar(current_user.email, src_url, db)
     return user
 
 
 @router.patch('/update_password', response_model=UserDb)
-async def update_password_user(password, background_tasks: BackgroundTasks, request: Request,
+async def update_password_user(password, request: Request,
                                current_user: User = Depends(auth_service.get_current_user),
-                               db: Session = Depends(get_db)):
+                               db: AsyncSession = Depends(get_db)):
     """
     The update_password_user function updates the password of a user.
         The function takes in the new password, and returns the updated user object.
+        The notification email is added to the outbox in the same transaction as the new password.
 
     :param password: Get the password from the request body
-    :param background_tasks: BackgroundTasks: Add a task to the background queue
     :param request: Request: Get the base url of the server
     :param current_user: User: Get the current user
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: The user object
     :doc-author: Trelent
     """
-    password = auth_service.get_password_hash(password)
+    password = await auth_service.get_password_hash(password)
+    await repository_outbox.add_email("password_updated", current_user.email, current_user.username,
+                                      request.base_url, db)
     user = await repository_users.update_user_password(current_user.email, password, db)
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
-    background_tasks.add_task(send_email_password, user.email, user.username, request.base_url)
     return user
@@ -1,4 +1,5 @@
 from datetime import date, datetime
+from typing import List, Optional
 
 from pydantic import BaseModel, Field, EmailStr
 
@@ -9,7 +10,7 @@ class ContactModel(BaseModel):
     email: EmailStr
     phone: str = Field(min_length=6, max_length=16)
     birthday: date
-    additional_info: str = Field(min_length=3, max_length=300)
+    additional_info: Optional[str] = Field(None, min_length=3, max_length=300)
 
 
 class ContactResponse(BaseModel):
@@ -19,12 +20,27 @@ class ContactResponse(BaseModel):
     email: EmailStr = "andrew.lastname@gmail.com"
     phone: str = "+380958745896"
     birthday: date = date(year=1986, month=2, day=28)
-    additional_info: str = "some info"
+    additional_info: Optional[str] = "some info"
 
     class Config:
         orm_mode = True
 
 
+class ContactPageResponse(BaseModel):
+    contacts: List[ContactResponse]
+    next_cursor: Optional[str] = None
+
+
+class ContactImportError(BaseModel):
+    row: int
+    error: str
+
+
+class ContactImportResponse(BaseModel):
+    inserted: int
+    errors: List[ContactImportError]
+
+
 class UserModel(BaseModel):
     username: str = Field(min_length=5, max_length=16)
     email: str
@@ -1,17 +1,17 @@
 from typing import Optional
-import pickle
 
-import redis
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import settings
 from src.database.connect import get_db
 from src.repository import users as repository_users
+from src.services.cache import user_cache, TokenCache
+from src.services.hashing import PasswordHashPool, PoolBusyError
 
 
 class Auth:
@@ -19,13 +19,15 @@ class Auth:
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host='localhost', port=6379, db=0)
+    hash_pool = PasswordHashPool(settings.password_hash_workers, settings.password_hash_max_queue)
+    token_cache = TokenCache(settings.token_cache_size)
 
-    def verify_password(self, plain_password, hashed_password):
+    async def verify_password(self, plain_password, hashed_password):
         """
         The verify_password function takes a plain-text password and hashed
         password as arguments. It then uses the pwd_context object to verify that the
         plain-text password matches the hashed one.
+        The check runs on the password hashing pool, so it doesn't block the event loop.
 
         :param self: Make the method a bound method, meaning that it can be called on an instance of the class
         :param plain_password: Pass the password that is entered by the user
@@ -33,19 +35,26 @@ class Auth:
         :return: True or false depending on whether the password is correct
         :doc-author: Trelent
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await self._hash_pool_run(self.pwd_context.verify, plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    async def get_password_hash(self, password: str):
         """
         The get_password_hash function takes a password as input and returns the hash of that password.
         The hash is generated using the pwd_context object, which is an instance of Flask-Bcrypt's Bcrypt class.
+        Hashing runs on the password hashing pool, so it doesn't block the event loop.
 
         :param self: Represent the instance of the class
         :param password: str: Pass the password that will be hashed
         :return: A hash of the password
         :doc-author: Trelent
         """
-        return self.pwd_context.hash(password)
+        return await self._hash_pool_run(self.pwd_context.hash, password)
+
+    async def _hash_pool_run(self, func, *args):
+        try:
+            return await self.hash_pool.run(func, *args)
+        except PoolBusyError as err:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(err))
 
     # define a function to generate a new access token
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
@@ -116,7 +125,7 @@ class Auth:
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
         """
         The get_current_user function is a dependency that will be used in the
             UserRouter class. It takes in a token and db session, and returns the user
@@ -124,7 +133,7 @@ class Auth:
 
         :param self: Represent the instance of the class
         :param token: str: Get the token from the header of our request
-        :param db: Session: Pass the database session to the function
+        :param db: AsyncSession: Pass the database session to the function
         :return: The user object
         :doc-author: Trelent
         """
@@ -133,30 +142,26 @@ class Auth:
             detail="Could not validate credentials",
         )
 
-        try:
-            # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
+        payload = self.token_cache.get(token)
+        if payload is None:
+            try:
+                # Decode JWT
+                payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            except JWTError as e:
                 raise credentials_exception
-        except JWTError as e:
+            self.token_cache.set(token, payload)
+        if payload.get('scope') != 'access_token':
             raise credentials_exception
-
-        user = await repository_users.get_user_by_email(email, db)
-        if user is None:
+        email = payload.get("sub")
+        if email is None:
             raise credentials_exception
-        user = self.r.get(f"user:{email}")
+
+        user = await user_cache.get(email)
         if user is None:
             user = await repository_users.get_user_by_email(email, db)
             if user is None:
                 raise credentials_exception
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
+            await user_cache.set(user)
         return user
 
     def create_email_token(self, data: dict):
@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+import cloudinary
+import cloudinary.uploader
+from fastapi import HTTPException, UploadFile, status
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from config import settings
+
+CHUNK_SIZE = 64 * 1024
+
+
+def resize_avatar(data: bytes, size: int = 250, quality: int = 85) -> bytes:
+    """
+    The resize_avatar function crops an image to a square around its center, scales it to size x size pixels
+    and compresses it as a progressive JPEG. It is CPU bound and runs in the process pool of AvatarService.
+
+    :param data: bytes: The uploaded image
+    :param size: int: Width and height of the avatar in pixels
+    :param quality: int: JPEG quality
+    :return: The JPEG encoded avatar
+    :doc-author: Trelent
+    """
+    with Image.open(BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        output = BytesIO()
+        image.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+class CloudinaryStorage:
+    """
+    Stores avatars on Cloudinary. The SDK is configured once, and its blocking upload runs in a thread.
+    """
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str, folder: str = "ContactsApp"):
+        self.folder = folder
+        cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+
+    def url(self, key: str) -> str:
+        return cloudinary.CloudinaryImage(f"{self.folder}/{key}").build_url(format="jpg")
+
+    async def save(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(cloudinary.uploader.upload, BytesIO(data), public_id=f"{self.folder}/{key}",
+                                overwrite=True, resource_type="image")
+
+
+class LocalStorage:
+    """
+    Stores avatars as files under root, served by the app at base_url. Meant for development and tests.
+    """
+
+    def __init__(self, root: Path, base_url: str):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}.jpg"
+
+    def _write(self, key: str, data: bytes) -> None:
+        root = self.root.resolve()
+        path = (root / f"{key}.jpg").resolve()
+        if not path.is_relative_to(root):
+            raise ValueError(f"Avatar key {key!r} is outside of {root}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    async def save(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._write, key, data)
+
+
+class AvatarService:
+    """
+    Reads avatar uploads with a size cap, names them by the SHA-256 of their content so that the URL is known
+    before anything is stored and re-uploading the current avatar is a no-op, and resizes them in a process pool
+    before handing them to the storage backend.
+    """
+
+    def __init__(self, storage: CloudinaryStorage | LocalStorage, max_bytes: int = 5 * 1024 * 1024,
+                 size: int = 250, workers: int = 2):
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self.size = size
+        self.workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        # started on first use, so importing the app doesn't fork
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers)
+        return self._executor
+
+    async def read_upload(self, file: UploadFile) -> bytes:
+        """
+        The read_upload function reads an uploaded image in chunks, stopping as soon as it is larger
+        than max_bytes, and checks that it is an image Pillow can open without exceeding its pixel limit.
+
+        :param self: Represent the instance of the class
+        :param file: UploadFile: The uploaded file
+        :return: The content of the file
+        :raises HTTPException: 413 if the file is too large, 400 if it isn't an image or has too many pixels
+        :doc-author: Trelent
+        """
+        chunks, total = [], 0
+        while chunk := await file.read(CHUNK_SIZE):
+            total += len(chunk)
+            if total > self.max_bytes:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                    detail=f"Avatar must not be larger than {self.max_bytes} bytes")
+            chunks.append(chunk)
+        data = b"".join(chunks)
+        try:
+            # only parses the header; past MAX_IMAGE_PIXELS Pillow warns, past twice that it raises
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", Image.DecompressionBombWarning)
+                Image.open(BytesIO(data)).close()
+        except UnidentifiedImageError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Avatar is not an image")
+        except (Image.DecompressionBombWarning, Image.DecompressionBombError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Avatar has too many pixels")
+        return data
+
+    def key_for(self, user_id: int, data: bytes) -> str:
+        """
+        The key_for function names an avatar after the id of its owner and the hash of its content.
+        The username is left out: it is chosen by the user and would end up in a file path and a URL.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the owner
+        :param data: bytes: The uploaded image
+        :return: The storage key
+        :doc-author: Trelent
+        """
+        return f"{int(user_id)}/{hashlib.sha256(data).hexdigest()[:32]}"
+
+    def url_for(self, key: str) -> str:
+        return self.storage.url(key)
+
+    async def store(self, key: str, data: bytes) -> bool:
+        """
+        The store function resizes the image in the process pool and saves it under key.
+        It is meant to run after the response has been sent, so it reports a failure instead of raising it.
+
+        :param self: Represent the instance of the class
+        :param key: str: The storage key from key_for
+        :param data: bytes: The uploaded image
+        :return: True if the avatar was saved, False otherwise
+        :doc-author: Trelent
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            avatar = await loop.run_in_executor(self.executor, resize_avatar, data, self.size)
+            await self.storage.save(key, avatar)
+        except Exception as err:
+            print(err)
+            return False
+        return True
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+def storage_from_settings() -> CloudinaryStorage | LocalStorage:
+    """
+    The storage_from_settings function creates the avatar storage backend selected by settings.avatar_storage.
+
+    :return: A CloudinaryStorage or LocalStorage object
+    :doc-author: Trelent
+    """
+    if settings.avatar_storage == "local":
+        return LocalStorage(Path(settings.avatar_local_dir), settings.avatar_local_url)
+    return CloudinaryStorage(settings.cloudinary_name, settings.cloudinary_api_key, settings.cloudinary_api_secret)
+
+
+avatar_service = AvatarService(storage_from_settings(), max_bytes=settings.avatar_max_bytes,
+                               size=settings.avatar_size, workers=settings.avatar_workers)
@@ -0,0 +1,347 @@
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+import redis.asyncio as redis
+
+from src.database.models import User
+
+
+class UserCache:
+    """
+    Two-tier cache of the users looked up by get_current_user: a small in-process LRU with a short TTL
+    in front of Redis. Entries are stored as a compact, versioned JSON document rather than a pickled ORM object,
+    and every read builds a fresh detached User from it.
+    Writes through repository.users invalidate both tiers of the current process and the Redis tier of all of them;
+    other processes may serve their local copy for up to local_ttl seconds.
+    The Redis client is the application-wide one, assigned at startup; until then only the local tier is used.
+    """
+    VERSION = 1
+    FIELDS = ('id', 'username', 'email', 'password', 'created_at', 'avatar', 'confirmed')
+
+    def __init__(self, client: redis.Redis | None = None, ttl: int = 900, local_ttl: float = 10, maxsize: int = 1024):
+        self.redis = client
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.maxsize = maxsize
+        self._local: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    @staticmethod
+    def _key(email: str) -> str:
+        return f"user:{email}"
+
+    def _dumps(self, user: User) -> str:
+        data = {field: getattr(user, field) for field in self.FIELDS}
+        if data['created_at'] is not None:
+            data['created_at'] = data['created_at'].isoformat()
+        data['v'] = self.VERSION
+        return json.dumps(data, separators=(',', ':'))
+
+    def _loads(self, raw: bytes | str) -> dict | None:
+        data = json.loads(raw)
+        if data.pop('v', None) != self.VERSION:
+            return None
+        if data['created_at'] is not None:
+            data['created_at'] = datetime.fromisoformat(data['created_at'])
+        return data
+
+    def _remember(self, email: str, data: dict) -> None:
+        self._local[email] = (time.monotonic() + self.local_ttl, data)
+        self._local.move_to_end(email)
+        while len(self._local) > self.maxsize:
+            self._local.popitem(last=False)
+
+    async def get(self, email: str) -> User | None:
+        """
+        The get function returns the cached user with the given email, or None on a miss in both tiers.
+
+        :param self: Represent the instance of the class
+        :param email: str: Email of the user
+        :return: A detached User object or None
+        :doc-author: Trelent
+        """
+        entry = self._local.get(email)
+        if entry is not None:
+            expires_at, data = entry
+            if expires_at > time.monotonic():
+                self._local.move_to_end(email)
+                return User(**data)
+            del self._local[email]
+
+        if self.redis is None:
+            return None
+        try:
+            raw = await self.redis.get(self._key(email))
+        except redis.RedisError as err:
+            print(err)
+            return None
+        data = self._loads(raw) if raw is not None else None
+        if data is None:
+            return None
+        self._remember(email, data)
+        return User(**data)
+
+    async def set(self, user: User) -> None:
+        """
+        The set function stores the user in both tiers.
+
+        :param self: Represent the instance of the class
+        :param user: User: The user loaded from the database
+        :return: None
+        :doc-author: Trelent
+        """
+        raw = self._dumps(user)
+        self._remember(user.email, self._loads(raw))
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(self._key(user.email), raw, ex=self.ttl)
+        except redis.RedisError as err:
+            print(err)
+
+    async def invalidate(self, email: str) -> None:
+        """
+        The invalidate function drops the user with the given email from both tiers.
+        It must be called after every committed change to a user.
+
+        :param self: Represent the instance of the class
+        :param email: str: Email of the changed user
+        :return: None
+        :doc-author: Trelent
+        """
+        self._local.pop(email, None)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.delete(self._key(email))
+        except redis.RedisError as err:
+            print(err)
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified JWT claims keyed by the SHA-256 digest of the token, so the signature of a hot
+    access token is checked once per process instead of on every request. An entry is dropped as soon as the
+    token's exp has passed, so a cached token never outlives its own expiry. The cache lives in process memory
+    and holds only what the token itself already proves, so workers need no coordination.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> dict | None:
+        """
+        The get function returns the claims of a token verified earlier, or None if it isn't cached or has expired.
+
+        :param self: Represent the instance of the class
+        :param token: str: The encoded JWT
+        :return: A copy of the verified claims or None
+        :doc-author: Trelent
+        """
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, payload = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(payload)
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, token: str, payload: dict) -> None:
+        """
+        The set function remembers the claims of a token that has just been verified.
+        Tokens without an exp claim are not cached.
+
+        :param self: Represent the instance of the class
+        :param token: str: The encoded JWT
+        :param payload: dict: Its verified claims
+        :return: None
+        :doc-author: Trelent
+        """
+        expires_at = payload.get('exp')
+        if self.maxsize <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        key = self._key(token)
+        self._entries[key] = (expires_at, dict(payload))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class ContactVersions:
+    """
+    Opaque versions of each user's contact collection and of every single contact, used as ETags so that
+    a conditional GET can be answered with 304 before the database is touched.
+    A version is a random token rather than a counter: it changes on every write and, if its key is ever lost
+    (eviction, flush, TTL), a fresh token is drawn, so a version is never reused and a stale ETag can't match.
+    Versions live in Redis so that all workers agree; until a client is assigned, a process-local LRU of up to
+    maxsize versions is used.
+    A version that could not be replaced after a write is deleted instead; if Redis can't be reached for that
+    either, the delete is retried before every later read, and no version is handed out until it succeeds.
+    """
+
+    def __init__(self, client: redis.Redis | None = None, ttl: int = 7 * 24 * 3600, maxsize: int = 10000):
+        self.redis = client
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._local: OrderedDict[str, str] = OrderedDict()
+        self._stale: set[str] = set()
+
+    @staticmethod
+    def _collection_key(user_id: int) -> str:
+        return f"contacts:version:{user_id}"
+
+    @staticmethod
+    def _contact_key(user_id: int, contact_id: int) -> str:
+        return f"contact:version:{user_id}:{contact_id}"
+
+    def _local_get(self, key: str) -> str:
+        # a version evicted from the LRU is replaced by a fresh one, which only costs a 200 instead of a 304
+        version = self._local.get(key)
+        if version is None:
+            version = self._local[key] = uuid.uuid4().hex
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+        else:
+            self._local.move_to_end(key)
+        return version
+
+    async def _forget_stale(self) -> bool:
+        if not self._stale:
+            return True
+        try:
+            await self.redis.delete(*self._stale)
+        except redis.RedisError as err:
+            print(err)
+            return False
+        self._stale.clear()
+        return True
+
+    async def _get(self, key: str) -> str | None:
+        if self.redis is None:
+            return self._local_get(key)
+        if not await self._forget_stale():
+            return None
+        try:
+            version = await self.redis.get(key)
+            if version is None:
+                token = uuid.uuid4().hex
+                if await self.redis.set(key, token, ex=self.ttl, nx=True):
+                    return token
+                version = await self.redis.get(key)
+        except redis.RedisError as err:
+            print(err)
+            return None
+        return version.decode() if isinstance(version, bytes) else version
+
+    async def collection(self, user_id: int) -> str | None:
+        """
+        The collection function returns the current version of the user's contact collection.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the owner of the contacts
+        :return: The version, or None if it can't be read
+        :doc-author: Trelent
+        """
+        return await self._get(self._collection_key(user_id))
+
+    async def contact(self, user_id: int, contact_id: int) -> str | None:
+        """
+        The contact function returns the current version of a single contact.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the owner of the contact
+        :param contact_id: int: Id of the contact
+        :return: The version, or None if it can't be read
+        :doc-author: Trelent
+        """
+        return await self._get(self._contact_key(user_id, contact_id))
+
+    async def bump(self, user_id: int, *contact_ids: int) -> None:
+        """
+        The bump function gives the user's contact collection, and the given contacts, new versions.
+        It must be called after every committed change to the user's contacts. If the new versions can't be
+        written, the old ones are deleted, so that no ETag issued before the change matches again.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the owner of the contacts
+        :param *contact_ids: int: Ids of the changed contacts
+        :return: None
+        :doc-author: Trelent
+        """
+        keys = [self._collection_key(user_id)] + [self._contact_key(user_id, contact_id) for contact_id in contact_ids]
+        if self.redis is None:
+            for key in keys:
+                self._local.pop(key, None)
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.set(key, uuid.uuid4().hex, ex=self.ttl)
+                await pipe.execute()
+        except redis.RedisError as err:
+            print(err)
+            self._stale.update(keys)
+            await self._forget_stale()
+
+    async def forget(self, user_id: int, contact_id: int) -> None:
+        """
+        The forget function drops the version of a contact, so that none is kept for a contact that doesn't exist.
+        A version that is dropped by mistake costs nothing but a fresh one.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the owner of the contact
+        :param contact_id: int: Id of the contact
+        :return: None
+        :doc-author: Trelent
+        """
+        key = self._contact_key(user_id, contact_id)
+        if self.redis is None:
+            self._local.pop(key, None)
+            return
+        self._stale.add(key)
+        await self._forget_stale()
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    The etag_matches function tells whether an If-None-Match header matches the given ETag,
+    using the weak comparison that RFC 9110 prescribes for If-None-Match.
+
+    :param if_none_match: str | None: Value of the If-None-Match header
+    :param etag: str: The current ETag, quoted
+    :return: True if the client's copy is current
+    :doc-author: Trelent
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+user_cache = UserCache()
+contact_versions = ContactVersions()
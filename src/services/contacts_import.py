@@ -0,0 +1,133 @@
+import asyncio
+import csv
+import io
+import json
+from itertools import islice
+from typing import BinaryIO, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import User
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactModel
+
+OPTIONAL_FIELDS = {name for name, field in ContactModel.__fields__.items() if not field.required}
+
+
+def read_rows(file: BinaryIO, import_format: str) -> Iterator[tuple[int, dict | str]]:
+    """
+    The read_rows function parses an uploaded CSV (with a header line) or NDJSON file one row at a time.
+    CSV has no null, so an empty cell of an optional field is read as None.
+
+    :param file: BinaryIO: The uploaded file
+    :param import_format: str: Either csv or ndjson
+    :return: An iterator of (row number, row data) pairs, where row data is an error message if the row can't be parsed
+    :doc-author: Trelent
+    """
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        if import_format == 'csv':
+            for number, row in enumerate(csv.DictReader(text), start=1):
+                yield number, {key: None if value == '' and key in OPTIONAL_FIELDS else value
+                               for key, value in row.items()}
+            return
+        number = 0
+        for line in text:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield number, 'Invalid JSON'
+                continue
+            yield number, row if isinstance(row, dict) else 'Expected a JSON object'
+    except UnicodeDecodeError:
+        yield 0, 'File is not valid UTF-8'
+    finally:
+        text.detach()
+
+
+def _describe(err: ValidationError) -> str:
+    return '; '.join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in err.errors())
+
+
+def parse_chunk(rows: Iterator[tuple[int, dict | str]], chunk_size: int, seen_emails: set[str],
+                seen_phones: set[str]) -> tuple[list[tuple[int, ContactModel]], list[dict]] | None:
+    """
+    The parse_chunk function reads the next chunk_size rows and validates them with ContactModel. Reading may block
+    on the spooled file and validation is CPU bound, so it is meant to run in a thread.
+
+    :param rows: Iterator[tuple[int, dict | str]]: The rows from read_rows
+    :param chunk_size: int: Number of rows to read
+    :param seen_emails: set[str]: Emails of the earlier valid rows, updated with those of this chunk
+    :param seen_phones: set[str]: Phones of the earlier valid rows, updated with those of this chunk
+    :return: The valid rows with their row numbers and the per-row errors, or None once there are no rows left
+    :doc-author: Trelent
+    """
+    chunk = list(islice(rows, chunk_size))
+    if not chunk:
+        return None
+    valid, errors = [], []
+    for number, data in chunk:
+        if isinstance(data, str):
+            errors.append({"row": number, "error": data})
+            continue
+        try:
+            body = ContactModel.parse_obj(data)
+        except ValidationError as err:
+            errors.append({"row": number, "error": _describe(err)})
+            continue
+        if body.email in seen_emails:
+            errors.append({"row": number, "error": "Duplicate email in upload"})
+            continue
+        if body.phone in seen_phones:
+            errors.append({"row": number, "error": "Duplicate phone in upload"})
+            continue
+        seen_emails.add(body.email)
+        seen_phones.add(body.phone)
+        valid.append((number, body))
+    return valid, errors
+
+
+async def import_contacts(file: BinaryIO, import_format: str, user: User, db: AsyncSession,
+                          chunk_size: int = 1000) -> dict:
+    """
+    The import_contacts function validates the rows of an uploaded file with ContactModel and inserts the valid ones
+    chunk_size rows at a time, one multi-row INSERT and one transaction per chunk.
+    Rows that fail validation, repeat an email or phone of an earlier row, or clash with an existing contact
+    are reported instead of inserted. Each chunk is read and validated in a thread by parse_chunk,
+    so only the database calls run on the event loop.
+
+    :param file: BinaryIO: The uploaded file, already spooled by the multipart parser
+    :param import_format: str: Either csv or ndjson
+    :param user: User: The user who owns the imported contacts
+    :param db: AsyncSession: Access the database
+    :param chunk_size: int: Number of rows validated and inserted per batch
+    :return: A dictionary with the number of inserted contacts and the per-row errors
+    :doc-author: Trelent
+    """
+    inserted = 0
+    errors = []
+    seen_emails, seen_phones = set(), set()
+    rows = read_rows(file, import_format)
+    while parsed := await asyncio.to_thread(parse_chunk, rows, chunk_size, seen_emails, seen_phones):
+        valid, chunk_errors = parsed
+        errors.extend(chunk_errors)
+        if not valid:
+            continue
+
+        bodies = [body for _, body in valid]
+        ids = await repository_contacts.create_contacts(bodies, user, db)
+        skipped = [(number, body) for (number, body), contact_id in zip(valid, ids) if contact_id is None]
+        inserted += len(bodies) - len(skipped)
+        if skipped:
+            taken_emails, _ = await repository_contacts.get_taken_emails_and_phones(
+                [body.email for _, body in skipped], [body.phone for _, body in skipped], db)
+            for number, body in skipped:
+                error = "Email already exists" if body.email in taken_emails else "Phone already exists"
+                errors.append({"row": number, "error": error})
+
+    errors.sort(key=lambda error: error["row"])
+    return {"inserted": inserted, "errors": errors}
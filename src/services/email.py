@@ -1,11 +1,14 @@
+from email.message import Message
+from email.utils import formataddr
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+from fastapi_mail import ConnectionConfig
 from pydantic import EmailStr
 
 from config import settings
 from src.services.auth import auth_service
+from src.services.mail import SMTPPool, Mailer
+from src.services.rendering import TemplateRenderer
 
 conf = ConnectionConfig(
     MAIL_USERNAME=settings.mail_username,
@@ -21,10 +24,23 @@ conf = ConnectionConfig(
     TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
 )
 
+renderer = TemplateRenderer(conf.TEMPLATE_FOLDER, sender=formataddr((conf.MAIL_FROM_NAME, conf.MAIL_FROM)))
+confirm_email_template = renderer.template("email_template.html", "Confirm your email ")
+password_email_template = renderer.template("email_password_template.html", "Your information was updated")
 
-async def send_email(email: EmailStr, username: str, host: str):
+mailer = Mailer(
+    SMTPPool(settings.mail_pool_size, hostname=conf.MAIL_SERVER, port=conf.MAIL_PORT,
+             username=conf.MAIL_USERNAME, password=conf.MAIL_PASSWORD, use_tls=conf.MAIL_SSL_TLS,
+             start_tls=conf.MAIL_STARTTLS, validate_certs=conf.VALIDATE_CERTS, timeout=conf.TIMEOUT),
+    batch_size=settings.mail_batch_size,
+    max_retries=settings.mail_max_retries,
+    backoff=settings.mail_retry_backoff,
+)
+
+
+def confirm_email_message(email: EmailStr, username: str, host: str) -> Message:
     """
-    The send_email function sends an email to the user with a link to confirm their email address.
+    The confirm_email_message function builds an email to the user with a link to confirm their email address.
         The function takes in three parameters:
             -email: EmailStr, the user's email address.
             -username: str, the username of the user who is registering for an account.  This will be used in a greeting message within the body of the email sent to them.
@@ -33,27 +49,16 @@ async def send_email(email: EmailStr, username: str, host: str):
     :param email: EmailStr: Validate the email address
     :param username: str: Get the username of the user
     :param host: str: Send the host to the email template
-    :return: A coroutine object, which is an awaitable
+    :return: A Message object
     :doc-author: Trelent
     """
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
+    token_verification = auth_service.create_email_token({"sub": email})
+    return confirm_email_template.build(email, host=host, username=username, token=token_verification)
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
 
-
-async def send_email_password(email: EmailStr, username: str, host: str):
+def password_email_message(email: EmailStr, username: str, host: str) -> Message:
     """
-    The send_email_password function sends an email to the user with a link to reset their password.
+    The password_email_message function builds an email to the user with a link to reset their password.
         Args:
             email (str): The user's email address.
             username (str): The user's username.
@@ -62,19 +67,15 @@ async def send_email_password(email: EmailStr, username: str, host: str):
     :param email: EmailStr: Specify the email address of the recipient
     :param username: str: Pass the username to the template
     :param host: str: Create the link to the reset password page
-    :return: A coroutine object
+    :return: A Message object
     :doc-author: Trelent
     """
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Your information was updated",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
+    token_verification = auth_service.create_email_token({"sub": email})
+    return password_email_template.build(email, host=host, username=username, token=token_verification)
+
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_password_template.html")
-    except ConnectionErrors as err:
-        print(err)
+# kinds of emails that can be added to the outbox
+EMAILS = {
+    "confirm_email": confirm_email_message,
+    "password_updated": password_email_message,
+}
@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import AsyncIterator, Iterable, Sequence
+
+from src.schemas import ContactResponse
+
+EXPORT_FIELDS = list(ContactResponse.__fields__)
+
+
+def _to_json(value):
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def contact_dicts(rows: Iterable[Sequence]) -> list[dict]:
+    """
+    The contact_dicts function turns contact rows into dictionaries with the same fields and values
+    as ContactResponse, ready for ORJSONResponse. This skips validating every row through the response model,
+    which dominates the time of large list responses; the rows come straight from the database
+    and need no validation, only the birthday column is stored as a datetime and cut to its date.
+
+    :param rows: Iterable[Sequence]: Rows with the columns of EXPORT_FIELDS, in that order
+    :return: A list of dictionaries
+    :doc-author: Trelent
+    """
+    contacts = []
+    for row in rows:
+        contact = dict(zip(EXPORT_FIELDS, row))
+        birthday = contact["birthday"]
+        if isinstance(birthday, datetime):
+            contact["birthday"] = birthday.date()
+        contacts.append(contact)
+    return contacts
+
+
+async def ndjson_lines(rows: AsyncIterator[Sequence], batch_size: int = 1000) -> AsyncIterator[str]:
+    """
+    The ndjson_lines function turns contact rows into newline-delimited JSON,
+    one object per contact with the same fields as ContactResponse.
+
+    :param rows: AsyncIterator[Sequence]: Rows with the columns of EXPORT_FIELDS, in that order
+    :param batch_size: int: Number of lines joined into each chunk
+    :return: An async iterator of text chunks
+    :doc-author: Trelent
+    """
+    chunk = []
+    async for row in rows:
+        chunk.append(json.dumps(dict(zip(EXPORT_FIELDS, row)), default=_to_json))
+        if len(chunk) >= batch_size:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+async def csv_lines(rows: AsyncIterator[Sequence], batch_size: int = 1000) -> AsyncIterator[str]:
+    """
+    The csv_lines function turns contact rows into CSV with a header line of the ContactResponse fields.
+
+    :param rows: AsyncIterator[Sequence]: Rows with the columns of EXPORT_FIELDS, in that order
+    :param batch_size: int: Number of lines written into each chunk
+    :return: An async iterator of text chunks
+    :doc-author: Trelent
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    count = 0
+    async for row in rows:
+        writer.writerow(_to_json(value) if isinstance(value, date) else value for value in row)
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,99 @@
+import heapq
+import re
+from typing import Iterable
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    The trigrams function splits text into the trigrams it is compared on, the same way as pg_trgm:
+    every word is lower-cased and padded with two spaces in front and one behind, so the start of a word
+    weighs more than its end and the similarity computed here agrees with the database's.
+
+    :param text: str: The text to split
+    :return: The set of trigrams of the text
+    :doc-author: Trelent
+    """
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _jaccard(first: set[str], second: set[str]) -> float:
+    if not first or not second:
+        return 0.0
+    common = len(first & second)
+    return common / (len(first) + len(second) - common)
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    The similarity function returns how alike two strings are, from 0 (no trigram in common) to 1
+    (the same trigrams), as the share of their trigrams they have in common, like pg_trgm's similarity().
+
+    :param a: str: One string
+    :param b: str: The other string
+    :return: The similarity of the strings
+    :doc-author: Trelent
+    """
+    return _jaccard(trigrams(a), trigrams(b))
+
+
+def _name_score(query: set[str], first_name: str, last_name: str) -> float:
+    first, last = trigrams(first_name), trigrams(last_name)
+    # trigrams never span words, so those of the full name are the union of the two
+    return max(_jaccard(query, first), _jaccard(query, last), _jaccard(query, first | last))
+
+
+def name_similarity(query: str, first_name: str, last_name: str) -> float:
+    """
+    The name_similarity function scores a contact against a fuzzy search query: the best similarity
+    of the query to the first name, the last name or the full name, so "wilsn" finds Wilson
+    and "wade wilsn" finds Wade Wilson.
+
+    :param query: str: The search query
+    :param first_name: str: First name of the contact
+    :param last_name: str: Last name of the contact
+    :return: The score of the contact, from 0 to 1
+    :doc-author: Trelent
+    """
+    return _name_score(trigrams(query), first_name, last_name)
+
+
+def rank_names(query: str, names: Iterable[tuple[int, str, str]], threshold: float, limit: int) -> list[int]:
+    """
+    The rank_names function scores contacts with name_similarity and keeps the best ones.
+
+    :param query: str: The search query
+    :param names: Iterable[tuple[int, str, str]]: The id, first name and last name of every candidate
+    :param threshold: float: Lowest score of a contact to be kept
+    :param limit: int: Maximum number of contacts to keep
+    :return: The ids of the kept contacts, best score first and then by id
+    :doc-author: Trelent
+    """
+    grams = trigrams(query)
+    scored = []
+    for contact_id, first_name, last_name in names:
+        score = _name_score(grams, first_name, last_name)
+        if score >= threshold:
+            scored.append((-score, contact_id))
+    return [contact_id for _, contact_id in heapq.nsmallest(limit, scored)]
+
+
+def index_trigrams(query: str) -> list[str]:
+    """
+    The index_trigrams function returns the unpadded trigrams of the words of a query, the ones an FTS5
+    trigram index can look up. Words shorter than three characters have none.
+
+    :param query: str: The search query
+    :return: The distinct trigrams, in the order they appear
+    :doc-author: Trelent
+    """
+    grams = {}
+    for word in _WORD.findall(query.lower()):
+        for i in range(len(word) - 2):
+            grams[word[i:i + 3]] = None
+    return list(grams)
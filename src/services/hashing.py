@@ -0,0 +1,72 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class PoolBusyError(Exception):
+    pass
+
+
+def _timed(func: Callable[..., T], args: tuple) -> tuple[float, float, T]:
+    started = time.perf_counter()
+    result = func(*args)
+    return started, time.perf_counter(), result
+
+
+class PasswordHashPool:
+    """
+    Bounded thread pool for password hashing and verification. bcrypt releases the GIL while it works,
+    so at most `workers` hashes run in parallel without stalling the event loop; up to `max_queue` more wait
+    for a free thread, and anything beyond that is rejected with PoolBusyError instead of piling up.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.pending = 0
+        self.completed_total = 0
+        self.rejected_total = 0
+        self.wait_seconds_total = 0.0
+        self.run_seconds_total = 0.0
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        """
+        The run function calls func(*args) on a pool thread and waits for the result without blocking the event loop.
+
+        :param self: Represent the instance of the class
+        :param func: Callable[..., T]: The blocking function to call
+        :param args: Positional arguments for func
+        :return: What func returns
+        :raises PoolBusyError: If workers + max_queue calls are already in flight
+        :doc-author: Trelent
+        """
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected_total += 1
+            raise PoolBusyError("Too many password operations in progress")
+        self.pending += 1
+        submitted = time.perf_counter()
+        try:
+            started, finished, result = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _timed, func, args)
+        finally:
+            self.pending -= 1
+        self.completed_total += 1
+        self.wait_seconds_total += started - submitted
+        self.run_seconds_total += finished - started
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "running": min(self.pending, self.workers),
+            "queued": max(self.pending - self.workers, 0),
+            "completed_total": self.completed_total,
+            "rejected_total": self.rejected_total,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "run_seconds_total": round(self.run_seconds_total, 6),
+        }
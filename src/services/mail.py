@@ -0,0 +1,183 @@
+import asyncio
+from email.message import Message
+
+import aiosmtplib
+
+
+class SMTPPool:
+    """
+    Pool of at most `size` persistent, authenticated SMTP connections. A connection is opened on first use,
+    reused until the server drops it, and discarded by the caller when sending over it fails.
+    """
+
+    def __init__(self, size: int, **smtp_kwargs):
+        self.size = size
+        self.smtp_kwargs = smtp_kwargs
+        self.opened_total = 0
+        self._slots = asyncio.Semaphore(size)
+        self._idle: list[aiosmtplib.SMTP] = []
+
+    async def acquire(self) -> aiosmtplib.SMTP:
+        """
+        The acquire function returns a connected SMTP client, waiting while all `size` of them are in use.
+
+        :param self: Represent the instance of the class
+        :return: A connected SMTP client
+        :raises OSError: If a new connection can't be opened
+        :doc-author: Trelent
+        """
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                smtp = self._idle.pop()
+                if smtp.is_connected:
+                    return smtp
+            smtp = aiosmtplib.SMTP(**self.smtp_kwargs)
+            await smtp.connect()
+            self.opened_total += 1
+            return smtp
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, smtp: aiosmtplib.SMTP, discard: bool = False) -> None:
+        """
+        The release function gives a connection back to the pool, or closes it if discard is set.
+
+        :param self: Represent the instance of the class
+        :param smtp: aiosmtplib.SMTP: The connection returned by acquire
+        :param discard: bool: Close the connection instead of reusing it
+        :return: None
+        :doc-author: Trelent
+        """
+        if discard or not smtp.is_connected:
+            smtp.close()
+        else:
+            self._idle.append(smtp)
+        self._slots.release()
+
+    async def close(self) -> None:
+        """
+        The close function quits all idle connections.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        while self._idle:
+            smtp = self._idle.pop()
+            try:
+                await smtp.quit()
+            except (aiosmtplib.SMTPException, OSError):
+                smtp.close()
+
+
+class Mailer:
+    """
+    Delivers messages in batches of batch_size, each batch over one pooled SMTP connection. Messages whose
+    connection fails are retried with exponential backoff, up to max_retries times; messages the server rejects
+    are counted as failed.
+    """
+
+    def __init__(self, pool: SMTPPool, batch_size: int = 20, max_retries: int = 3, backoff: float = 1.0):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.sent_total = 0
+        self.failed_total = 0
+        self.retries_total = 0
+        self.batches_total = 0
+
+    async def deliver(self, batch: list[Message], deadline: float | None = None) -> list[Message]:
+        """
+        The deliver function sends a batch of messages over one pooled connection,
+        retrying the unsent rest of the batch on a fresh connection when the current one fails.
+        Past the deadline no message is started and no retry is waited for; the unsent ones are returned.
+
+        :param self: Represent the instance of the class
+        :param batch: list[Message]: The messages to send
+        :param deadline: float | None: Event loop time by which sending must stop, None for no limit
+        :return: The messages that were rejected or could not be sent
+        :doc-author: Trelent
+        """
+        loop = asyncio.get_running_loop()
+
+        def left() -> float | None:
+            return None if deadline is None else deadline - loop.time()
+
+        self.batches_total += 1
+        remaining = list(batch)
+        failed = []
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = self.backoff * 2 ** (attempt - 1)
+                if deadline is not None and left() <= delay:
+                    break
+                self.retries_total += 1
+                await asyncio.sleep(delay)
+            try:
+                smtp = await asyncio.wait_for(self.pool.acquire(), left())
+            except asyncio.TimeoutError:
+                break
+            except OSError as err:
+                print(err)
+                continue
+            except aiosmtplib.SMTPException as err:
+                # e.g. rejected credentials, retrying won't help
+                print(err)
+                break
+            broken = False
+            try:
+                while remaining and (deadline is None or left() > 0):
+                    try:
+                        await smtp.send_message(remaining[0])
+                        self.sent_total += 1
+                    except (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPResponseException) as err:
+                        print(err)
+                        self.failed_total += 1
+                        failed.append(remaining[0])
+                    remaining.pop(0)
+            except OSError as err:
+                print(err)
+                broken = True
+            finally:
+                await self.pool.release(smtp, discard=broken)
+            if not broken:
+                break
+        self.failed_total += len(remaining)
+        return failed + remaining
+
+    async def deliver_all(self, messages: list[Message], deadline: float | None = None) -> list[Message]:
+        """
+        The deliver_all function splits messages into batches of batch_size and delivers them concurrently,
+        as many at a time as the pool has connections.
+
+        :param self: Represent the instance of the class
+        :param messages: list[Message]: The messages to send
+        :param deadline: float | None: Event loop time by which sending must stop, None for no limit
+        :return: The messages that were rejected or could not be sent
+        :doc-author: Trelent
+        """
+        batches = [messages[start:start + self.batch_size] for start in range(0, len(messages), self.batch_size)]
+        results = await asyncio.gather(*(self.deliver(batch, deadline) for batch in batches))
+        return [message for failed in results for message in failed]
+
+    async def close(self) -> None:
+        """
+        The close function closes the pooled connections.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        await self.pool.close()
+
+    def stats(self) -> dict:
+        return {
+            "sent_total": self.sent_total,
+            "failed_total": self.failed_total,
+            "retries_total": self.retries_total,
+            "batches_total": self.batches_total,
+            "connections_opened_total": self.pool.opened_total,
+        }
@@ -0,0 +1,221 @@
+import time
+from contextvars import ContextVar
+from typing import Callable
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.services.query_log import query_log
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10)
+COMMAND_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1)
+
+REQUESTS = Counter("http_requests_total", "HTTP requests handled", ["method", "route", "status"])
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Time to handle an HTTP request", ["method", "route"],
+                            buckets=LATENCY_BUCKETS)
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled")
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed while handling requests", ["route"])
+DB_TIME = Counter("db_query_seconds_total", "Time spent executing SQL statements while handling requests",
+                  ["route"])
+REDIS_LATENCY = Histogram("redis_command_duration_seconds", "Round trip time of Redis commands", ["command"],
+                          buckets=COMMAND_BUCKETS)
+RATE_LIMITED = Counter("rate_limit_rejections_total", "Requests rejected by the rate limiter", ["route"])
+
+UNMATCHED = "unmatched"
+
+
+class RequestMetrics:
+    """
+    What one request spent on the database and Redis, filled in by the instrumentation while the request runs.
+    statements counts how many times each distinct SQL statement ran, to spot N+1 query patterns.
+    Durations are in nanoseconds.
+    """
+    __slots__ = ("db_queries", "db_ns", "statements", "redis_commands", "redis_ns")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_ns = 0
+        self.statements: dict[str, int] = {}
+        self.redis_commands = 0
+        self.redis_ns = 0
+
+
+current_request: ContextVar[RequestMetrics | None] = ContextVar("current_request", default=None)
+
+_route_paths: dict = {}
+
+
+def route_label(scope: dict) -> str:
+    """
+    The route_label function returns the path template of the route that handled the request, e.g.
+    /api/contacts/{contact_id}, so that label values stay bounded whatever paths clients request.
+
+    :param scope: dict: The ASGI scope of the request, after routing
+    :return: The path template, or "unmatched"
+    :doc-author: Trelent
+    """
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return UNMATCHED
+    path = _route_paths.get(endpoint)
+    if path is None:
+        path = next((route.path for route in scope["app"].routes if getattr(route, "endpoint", None) is endpoint),
+                    UNMATCHED)
+        _route_paths[endpoint] = path
+    return path
+
+
+def start_request() -> RequestMetrics:
+    """
+    The start_request function begins collecting the database and Redis usage of the current request.
+
+    :return: The RequestMetrics of the request
+    :doc-author: Trelent
+    """
+    stats = RequestMetrics()
+    current_request.set(stats)
+    return stats
+
+
+def observe_request(method: str, route: str, status: int, duration_ns: int, stats: RequestMetrics) -> None:
+    """
+    The observe_request function records a finished request.
+
+    :param method: str: HTTP method
+    :param route: str: Label from route_label
+    :param status: int: Status code of the response
+    :param duration_ns: int: Time it took to handle the request, in nanoseconds
+    :param stats: RequestMetrics: What the request spent on the database and Redis
+    :return: None
+    :doc-author: Trelent
+    """
+    REQUESTS.labels(method, route, status).inc()
+    REQUEST_LATENCY.labels(method, route).observe(duration_ns / 1e9)
+    if stats.db_queries:
+        DB_QUERIES.labels(route).inc(stats.db_queries)
+        DB_TIME.labels(route).inc(stats.db_ns / 1e9)
+        query_log.check_request(method, route, stats.statements)
+
+
+def server_timing(stats: RequestMetrics, total_ns: int) -> str:
+    """
+    The server_timing function describes where the time of a request went as a Server-Timing header value:
+    the total, the time spent in the app itself, and the time spent waiting on the database and on Redis.
+
+    :param stats: RequestMetrics: What the request spent on the database and Redis
+    :param total_ns: int: Time it took to handle the request, in nanoseconds
+    :return: The header value
+    :doc-author: Trelent
+    """
+    app_ns = max(total_ns - stats.db_ns - stats.redis_ns, 0)
+    return (f'total;dur={total_ns / 1e6:.2f}, app;dur={app_ns / 1e6:.2f}, '
+            f'db;dur={stats.db_ns / 1e6:.2f};desc="{stats.db_queries} queries", '
+            f'redis;dur={stats.redis_ns / 1e6:.2f};desc="{stats.redis_commands} commands"')
+
+
+def observe_redis(command: str, duration_ns: int) -> None:
+    REDIS_LATENCY.labels(command).observe(duration_ns / 1e9)
+    stats = current_request.get()
+    if stats is not None:
+        stats.redis_commands += 1
+        stats.redis_ns += duration_ns
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter_ns()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration_ns = time.perf_counter_ns() - context._query_started
+    stats = current_request.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_ns += duration_ns
+        stats.statements[statement] = stats.statements.get(statement, 0) + 1
+    query_log.observe(statement, duration_ns / 1e9)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    The instrument_engine function counts the statements the engine executes, and the time they take,
+    against the current request, and passes them to the slow query log.
+
+    :param engine: AsyncEngine: The application engine
+    :return: None
+    :doc-author: Trelent
+    """
+    if not event.contains(engine.sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def engine_pool_stats(engine: AsyncEngine) -> dict:
+    """
+    The engine_pool_stats function returns the state of the engine's connection pool.
+
+    :param engine: AsyncEngine: The application engine
+    :return: A dictionary with the checked out, overflow and configured connections, empty for pools without them
+    :doc-author: Trelent
+    """
+    pool = engine.sync_engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    return {"checked_out": pool.checkedout(), "overflow": max(pool.overflow(), 0), "size": pool.size()}
+
+
+class TimingMiddleware:
+    """
+    Times every HTTP request and records it in the metrics served at /metrics. The response gets
+    a My-Process-Time header in seconds and a Server-Timing header splitting the time up to the response start
+    into app, database and Redis time. It is a plain ASGI middleware: it only wraps send, where
+    BaseHTTPMiddleware would run the app in a separate task and stream the body through a queue.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = start_request()
+        IN_FLIGHT.inc()
+        start = time.perf_counter_ns()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed = time.perf_counter_ns() - start
+                headers = MutableHeaders(scope=message)
+                headers.append("My-Process-Time", str(elapsed / 1e9))
+                headers.append("Server-Timing", server_timing(stats, elapsed))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            IN_FLIGHT.dec()
+            observe_request(scope["method"], route_label(scope), status_code, time.perf_counter_ns() - start, stats)
+
+
+class StatsCollector:
+    """
+    Exposes the stats() dictionaries of the app's pools and caches as gauges named <prefix>_<key>,
+    read at scrape time.
+    """
+
+    def __init__(self, sources: dict[str, Callable[[], dict]]):
+        self.sources = sources
+
+    def collect(self):
+        for prefix, stats in self.sources.items():
+            for key, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield GaugeMetricFamily(f"{prefix}_{key}", f"{prefix} {key.replace('_', ' ')}", value=value)
@@ -0,0 +1,135 @@
+"""
+Worker process that sends the emails in the outbox table. It runs apart from the API workers and can be scaled
+on its own; start as many as needed with::
+
+    python -m src.services.outbox
+
+Each worker serves its outbox and mail counters as Prometheus metrics on port outbox_metrics_port (0 disables it).
+"""
+import asyncio
+import signal
+
+from prometheus_client import REGISTRY, start_http_server
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from config import settings
+from src.database.connect import SessionLocal
+from src.repository import outbox as repository_outbox
+from src.services.email import EMAILS, mailer
+from src.services.mail import Mailer
+from src.services.metrics import StatsCollector
+
+
+class OutboxWorker:
+    """
+    Claims due emails from the outbox in batches, renders them and sends them through a Mailer.
+    Emails that fail are made due again after retry_delay seconds and are given up after max_attempts claims.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, mailer: Mailer, batch_size: int = 100,
+                 poll_interval: float = 1.0, lease: float = 300, max_attempts: int = 5, retry_delay: float = 60):
+        self.session_factory = session_factory
+        self.mailer = mailer
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.stopping = asyncio.Event()
+        self.batches_total = 0
+        self.claimed_total = 0
+        self.sent_total = 0
+        self.retried_total = 0
+
+    async def run_once(self) -> int:
+        """
+        The run_once function claims one batch of due emails and sends it, in mail batches spread over
+        the SMTP pool. Emails not sent within half the lease are made due again.
+
+        :param self: Represent the instance of the class
+        :return: The number of emails claimed
+        :doc-author: Trelent
+        """
+        async with self.session_factory() as db:
+            rows = await repository_outbox.claim_emails(self.batch_size, self.lease, self.max_attempts, db)
+        if not rows:
+            return 0
+
+        messages, failed_ids = {}, []
+        for row in rows:
+            try:
+                messages[row.id] = EMAILS[row.kind](row.email, row.username, row.host)
+            except Exception as err:
+                print(err)
+                failed_ids.append(row.id)
+        # stop sending well before the lease runs out, or another worker could claim and send the rows again
+        deadline = asyncio.get_running_loop().time() + self.lease / 2
+        failed = {id(message) for message in await self.mailer.deliver_all(list(messages.values()), deadline)}
+        sent_ids = [row_id for row_id, message in messages.items() if id(message) not in failed]
+        failed_ids += [row_id for row_id, message in messages.items() if id(message) in failed]
+
+        async with self.session_factory() as db:
+            await repository_outbox.mark_sent(sent_ids, db)
+            await repository_outbox.retry_later(failed_ids, self.retry_delay, db)
+        self.batches_total += 1
+        self.claimed_total += len(rows)
+        self.sent_total += len(sent_ids)
+        self.retried_total += len(failed_ids)
+        return len(rows)
+
+    async def run(self) -> None:
+        """
+        The run function sends batches until stop is called, polling every poll_interval seconds
+        while the outbox is empty.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        while not self.stopping.is_set():
+            try:
+                claimed = await self.run_once()
+            except Exception as err:
+                print(err)
+                claimed = 0
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        await self.mailer.close()
+
+    def stop(self) -> None:
+        """
+        The stop function makes run return after the batch in progress.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        self.stopping.set()
+
+    def stats(self) -> dict:
+        return {
+            "batches_total": self.batches_total,
+            "claimed_total": self.claimed_total,
+            "sent_total": self.sent_total,
+            "retried_total": self.retried_total,
+        }
+
+
+async def main() -> None:
+    worker = OutboxWorker(SessionLocal, mailer, batch_size=settings.outbox_batch_size,
+                          poll_interval=settings.outbox_poll_interval, lease=settings.outbox_lease,
+                          max_attempts=settings.outbox_max_attempts, retry_delay=settings.outbox_retry_delay)
+    if settings.outbox_metrics_port:
+        REGISTRY.register(StatsCollector({"outbox": worker.stats, "mail": mailer.stats}))
+        start_http_server(settings.outbox_metrics_port)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    await worker.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
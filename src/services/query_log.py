@@ -0,0 +1,94 @@
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+from config import settings
+
+
+class QueryLog:
+    """
+    Logs the SQL statements that are slower than slow_ms, plus a random sample_rate fraction of the rest,
+    and warns about requests that run the same statement repeat_threshold times or more (a likely N+1).
+    Records go through a queue to a listener thread, so the event loop never waits on the log's stream.
+    Bound parameters are never logged.
+    """
+
+    def __init__(self, slow_ms: float = 100, sample_rate: float = 0.0, repeat_threshold: int = 10,
+                 logger: logging.Logger | None = None):
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.repeat_threshold = repeat_threshold
+        self.logger = logger or logging.getLogger("src.sql")
+        self._listener: QueueListener | None = None
+
+    def observe(self, statement: str, seconds: float) -> None:
+        """
+        The observe function logs one executed statement if it is slow or sampled.
+
+        :param self: Represent the instance of the class
+        :param statement: str: The SQL statement
+        :param seconds: float: How long it took
+        :return: None
+        :doc-author: Trelent
+        """
+        ms = seconds * 1000
+        if ms >= self.slow_ms:
+            self.logger.warning("slow query %.1fms: %s", ms, statement)
+        elif self.sample_rate and random.random() < self.sample_rate:
+            self.logger.info("sampled query %.1fms: %s", ms, statement)
+
+    def check_request(self, method: str, route: str, statements: dict[str, int]) -> None:
+        """
+        The check_request function warns about the statements a finished request ran repeat_threshold times or more.
+
+        :param self: Represent the instance of the class
+        :param method: str: HTTP method of the request
+        :param route: str: Route template of the request
+        :param statements: dict[str, int]: How many times the request ran each statement
+        :return: None
+        :doc-author: Trelent
+        """
+        for statement, count in statements.items():
+            if count >= self.repeat_threshold:
+                self.logger.warning("possible N+1 in %s %s: %d x %s", method, route, count, statement)
+
+    def start(self, handler: logging.Handler | None = None) -> None:
+        """
+        The start function sends the log records through a queue to handler, by default stderr,
+        written from a background thread.
+
+        :param self: Represent the instance of the class
+        :param handler: logging.Handler: Where the records end up
+        :return: None
+        :doc-author: Trelent
+        """
+        if self._listener is not None:
+            return
+        handler = handler or logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        records = queue.SimpleQueue()
+        self.logger.addHandler(QueueHandler(records))
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self._listener = QueueListener(records, handler)
+        self._listener.start()
+
+    def stop(self) -> None:
+        """
+        The stop function writes out the queued records and stops the listener thread.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        if self._listener is None:
+            return
+        self._listener.stop()
+        self._listener = None
+        for handler in [h for h in self.logger.handlers if isinstance(h, QueueHandler)]:
+            self.logger.removeHandler(handler)
+        self.logger.propagate = True
+
+
+query_log = QueryLog(settings.slow_query_ms, settings.query_log_sample_rate, settings.query_repeat_threshold)
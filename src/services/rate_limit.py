@@ -0,0 +1,215 @@
+import asyncio
+import math
+import time
+from typing import Callable
+
+import redis.asyncio as redis
+from fastapi import Depends, HTTPException, Request, status
+
+from config import settings
+from src.database.models import User
+from src.services.auth import auth_service
+from src.services.metrics import RATE_LIMITED, route_label
+
+
+class TokenBucket:
+    """
+    The tokens one user has left for one route. pending counts the tokens taken since the last sync with Redis,
+    synced is the shared counter of the bucket as Redis returned it last time, None until the first sync.
+    """
+    __slots__ = ("capacity", "rate", "tokens", "updated", "pending", "synced")
+
+    def __init__(self, capacity: int, rate: float, now: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = now
+        self.pending = 0
+        self.synced: int | None = None
+
+
+class RateLimitEngine:
+    """
+    Per-user token buckets kept in process memory, so checking a limit is a dictionary lookup and some arithmetic
+    instead of a Redis round trip. Every sync_interval seconds the tokens taken by this worker are added to
+    a shared counter per bucket in Redis, in one pipeline; whatever the other workers took in the meantime is then
+    taken from the local bucket too. Across workers a limit is therefore exceeded by at most what they can take
+    in one sync interval. Without Redis, every worker enforces the limits on its own.
+    Either way, buckets that have refilled are dropped every sync_interval seconds, as they are no different
+    from a new one.
+    """
+
+    def __init__(self, client: redis.Redis | None = None, sync_interval: float = 1.0, prefix: str = "ratelimit",
+                 enabled: bool = True, clock: Callable[[], float] = time.monotonic):
+        self.redis = client
+        self.sync_interval = sync_interval
+        self.prefix = prefix
+        self.enabled = enabled
+        self.clock = clock
+        self.allowed_total = 0
+        self.rejected_total = 0
+        self.syncs_total = 0
+        self.sync_errors_total = 0
+        self._buckets: dict[tuple[str, str], TokenBucket] = {}
+        self._task: asyncio.Task | None = None
+
+    def acquire(self, quota: str, key: str, times: int, seconds: float) -> float:
+        """
+        The acquire function takes a token from the bucket of key for quota, which holds up to times tokens
+        and refills at times per seconds.
+
+        :param self: Represent the instance of the class
+        :param quota: str: Name of the limit, e.g. the route
+        :param key: str: Who is limited, e.g. the user id
+        :param times: int: How many requests are allowed
+        :param seconds: float: Per how many seconds
+        :return: 0 if the request is allowed, otherwise how many seconds until a token is available
+        :doc-author: Trelent
+        """
+        if not self.enabled:
+            return 0.0
+        now = self.clock()
+        bucket = self._buckets.get((quota, key))
+        if bucket is None:
+            bucket = self._buckets[(quota, key)] = TokenBucket(times, times / seconds, now)
+        tokens = bucket.tokens + (now - bucket.updated) * bucket.rate
+        if tokens > bucket.capacity:
+            tokens = bucket.capacity
+        bucket.updated = now
+        if tokens >= 1:
+            bucket.tokens = tokens - 1
+            bucket.pending += 1
+            self.allowed_total += 1
+            return 0.0
+        bucket.tokens = tokens
+        self.rejected_total += 1
+        return (1 - tokens) / bucket.rate
+
+    async def sync(self) -> None:
+        """
+        The sync function adds the tokens taken since the last sync to the shared counters in Redis and takes
+        the tokens other workers took from the local buckets. Buckets that are full again and unused are dropped.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        if self.redis is None or not self._buckets:
+            return
+        buckets = list(self._buckets.items())
+        taken = []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for (quota, key), bucket in buckets:
+                name = f"{self.prefix}:{quota}:{key}"
+                pipe.incrby(name, bucket.pending)
+                pipe.expire(name, max(math.ceil(2 * bucket.capacity / bucket.rate), math.ceil(4 * self.sync_interval)))
+                taken.append(bucket.pending)
+                bucket.pending = 0
+            try:
+                results = await pipe.execute()
+            except redis.RedisError as err:
+                print(err)
+                self.sync_errors_total += 1
+                for (_, bucket), pending in zip(buckets, taken):
+                    bucket.pending += pending
+                return
+        self.syncs_total += 1
+        for index, (_, bucket) in enumerate(buckets):
+            total = int(results[2 * index])
+            if bucket.synced is not None:
+                # the counter restarts from zero if its key expired
+                remote = total - bucket.synced - taken[index]
+                if remote > 0:
+                    bucket.tokens = max(bucket.tokens - remote, -bucket.capacity)
+            bucket.synced = total
+        self.sweep()
+
+    def sweep(self) -> int:
+        """
+        The sweep function drops the buckets that are full again. With Redis, a bucket is kept until the tokens
+        taken from it have been synced.
+
+        :param self: Represent the instance of the class
+        :return: The number of dropped buckets
+        :doc-author: Trelent
+        """
+        now = self.clock()
+        local = self.redis is None
+        idle = [name for name, bucket in self._buckets.items()
+                if (local or bucket.pending == 0)
+                and bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.capacity]
+        for name in idle:
+            del self._buckets[name]
+        return len(idle)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            if self.redis is None:
+                self.sweep()
+            else:
+                await self.sync()
+
+    def start(self, client: redis.Redis | None) -> None:
+        """
+        The start function shares the limits through client, syncing every sync_interval seconds in the background.
+        Without a client, the background task only drops the buckets that have refilled.
+
+        :param self: Represent the instance of the class
+        :param client: redis.Redis | None: The Redis client, None to keep the limits local
+        :return: None
+        :doc-author: Trelent
+        """
+        self.redis = client
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        The stop function stops the background task and pushes the tokens taken since the last one to Redis.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.sync()
+        self.redis = None
+
+    def stats(self) -> dict:
+        return {
+            "buckets": len(self._buckets),
+            "allowed": self.allowed_total,
+            "rejected": self.rejected_total,
+            "syncs": self.syncs_total,
+            "sync_errors": self.sync_errors_total,
+        }
+
+
+rate_limiter = RateLimitEngine(sync_interval=settings.rate_limit_sync_interval, enabled=settings.rate_limit_enabled)
+
+
+class RateLimit:
+    """
+    Route dependency allowing each authenticated user times requests per seconds on the route, with its own
+    bucket per route. Rejected requests get a 429 with a Retry-After header.
+    """
+
+    def __init__(self, times: int, seconds: float, engine: RateLimitEngine | None = None):
+        self.times = times
+        self.seconds = seconds
+        self.engine = engine or rate_limiter
+
+    async def __call__(self, request: Request, current_user: User = Depends(auth_service.get_current_user)):
+        route = route_label(request.scope)
+        retry_after = self.engine.acquire(route, str(current_user.id), self.times, self.seconds)
+        if retry_after:
+            RATE_LIMITED.labels(route).inc()
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests",
+                                headers={"Retry-After": str(math.ceil(retry_after))})
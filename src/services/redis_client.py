@@ -0,0 +1,110 @@
+import time
+
+import redis.asyncio as redis
+from redis.asyncio.connection import BlockingConnectionPool
+
+from config import settings
+from src.services.metrics import observe_redis
+
+
+class InstrumentedConnectionPool(BlockingConnectionPool):
+    """
+    BlockingConnectionPool that keeps the counters needed to size the pool per worker:
+    how many connections are open and in use, how often and how long callers waited for one,
+    and how often getting one failed (wait timeout or connection error).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._in_use = set()
+        self.acquired_total = 0
+        self.wait_seconds_total = 0.0
+        self.errors_total = 0
+
+    async def get_connection(self, command_name, *keys, **options):
+        start = time.perf_counter()
+        try:
+            connection = await super().get_connection(command_name, *keys, **options)
+        except redis.ConnectionError:
+            self.errors_total += 1
+            raise
+        finally:
+            self.wait_seconds_total += time.perf_counter() - start
+        self._in_use.add(connection)
+        self.acquired_total += 1
+        return connection
+
+    async def release(self, connection):
+        self._in_use.discard(connection)
+        await super().release(connection)
+
+    def stats(self) -> dict:
+        created = len(self._connections)
+        in_use = len(self._in_use)
+        return {
+            "max_connections": self.max_connections,
+            "created": created,
+            "in_use": in_use,
+            "idle": created - in_use,
+            "acquired_total": self.acquired_total,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "errors_total": self.errors_total,
+        }
+
+
+class InstrumentedRedis(redis.Redis):
+    """
+    Redis client that reports the round trip time of every command to the metrics.
+    """
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter_ns()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            observe_redis(str(args[0]).lower(), time.perf_counter_ns() - start)
+
+
+client: redis.Redis | None = None
+
+
+async def init_redis() -> redis.Redis:
+    """
+    The init_redis function creates the application-wide Redis client and its connection pool from the settings.
+    It is called once per worker at startup; everything that talks to Redis shares this client.
+
+    :return: The Redis client
+    :doc-author: Trelent
+    """
+    global client
+    pool = InstrumentedConnectionPool(host=settings.redis_host, port=settings.redis_port, db=0,
+                                      max_connections=settings.redis_max_connections,
+                                      timeout=settings.redis_pool_timeout,
+                                      encoding="utf-8", decode_responses=True)
+    client = InstrumentedRedis(connection_pool=pool)
+    return client
+
+
+async def close_redis() -> None:
+    """
+    The close_redis function closes the application-wide Redis client and disconnects its pool.
+
+    :return: None
+    :doc-author: Trelent
+    """
+    global client
+    if client is not None:
+        await client.close(close_connection_pool=True)
+        client = None
+
+
+def pool_stats() -> dict:
+    """
+    The pool_stats function returns the connection pool counters of the application-wide Redis client.
+
+    :return: A dictionary of pool counters, empty before init_redis
+    :doc-author: Trelent
+    """
+    if client is None:
+        return {}
+    return client.connection_pool.stats()
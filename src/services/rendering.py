@@ -0,0 +1,88 @@
+from email.mime.text import MIMEText
+from pathlib import Path
+from typing import Iterable
+
+from jinja2 import Environment, FileSystemLoader, Template
+
+
+class EmailTemplate:
+    """
+    A compiled Jinja template together with the headers that are the same for every message built from it.
+    Messages are plain compat32 MIMEText objects, which are much cheaper to build than EmailMessage
+    and are what fastapi_mail sent before.
+    """
+
+    def __init__(self, template: Template, subject: str, sender: str, subtype: str = "html"):
+        self.template = template
+        self.subject = subject
+        self.sender = sender
+        self.subtype = subtype
+
+    def render(self, **context) -> str:
+        """
+        The render function renders the body of the message.
+
+        :param self: Represent the instance of the class
+        :param **context: Variables passed to the template
+        :return: The rendered body
+        :doc-author: Trelent
+        """
+        return self.template.render(**context)
+
+    def build(self, email: str, **context) -> MIMEText:
+        """
+        The build function renders the template for one recipient into a message ready to be sent.
+
+        :param self: Represent the instance of the class
+        :param email: str: The recipient
+        :param **context: Variables passed to the template
+        :return: A MIMEText message
+        :doc-author: Trelent
+        """
+        message = MIMEText(self.template.render(**context), self.subtype, "utf-8")
+        message["Subject"] = self.subject
+        message["From"] = self.sender
+        message["To"] = email
+        return message
+
+    def build_batch(self, recipients: Iterable[tuple[str, dict]]) -> list[MIMEText]:
+        """
+        The build_batch function builds one message per (email, context) pair, e.g. for digest or bulk mail.
+
+        :param self: Represent the instance of the class
+        :param recipients: Iterable[tuple[str, dict]]: The recipients and the variables for their message
+        :return: A list of MIMEText messages in the same order
+        :doc-author: Trelent
+        """
+        build = self.build
+        return [build(email, **context) for email, context in recipients]
+
+
+class TemplateRenderer:
+    """
+    Compiles each template of a folder once per process and keeps it in memory. Unlike the Environment
+    fastapi_mail creates for every message, templates are neither re-read nor checked for changes on disk,
+    so templates are loaded when the process starts.
+    """
+
+    def __init__(self, folder: Path, sender: str):
+        self.sender = sender
+        self.env = Environment(loader=FileSystemLoader(folder), auto_reload=False, cache_size=-1)
+        self._templates: dict[tuple[str, str], EmailTemplate] = {}
+
+    def template(self, name: str, subject: str) -> EmailTemplate:
+        """
+        The template function returns the compiled template with the given file name,
+        compiling it on first use.
+
+        :param self: Represent the instance of the class
+        :param name: str: File name of the template in the templates folder
+        :param subject: str: Subject of the messages built from it
+        :return: An EmailTemplate object
+        :doc-author: Trelent
+        """
+        key = (name, subject)
+        template = self._templates.get(key)
+        if template is None:
+            template = self._templates[key] = EmailTemplate(self.env.get_template(name), subject, self.sender)
+        return template
@@ -0,0 +1,116 @@
+import warnings
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, create_engine, \
+    inspect
+
+from src.database.models import Base
+
+
+def postgresql_only(obj, name, type_, reflected, compare_to):
+    # trigram indexes are Postgres only, the FTS5 tables SQLite only and unmapped
+    return not (type_ == "index" and name.endswith("_trgm")
+                or type_ == "table" and name.startswith(("contacts_fts", "contacts_names_")))
+
+
+def baseline_metadata() -> MetaData:
+    # the models as they were before migrations were introduced, created with metadata.create_all
+    metadata = MetaData()
+    Table("users", metadata,
+          Column("id", Integer, primary_key=True),
+          Column("username", String(50)),
+          Column("email", String(250), nullable=False, unique=True),
+          Column("password", String(255), nullable=False),
+          Column("crated_at", DateTime),
+          Column("avatar", String(255), nullable=True),
+          Column("refresh_token", String(255), nullable=True),
+          Column("confirmed", Boolean))
+    Table("contacts", metadata,
+          Column("id", Integer, primary_key=True, index=True),
+          Column("first_name", String, index=True, nullable=False),
+          Column("last_name", String, index=True, nullable=False),
+          Column("email", String, unique=True, index=True, nullable=False),
+          Column("phone", String, unique=True, index=True, nullable=False),
+          Column("birthday", DateTime, index=True, nullable=False),
+          Column("additional_info", String, index=True, nullable=True),
+          Column("user_id", ForeignKey("users.id", ondelete="CASCADE")))
+    return metadata
+
+
+def assert_matches_models(conn):
+    with warnings.catch_warnings():
+        # SQLite reflects the generated column's expression as text
+        warnings.simplefilter("ignore", UserWarning)
+        context = MigrationContext.configure(conn, opts={"include_object": postgresql_only})
+        assert compare_metadata(context, Base.metadata) == []
+
+
+@pytest.fixture()
+def alembic_config(tmp_path):
+    path = tmp_path / "migrations.db"
+    config = Config("alembic.ini")
+    config.set_main_option("sqlalchemy.url", f"sqlite+aiosqlite:///{path}")
+    config.attributes["configure_logger"] = False
+    return config, create_engine(f"sqlite:///{path}")
+
+
+def test_search_index_is_filled(alembic_config):
+    config, engine = alembic_config
+    command.upgrade(config, "02190f873fa2")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO users (id, email, password) VALUES (1, 'a@example.com', 'x')")
+        conn.exec_driver_sql("INSERT INTO contacts (first_name, last_name, email, phone, birthday, user_id) "
+                             "VALUES ('Wade', 'Wilson', 'wade@example.com', '+380501234567', '1990-01-01', 1)")
+    command.upgrade(config, "head")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT rowid FROM contacts_fts WHERE contacts_fts MATCH 'wils*'").all() == [(1,)]
+        assert conn.exec_driver_sql("SELECT rowid FROM contacts_names_fts WHERE contacts_names_fts MATCH 'ilso'"
+                                    ).all() == [(1,)]
+        assert conn.exec_driver_sql("SELECT birth_mmdd FROM contacts").all() == [(101,)]
+
+
+def test_migrations_match_models(alembic_config):
+    config, engine = alembic_config
+    command.upgrade(config, "head")
+    with engine.connect() as conn:
+        assert_matches_models(conn)
+        indexes = {index["name"] for index in inspect(conn).get_indexes("contacts")}
+    assert indexes == {"ix_contacts_email", "ix_contacts_phone", "ix_contacts_user_id_birth_mmdd",
+                       "ix_contacts_user_id_name", "ix_contacts_user_id_id"}
+
+
+def test_upgrade_stamped_baseline(alembic_config):
+    config, engine = alembic_config
+    baseline_metadata().create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO users (id, email, password) VALUES (1, 'a@example.com', 'x')")
+        conn.exec_driver_sql("INSERT INTO contacts (first_name, last_name, email, phone, birthday, user_id) "
+                             "VALUES ('Wade', 'Wilson', 'wade@example.com', '+380501234567', '1990-12-31', 1)")
+    command.stamp(config, "523458f4d8f6")
+    command.upgrade(config, "head")
+    with engine.connect() as conn:
+        assert_matches_models(conn)
+        assert conn.exec_driver_sql("SELECT id, birth_mmdd FROM contacts").all() == [(1, 1231)]
+        assert conn.exec_driver_sql("SELECT count(*) FROM email_outbox").scalar() == 0
+        assert conn.exec_driver_sql("SELECT rowid FROM contacts_fts WHERE contacts_fts MATCH 'wils*'").all() == [(1,)]
+
+
+def test_downgrade(alembic_config):
+    config, engine = alembic_config
+    command.upgrade(config, "head")
+    command.downgrade(config, "-1")
+    with engine.connect() as conn:
+        assert not {"contacts_names_fts", "contacts_names_vocab"} & set(inspect(conn).get_table_names())
+    command.downgrade(config, "-1")
+    with engine.connect() as conn:
+        assert "contacts_fts" not in inspect(conn).get_table_names()
+    command.downgrade(config, "-1")
+    with engine.connect() as conn:
+        assert "ix_contacts_additional_info" in {index["name"] for index in inspect(conn).get_indexes("contacts")}
+    command.downgrade(config, "base")
+    with engine.connect() as conn:
+        assert inspect(conn).get_table_names() == ["alembic_version"]
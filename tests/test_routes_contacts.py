@@ -1,18 +1,19 @@
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, patch
+
+import csv
+import io
+import json
 
 import pytest
 
-from src.database.models import User
-from src.services.auth import auth_service
+from src.database.models import Contact, User
+from src.services.cache import contact_versions, user_cache
 
 URL_SIGNUP = "/api/auth/signup"
 URL_LOGIN = "/api/auth/login"
 
 
-@pytest.fixture()
-def token(client, user, session, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+def login(client, session, user) -> str:
     client.post(URL_SIGNUP, json=user)
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.confirmed = True
@@ -25,8 +26,19 @@ def token(client, user, session, monkeypatch):
     return data["access_token"]
 
 
+@pytest.fixture()
+def token(client, user, session):
+    return login(client, session, user)
+
+
+@pytest.fixture()
+def other_token(client, session):
+    return login(client, session, {"username": "wolverine", "email": "wolverine@example.com",
+                                   "password": "123456789"})
+
+
 def test_get_contacts_not_found(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(user_cache, 'redis', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/api/contacts",
@@ -35,3 +47,216 @@ def test_get_contacts_not_found(client, token):
         assert response.status_code == 404, response.text
         data = response.json()
         assert data["detail"] == "Not Found"
+
+
+def test_conditional_get(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    contact = {"first_name": "Wade", "last_name": "Wilson", "email": "wade@example.com", "phone": "+380501234567",
+               "birthday": "1990-01-01", "additional_info": "merc"}
+    with patch.object(user_cache, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        contact_id = client.post("/api/contacts/create", json=contact, headers=headers).json()["id"]
+
+        response = client.get("/api/contacts/all", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json() == {"contacts": [{"id": contact_id, **contact}], "next_cursor": None}
+        etag = response.headers["ETag"]
+        response = client.get("/api/contacts/all", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert client.get("/api/contacts/all", params={"limit": 10},
+                          headers={**headers, "If-None-Match": etag}).status_code == 200
+
+        response = client.get(f"/api/contacts/{contact_id}", headers=headers)
+        contact_etag = response.headers["ETag"]
+        assert client.get(f"/api/contacts/{contact_id}",
+                          headers={**headers, "If-None-Match": contact_etag}).status_code == 304
+
+        contact["additional_info"] = "changed"
+        client.put(f"/api/contacts/update/{contact_id}", json=contact, headers=headers)
+        response = client.get("/api/contacts/all", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        response = client.get(f"/api/contacts/{contact_id}", headers={**headers, "If-None-Match": contact_etag})
+        assert response.status_code == 200
+        assert response.json()["additional_info"] == "changed"
+
+        assert client.get(f"/api/contacts/{contact_id + 1000}", headers=headers).status_code == 404
+        assert not any(key.endswith(f":{contact_id + 1000}") for key in contact_versions._local)
+
+
+def test_rate_limit(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    with patch.object(user_cache, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        for _ in range(10):
+            assert client.get("/api/contacts/birthday_search", headers=headers).status_code == 200
+        response = client.get("/api/contacts/birthday_search", headers=headers)
+        assert response.status_code == 429, response.text
+        assert int(response.headers["Retry-After"]) > 0
+
+
+def test_update_and_delete(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    contact = {"first_name": "Peter", "last_name": "Parker", "email": "peter@example.com", "phone": "+380501234568",
+               "birthday": "2001-08-10", "additional_info": "spider"}
+    with patch.object(user_cache, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        contact_id = client.post("/api/contacts/create", json=contact, headers=headers).json()["id"]
+
+        updated = {**contact, "last_name": "Parkerr", "birthday": "2001-08-11"}
+        response = client.put(f"/api/contacts/update/{contact_id}", json=updated, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json() == {"id": contact_id, **updated}
+        assert client.get(f"/api/contacts/{contact_id}", headers=headers).json()["last_name"] == "Parkerr"
+
+        response = client.delete(f"/api/contacts/delete/{contact_id}", headers=headers)
+        assert response.status_code == 204, response.text
+        assert client.get(f"/api/contacts/{contact_id}", headers=headers).status_code == 404
+        assert client.delete(f"/api/contacts/delete/{contact_id}", headers=headers).status_code == 404
+
+
+def test_search(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    contacts = [
+        {"first_name": "Logan", "last_name": "Howlett", "email": "logan@example.com", "phone": "+380501234570",
+         "birthday": "1980-02-02", "additional_info": "Met at the bar, owes me a beer"},
+        {"first_name": "Barney", "last_name": "Gumble", "email": "barney@example.com", "phone": "+380501234571",
+         "birthday": "1980-03-03", "additional_info": "Regular at the tavern"},
+    ]
+    with patch.object(user_cache, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        ids = [client.post("/api/contacts/create", json=contact, headers=headers).json()["id"] for contact in contacts]
+
+        response = client.get("/api/contacts/search", params={"q": "bar"}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert [contact["id"] for contact in response.json()] == [ids[1], ids[0]]
+        assert response.json()[1] == {"id": ids[0], **contacts[0]}
+
+        response = client.get("/api/contacts/search", params={"q": "owes BEER!"}, headers=headers)
+        assert [contact["id"] for contact in response.json()] == [ids[0]]
+
+        client.put(f"/api/contacts/update/{ids[0]}", json={**contacts[0], "additional_info": "Tea drinker"},
+                   headers=headers)
+        assert client.get("/api/contacts/search", params={"q": "beer"}, headers=headers).status_code == 404
+        client.delete(f"/api/contacts/delete/{ids[1]}", headers=headers)
+        assert client.get("/api/contacts/search", params={"q": "tavern"}, headers=headers).status_code == 404
+        assert client.get("/api/contacts/search", params={"q": "!!"}, headers=headers).status_code == 404
+
+
+def test_fuzzy_search(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    contacts = [
+        {"first_name": "Natasha", "last_name": "Romanoff", "email": "natasha@example.com", "phone": "+380501234572",
+         "birthday": "1984-11-22", "additional_info": "Red Room"},
+        {"first_name": "Bruce", "last_name": "Banner", "email": "bruce@example.com", "phone": "+380501234573",
+         "birthday": "1969-12-18", "additional_info": "Physicist"},
+    ]
+    with patch.object(user_cache, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        ids = [client.post("/api/contacts/create", json=contact, headers=headers).json()["id"] for contact in contacts]
+
+        response = client.get("/api/contacts/search/fuzzy", params={"q": "Romanov"}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json() == [{"id": ids[0], **contacts[0]}]
+        response = client.get("/api/contacts/search/fuzzy", params={"q": "bruse baner"}, headers=headers)
+        assert [contact["id"] for contact in response.json()] == [ids[1]]
+        response = client.get("/api/contacts/search/fuzzy", params={"q": "Romanov", "threshold": 0.9},
+                              headers=headers)
+        assert response.status_code == 404
+
+        client.put(f"/api/contacts/update/{ids[1]}", json={**contacts[1], "last_name": "Bannister"}, headers=headers)
+        response = client.get("/api/contacts/search/fuzzy", params={"q": "banister"}, headers=headers)
+        assert [contact["id"] for contact in response.json()] == [ids[1]]
+        assert client.get("/api/contacts/search/fuzzy", params={"q": "Banner", "threshold": 0.6},
+                          headers=headers).status_code == 404
+        assert client.get("/api/contacts/search/fuzzy", params={"q": "Romanov", "threshold": 0},
+                          headers=headers).status_code == 422
+
+
+def test_search_short_names(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    contact = {"first_name": "Ee", "last_name": "Ff", "email": "ee@example.com", "phone": "+380501234574",
+               "birthday": "1990-05-05", "additional_info": None}
+    with patch.object(user_cache, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        contact_id = client.post("/api/contacts/create", json=contact, headers=headers).json()["id"]
+
+        for url in ("/api/contacts/search", "/api/contacts/search/fuzzy"):
+            response = client.get(url, params={"q": "Ee Ff"}, headers=headers)
+            assert response.status_code == 200, response.text
+            assert [contact["id"] for contact in response.json()] == [contact_id]
+        response = client.get("/api/contacts/search/fuzzy", params={"q": "Ee Wilson"}, headers=headers)
+        assert contact_id in [contact["id"] for contact in response.json()]
+
+
+def test_import(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    ndjson = (b'{"first_name": "Peter", "last_name": "Parker", "email": "peter@example.com", "phone": "+380501234580", '
+              b'"birthday": "2001-08-10", "additional_info": "Photographer"}\n'
+              b'not json\n'
+              b'{"first_name": "Mary", "last_name": "Watson", "email": "mary@example.com", "phone": "+380501234580", '
+              b'"birthday": "2001-06-01"}\n')
+    csv_file = ("first_name,last_name,email,phone,birthday,additional_info\n"
+                "Miles,Morales,miles@example.com,+380501234581,2003-03-03,\n"
+                "Gwen,Stacy,not-an-email,+380501234582,2002-04-04,Drummer\n").encode()
+    with patch.object(user_cache, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post("/api/contacts/import", params={"format": "ndjson"},
+                               files={"file": ("contacts.ndjson", ndjson)}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json() == {"inserted": 1, "errors": [{"row": 2, "error": "Invalid JSON"},
+                                                             {"row": 3, "error": "Duplicate phone in upload"}]}
+
+        response = client.post("/api/contacts/import", params={"format": "csv"},
+                               files={"file": ("contacts.csv", csv_file)}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json()["inserted"] == 1
+        assert [error["row"] for error in response.json()["errors"]] == [2]
+        assert response.json()["errors"][0]["error"].startswith("email")
+        response = client.get("/api/contacts/search", params={"q": "miles morales"}, headers=headers)
+        assert [(contact["email"], contact["additional_info"]) for contact in response.json()] == \
+               [("miles@example.com", None)]
+
+        response = client.post("/api/contacts/import", params={"format": "ndjson"},
+                               files={"file": ("contacts.ndjson", ndjson)}, headers=headers)
+        assert response.json()["inserted"] == 0
+        assert {"row": 1, "error": "Email already exists"} in response.json()["errors"]
+
+        response = client.post("/api/contacts/import", params={"format": "xml"},
+                               files={"file": ("contacts.xml", b"<contacts/>")}, headers=headers)
+        assert response.status_code == 422
+
+
+def test_export(client, session, token, other_token):
+    headers = {"Authorization": f"Bearer {token}"}
+    other = {"first_name": "James", "last_name": "Howlett", "email": "james@example.com", "phone": "+380501234590",
+             "birthday": "1882-03-05", "additional_info": "Not yours"}
+    with patch.object(user_cache, 'redis', new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        assert client.post("/api/contacts/create", json=other,
+                           headers={"Authorization": f"Bearer {other_token}"}).status_code == 201
+        client.post("/api/contacts/create", headers=headers,
+                    json={"first_name": "Kitty", "last_name": "Pryde", "email": "kitty@example.com",
+                          "phone": "+380501234591", "birthday": "1980-07-07", "additional_info": None})
+        owner = session.query(User).filter(User.username == "deadpool").first()
+        expected = [{"id": contact.id, "first_name": contact.first_name, "last_name": contact.last_name,
+                     "email": contact.email, "phone": contact.phone, "birthday": contact.birthday.date().isoformat(),
+                     "additional_info": contact.additional_info}
+                    for contact in session.query(Contact).filter(Contact.user_id == owner.id).order_by(Contact.id)]
+        assert len(expected) > 1
+
+        response = client.get("/api/contacts/export", params={"format": "ndjson"}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.headers["Content-Type"] == "application/x-ndjson"
+        assert response.headers["Content-Disposition"] == 'attachment; filename="contacts.ndjson"'
+        assert [json.loads(line) for line in response.text.splitlines()] == expected
+
+        response = client.get("/api/contacts/export", params={"format": "csv"}, headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.headers["Content-Type"].startswith("text/csv")
+        assert response.headers["Content-Disposition"] == 'attachment; filename="contacts.csv"'
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert [row["id"] for row in rows] == [str(contact["id"]) for contact in expected]
+        assert [row["email"] for row in rows] == [contact["email"] for contact in expected]
+        assert other["email"] not in response.text
@@ -0,0 +1,15 @@
+def test_metrics(client):
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_requests_total{method="GET",route="/",status="200"}' in response.text
+    assert "http_request_duration_seconds_bucket" in response.text
+    assert "token_cache_hits" in response.text
+
+
+def test_server_timing(client):
+    response = client.get("/")
+    assert float(response.headers["My-Process-Time"]) > 0
+    assert response.headers["Server-Timing"].startswith("total;dur=")
+    assert 'db;dur=0.00;desc="0 queries", redis;dur=0.00;desc="0 commands"' in response.headers["Server-Timing"]
@@ -1,8 +1,9 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, AsyncMock
 from datetime import date, datetime, timedelta
 
-from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Contact, User
 from src.schemas import ContactModel
@@ -13,14 +14,21 @@ from src.repository.contacts import (
     remove_contact,
     update_contact,
     search_field,
+    search_contacts,
+    search_terms,
+    fuzzy_search,
     birthday_list,
+    _birthday_window,
+    decode_cursor,
 )
 
 
 class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
+        self.result = MagicMock()
+        self.session.execute.return_value = self.result
         self.user = User(id=1)
         self.contact = ContactModel(
             first_name='Contact',
@@ -33,18 +41,36 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
-        self.session.query().filter().all.return_value = contacts
-        result = await get_contacts(user=self.user, db=self.session)
+        self.result.scalars().all.return_value = contacts
+        result, next_cursor = await get_contacts(user=self.user, db=self.session)
         self.assertEqual(result, contacts)
+        self.assertIsNone(next_cursor)
+
+    async def test_get_contacts_next_page(self):
+        contacts = [Contact(id=i, first_name='Name', last_name=f'Last{i}') for i in range(3)]
+        self.result.scalars().all.return_value = contacts
+        result, next_cursor = await get_contacts(user=self.user, db=self.session, limit=2)
+        self.assertEqual(result, contacts[:2])
+        self.assertEqual(decode_cursor(next_cursor), ('Last1', 'Name', 1))
+
+        await get_contacts(user=self.user, db=self.session, limit=2, cursor=next_cursor)
+        stmt = self.session.execute.call_args.args[0]
+        sql = str(stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+        self.assertIn("(contacts.last_name, contacts.first_name, contacts.id) > ('Last1', 'Name', 1)", sql)
+        self.assertIn("LIMIT 3", sql)
+
+    async def test_get_contacts_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            await get_contacts(user=self.user, db=self.session, cursor='not-a-cursor')
 
     async def test_get_contact_found(self):
         contact = Contact()
-        self.session.query().filter_by().first.return_value = contact
+        self.result.scalar_one_or_none.return_value = contact
         result = await get_contact(contact_id=1, user=self.user, db=self.session)
         self.assertEqual(result, contact)
 
     async def test_get_contact_not_found(self):
-        self.session.query().filter_by().return_value.first.return_value = None
+        self.result.scalar_one_or_none.return_value = None
         result = await get_contact(contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
 
@@ -61,77 +87,181 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
     async def test_remove_contact_found(self):
         contact_id = 1
         contact = Contact(id=contact_id)
-        self.session.query(Contact).filter_by().first.return_value = contact
+        self.result.one_or_none.return_value = contact
         result = await remove_contact(contact_id, user=self.user, db=self.session)
         self.assertEqual(result, contact)
+        self.session.execute.assert_awaited_once()
+        stmt = self.session.execute.call_args.args[0]
+        sql = str(stmt.compile(dialect=sqlite.dialect()))
+        self.assertTrue(sql.startswith("DELETE FROM contacts WHERE contacts.id = ? AND contacts.user_id = ?"), sql)
+        self.assertIn("RETURNING id, first_name", sql)
+        self.session.commit.assert_awaited_once()
 
     async def test_remove_contact_not_found(self):
-        self.session.query(Contact).filter().first.return_value = None
-        self.session.commit.return_value = None
+        self.result.one_or_none.return_value = None
         result = await remove_contact(contact_id=1, user=self.user, db=self.session)
-        print(result)
         self.assertIsNone(result)
+        self.session.commit.assert_not_awaited()
 
     async def test_update_contact_found(self):
         body = self.contact
-        self.session.commit.return_value = None
+        contact = Contact(id=1, **body.dict())
+        self.result.one_or_none.return_value = contact
         result = await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
-        self.assertEqual(result.first_name, body.first_name)
-        self.assertEqual(result.last_name, body.last_name)
-        self.assertEqual(result.email, body.email)
-        self.assertEqual(result.phone, body.phone)
-        self.assertEqual(result.birthday, body.birthday)
-        self.assertTrue(hasattr(result, "id"))
+        self.assertEqual(result, contact)
+        self.session.execute.assert_awaited_once()
+        stmt = self.session.execute.call_args.args[0]
+        sql = str(stmt.compile(dialect=sqlite.dialect()))
+        self.assertTrue(sql.startswith("UPDATE contacts SET first_name=?"), sql)
+        self.assertIn("WHERE contacts.id = ? AND contacts.user_id = ? RETURNING id, first_name", sql)
+        self.session.commit.assert_awaited_once()
 
     async def test_update_note_not_found(self):
         body = self.contact
-        self.session.query().filter().first.return_value = None
-        self.session.commit.return_value = None
+        self.result.one_or_none.return_value = None
         result = await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
         self.assertIsNone(result)
 
     async def test_search_field_found(self):
-        contact1 = Contact(
-            first_name='User1',
-            last_name='Test1',
-            email='testmail1@gmail.com',
-            phone='0953214569'
-        )
-        contact2 = Contact(
-            first_name='User2',
-            last_name='Test2',
-            email='testmail2@gmail.com',
-            phone='0953214568'
-        )
-        contact3 = Contact(
-            first_name='User3',
-            last_name='Test3',
-            email='testmail3@gmail.com',
-            phone='0953214567'
-        )
-        self.session.query().filter().all.return_value = [contact1, contact2, contact3]
+        contacts = [Contact(), Contact()]
+        self.result.scalars().all.return_value = contacts
+        self.assertEqual(await search_field('Test2', user=self.user, db=self.session), contacts)
+        stmt = self.session.execute.call_args.args[0]
+        sql = str(stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+        for column in ("first_name", "last_name", "email"):
+            self.assertIn(f"lower(contacts.{column}) LIKE lower('%Test2%')", sql)
+        self.assertIn("ORDER BY contacts.last_name, contacts.first_name, contacts.id", sql)
+
+    async def test_search_field_rows(self):
+        self.result.all.return_value = [(1, 'User2')]
+        result = await search_field('Test2', user=self.user, db=self.session, fields=['id', 'first_name'])
+        self.assertEqual(result, [(1, 'User2')])
+        stmt = self.session.execute.call_args.args[0]
+        self.assertEqual([column.name for column in stmt.selected_columns], ['id', 'first_name'])
 
-        results = await search_field('Test2', user=self.user, db=self.session)
+    async def test_search_field_runs_in_sql(self):
+        self.result.scalars().all.return_value = []
+        await search_field('50%_off', user=self.user, db=self.session, limit=10, offset=20)
+        stmt = self.session.execute.call_args.args[0]
+        sql = str(stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+        self.assertIn("lower(contacts.first_name) LIKE lower('%50\\%\\_off%')", sql)
+        self.assertIn("contacts.user_id = 1", sql)
+        self.assertIn("LIMIT 10 OFFSET 20", sql)
 
-        assert contact1 not in results
-        assert contact2 in results
-        assert contact3 not in results
+    def test_search_terms(self):
+        self.assertEqual(search_terms("  Wade O'Neil-Wilson & co_op *"), ['wade', 'o', 'neil', 'wilson', 'co', 'op'])
+
+    async def test_search_contacts_sqlite(self):
+        self.session.get_bind.return_value.dialect.name = 'sqlite'
+        self.result.scalars().all.return_value = []
+        await search_contacts('wade wil', user=self.user, db=self.session, limit=10, offset=20)
+        stmt = self.session.execute.call_args.args[0]
+        sql = str(stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+        self.assertIn("JOIN contacts_fts ON contacts_fts.rowid = contacts.id", sql)
+        self.assertIn("""contacts_fts.contacts_fts MATCH '"wade"* "wil"*'""", sql)
+        self.assertIn("ORDER BY bm25(contacts_fts, 10.0, 10.0, 5.0, 1.0), contacts.id", sql)
+        self.assertIn("LIMIT 10 OFFSET 20", sql)
+
+    async def test_search_contacts_postgresql(self):
+        self.session.get_bind.return_value.dialect.name = 'postgresql'
+        self.result.all.return_value = []
+        await search_contacts('wade wil', user=self.user, db=self.session, fields=['id'])
+        stmt = self.session.execute.call_args.args[0]
+        sql = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+        self.assertIn("contacts.search_vector @@ to_tsquery('simple'::regconfig, 'wade:* & wil:*')", sql)
+        self.assertIn("ORDER BY ts_rank(contacts.search_vector, to_tsquery(", sql)
+
+    async def test_search_contacts_without_terms(self):
+        self.assertEqual(await search_contacts('?!', user=self.user, db=self.session), [])
+        self.session.execute.assert_not_awaited()
+
+    async def test_fuzzy_search_sqlite(self):
+        self.session.get_bind.return_value.dialect.name = 'sqlite'
+        counts, candidates, contacts = MagicMock(), MagicMock(), MagicMock()
+        counts.all.return_value = [('wil', 4000), ('ils', 900), ('lsn', 1)]
+        candidates.all.return_value = [(3, 'Logan', 'Wilkins'), (1, 'Wade', 'Wilson'), (2, 'Wanda', 'Wilsn')]
+        wade, wanda = Contact(id=1), Contact(id=2)
+        contacts.scalars().all.return_value = [wade, wanda]
+        self.session.execute.side_effect = [counts, candidates, contacts]
+        result = await fuzzy_search('Wilsn!', user=self.user, db=self.session, threshold=0.4, limit=5, postings=1000)
+        self.assertEqual(result, [wanda, wade])
+        counts_stmt, candidates_stmt, contacts_stmt = (call.args[0] for call in self.session.execute.call_args_list)
+        sql = str(counts_stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+        self.assertIn("WHERE contacts_names_vocab.term IN ('wil', 'ils', 'lsn')", sql)
+        sql = str(candidates_stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+        # wil would take the lookup over 1000 index entries
+        self.assertIn("""contacts_names_fts.contacts_names_fts MATCH '"lsn" OR "ils"'""", sql)
+        self.assertIn("ORDER BY bm25(contacts_names_fts)", sql)
+        self.assertIn("LIMIT 300", sql)
+        sql = str(contacts_stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+        self.assertIn("contacts.id IN (2, 1)", sql)
+
+    async def test_fuzzy_search_common_trigram(self):
+        self.session.get_bind.return_value.dialect.name = 'sqlite'
+        counts, candidates = MagicMock(), MagicMock()
+        counts.all.return_value = [('wad', 9000), ('ade', 7000)]
+        candidates.all.return_value = []
+        self.session.execute.side_effect = [counts, candidates]
+        self.assertEqual(await fuzzy_search('wade', user=self.user, db=self.session, postings=1000), [])
+        sql = str(self.session.execute.call_args.args[0].compile(dialect=sqlite.dialect(),
+                                                                 compile_kwargs={"literal_binds": True}))
+        self.assertIn("""MATCH '"ade"'""", sql)
+
+    async def test_fuzzy_search_postgresql(self):
+        self.session.get_bind.return_value.dialect.name = 'postgresql'
+        self.result.all.return_value = []
+        await fuzzy_search('wade wilsn', user=self.user, db=self.session, threshold=0.5, limit=3, fields=['id'])
+        setting, stmt = (call.args[0] for call in self.session.execute.call_args_list)
+        sql = str(setting.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+        self.assertIn("set_config('pg_trgm.similarity_threshold', '0.5', true)", sql)
+        sql = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+        self.assertIn("(contacts.first_name %% 'wade') OR (contacts.last_name %% 'wade') "
+                      "OR (contacts.first_name %% 'wilsn')", sql)
+        self.assertIn("ORDER BY greatest(similarity(contacts.first_name, 'wade wilsn')", sql)
+        self.assertIn("LIMIT 3", sql)
+
+    async def test_fuzzy_search_short_words(self):
+        self.session.get_bind.return_value.dialect.name = 'sqlite'
+        candidates, contacts = MagicMock(), MagicMock()
+        candidates.all.return_value = [(1, 'Al', 'Pacino'), (2, 'Alfred', 'Pennyworth')]
+        al = Contact(id=1)
+        contacts.scalars().all.return_value = [al]
+        self.session.execute.side_effect = [candidates, contacts]
+        self.assertEqual(await fuzzy_search('Al', user=self.user, db=self.session), [al])
+        sql = str(self.session.execute.call_args_list[0].args[0].compile(dialect=sqlite.dialect(),
+                                                                         compile_kwargs={"literal_binds": True}))
+        self.assertIn("lower(contacts.first_name) LIKE lower('al%')", sql)
+        self.assertIn("lower(contacts.last_name) LIKE lower('al%')", sql)
+        self.assertIn("LIMIT 300", sql)
+
+    async def test_fuzzy_search_without_words(self):
+        self.session.get_bind.return_value.dialect.name = 'sqlite'
+        self.assertEqual(await fuzzy_search('?!', user=self.user, db=self.session), [])
+        self.session.execute.assert_not_awaited()
 
     async def test_birthday_list_found(self):
         contacts = [Contact(birthday=datetime.now() + timedelta(days=1)),
                     Contact(birthday=datetime.now() + timedelta(days=2)),
                     Contact(birthday=datetime.now() + timedelta(days=3)),
-                    Contact(birthday=datetime.now() + timedelta(days=4)),
-                    Contact(birthday=datetime.now() + timedelta(days=5)),
-                    Contact(birthday=datetime.now() + timedelta(days=6)),
-                    Contact(birthday=datetime.now() + timedelta(days=7)),
-                    Contact(birthday=datetime.now() + timedelta(days=8)),
-                    Contact(birthday=datetime.now() + timedelta(days=9)),
-                    Contact(birthday=datetime.now() + timedelta(days=10)),
                     ]
-        self.session.query().filter().all.return_value = contacts
+        self.result.scalars().all.return_value = contacts
         result = await birthday_list(user=self.user, db=self.session)
-        self.assertEqual(result, contacts[0:7])
+        self.assertEqual(result, contacts)
+        stmt = self.session.execute.call_args.args[0]
+        sql = str(stmt.compile(dialect=sqlite.dialect()))
+        self.assertIn("contacts.birth_mmdd", sql)
+
+    def test_birthday_window(self):
+        self.assertEqual(_birthday_window(date(2023, 5, 10)), (510, 517))
+
+    def test_birthday_window_year_wrap(self):
+        self.assertEqual(_birthday_window(date(2023, 12, 28)), (1228, 104))
+
+    def test_birthday_window_leap_day(self):
+        self.assertEqual(_birthday_window(date(2023, 2, 21)), (221, 229))
+        self.assertEqual(_birthday_window(date(2024, 2, 21)), (221, 228))
+        self.assertEqual(_birthday_window(date(2023, 2, 25)), (225, 304))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import OutboxEmail
+from src.repository.outbox import (
+    add_email,
+    claim_emails,
+    mark_sent,
+    retry_later,
+)
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.session = AsyncMock(spec=AsyncSession)
+        self.result = MagicMock()
+        self.session.execute.return_value = self.result
+
+    async def test_add_email_joins_callers_transaction(self):
+        row = await add_email("confirm_email", "andrew@google.com", "Andrew", "http://test/", self.session)
+        self.assertIsInstance(row, OutboxEmail)
+        self.assertEqual((row.kind, row.email, row.host), ("confirm_email", "andrew@google.com", "http://test/"))
+        self.session.add.assert_called_once_with(row)
+        self.session.commit.assert_not_called()
+
+    async def test_add_email_commit(self):
+        await add_email("confirm_email", "andrew@google.com", "Andrew", "http://test/", self.session, commit=True)
+        self.session.commit.assert_awaited_once()
+
+    async def test_claim_emails(self):
+        rows = [OutboxEmail(id=1, attempts=0), OutboxEmail(id=2, attempts=2)]
+        self.result.scalars().all.return_value = rows
+        before = datetime.now()
+        result = await claim_emails(limit=10, lease=60, max_attempts=5, db=self.session)
+
+        self.assertEqual(result, rows)
+        self.assertEqual([row.attempts for row in rows], [1, 3])
+        for row in rows:
+            self.assertGreaterEqual(row.available_at, before + timedelta(seconds=60))
+        self.session.commit.assert_awaited_once()
+        stmt = self.session.execute.call_args.args[0]
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        self.assertIn("email_outbox.sent_at IS NULL", sql)
+        self.assertIn("FOR UPDATE SKIP LOCKED", sql)
+
+    async def test_claim_emails_empty(self):
+        self.result.scalars().all.return_value = []
+        result = await claim_emails(limit=10, lease=60, max_attempts=5, db=self.session)
+        self.assertEqual(result, [])
+
+    async def test_mark_sent(self):
+        await mark_sent([1, 2], self.session)
+        self.session.execute.assert_awaited_once()
+        self.session.commit.assert_awaited_once()
+
+    async def test_mark_sent_nothing(self):
+        await mark_sent([], self.session)
+        await retry_later([], 60, self.session)
+        self.session.execute.assert_not_called()
+        self.session.commit.assert_not_called()
+
+    async def test_retry_later(self):
+        await retry_later([3], 60, self.session)
+        stmt = self.session.execute.call_args.args[0]
+        self.assertIn("available_at", str(stmt))
+        self.session.commit.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,7 @@
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, AsyncMock, patch
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
 from src.schemas import UserModel
@@ -11,6 +11,7 @@ from src.repository.users import (
     confirmed_email,
     update_token,
     update_avatar,
+    restore_avatar,
     update_user_password,
 )
 
@@ -18,7 +19,9 @@ from src.repository.users import (
 class TestUsers(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
+        self.result = MagicMock()
+        self.session.execute.return_value = self.result
         self.user = UserModel(
             username='Andrew',
             email='andrew@google.com',
@@ -28,12 +31,12 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_user_by_email(self):
         user = User()
-        self.session.query().filter().first.return_value = user
+        self.result.scalar_one_or_none.return_value = user
         result = await get_user_by_email(email=self.user.email, db=self.session)
         self.assertEqual(result, user)
 
     async def test_get_user_by_email_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.result.scalar_one_or_none.return_value = None
         result = await get_user_by_email(email=self.test_email, db=self.session)
         self.assertIsNone(result)
 
@@ -70,13 +73,24 @@ class TestUsers(unittest.IsolatedAsyncioTestCase):
 
     async def test_update_avatar(self):
         user = User(email=self.user.email)
-        self.session.query().filter().first.return_value = user
+        self.result.scalar_one_or_none.return_value = user
         result = await update_avatar(user.email, "avatar_url", self.session)
         self.assertEqual(result.avatar, user.avatar)
 
+    async def test_restore_avatar(self):
+        self.result.rowcount = 1
+        result = await restore_avatar(self.user.email, "new_url", "old_url", self.session)
+        self.assertTrue(result)
+        self.session.commit.assert_awaited_once()
+
+    async def test_restore_avatar_changed_since(self):
+        self.result.rowcount = 0
+        result = await restore_avatar(self.user.email, "new_url", "old_url", self.session)
+        self.assertFalse(result)
+
     async def test_update_user_password(self):
         user = User(password=self.user.email)
-        self.session.query().filter().first.return_value = user
+        self.result.scalar_one_or_none.return_value = user
         result = await update_avatar(user.email, "test_password", self.session)
         self.assertEqual(result.password, user.password)
 
@@ -0,0 +1,91 @@
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from src.services.avatars import AvatarService, LocalStorage, resize_avatar
+
+
+def image_bytes(width: int, height: int, fmt: str = "PNG") -> bytes:
+    output = BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(output, fmt)
+    return output.getvalue()
+
+
+class TestResizeAvatar(unittest.TestCase):
+
+    def test_resize(self):
+        avatar = resize_avatar(image_bytes(800, 400), size=250)
+        with Image.open(BytesIO(avatar)) as image:
+            self.assertEqual(image.format, "JPEG")
+            self.assertEqual(image.size, (250, 250))
+
+
+class TestAvatarService(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.service = AvatarService(LocalStorage(Path(self.folder.name), "/static/avatars/"), max_bytes=50_000)
+        # a thread pool keeps the test in one process
+        self.service._executor = ThreadPoolExecutor(1)
+
+    def tearDown(self):
+        self.service.close()
+        self.folder.cleanup()
+
+    async def test_read_upload(self):
+        data = image_bytes(300, 300)
+        result = await self.service.read_upload(UploadFile(BytesIO(data), filename="a.png"))
+        self.assertEqual(result, data)
+
+    async def test_read_upload_too_large(self):
+        with self.assertRaises(HTTPException) as err:
+            await self.service.read_upload(UploadFile(BytesIO(b"x" * 50_001), filename="a.bin"))
+        self.assertEqual(err.exception.status_code, 413)
+
+    async def test_read_upload_not_an_image(self):
+        with self.assertRaises(HTTPException) as err:
+            await self.service.read_upload(UploadFile(BytesIO(b"hello"), filename="a.txt"))
+        self.assertEqual(err.exception.status_code, 400)
+
+    async def test_read_upload_too_many_pixels(self):
+        # a warning past the limit, an error past twice the limit
+        for max_pixels in (60_000, 40_000):
+            with patch.object(Image, "MAX_IMAGE_PIXELS", max_pixels):
+                with self.assertRaises(HTTPException) as err:
+                    await self.service.read_upload(UploadFile(BytesIO(image_bytes(300, 300)), filename="a.png"))
+            self.assertEqual(err.exception.status_code, 400)
+
+    def test_key_depends_on_content(self):
+        first, second = image_bytes(10, 10), image_bytes(20, 20)
+        self.assertEqual(self.service.key_for(1, first), self.service.key_for(1, first))
+        self.assertNotEqual(self.service.key_for(1, first), self.service.key_for(1, second))
+        self.assertNotEqual(self.service.key_for(1, first), self.service.key_for(2, first))
+
+    def test_local_storage_stays_in_root(self):
+        storage = self.service.storage
+        for key in ("../../../escaped", "1/../../escaped", "/tmp/escaped"):
+            with self.assertRaises(ValueError):
+                storage._write(key, b"data")
+        self.assertFalse((Path(self.folder.name).parent / "escaped.jpg").exists())
+
+    async def test_store(self):
+        key = self.service.key_for(1, image_bytes(600, 300))
+        self.assertTrue(await self.service.store(key, image_bytes(600, 300)))
+        self.assertEqual(self.service.url_for(key), f"/static/avatars/{key}.jpg")
+        with Image.open(Path(self.folder.name) / f"{key}.jpg") as image:
+            self.assertEqual(image.size, (250, 250))
+
+    async def test_store_failure(self):
+        key = self.service.key_for(1, b"hello")
+        self.assertFalse(await self.service.store(key, b"hello"))
+        self.assertFalse((Path(self.folder.name) / f"{key}.jpg").exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
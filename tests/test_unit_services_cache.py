@@ -0,0 +1,203 @@
+import json
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import redis.asyncio as redis
+
+from src.database.models import User
+from src.services.cache import UserCache, TokenCache, ContactVersions, etag_matches
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = AsyncMock()
+        self.redis.get.return_value = None
+        self.cache = UserCache(self.redis, maxsize=2)
+        self.user = User(id=1, username='deadpool', email='deadpool@example.com', password='hash',
+                         created_at=datetime(2023, 3, 20, 10, 0), avatar='avatar_url', confirmed=True)
+
+    async def test_miss(self):
+        self.assertIsNone(await self.cache.get(self.user.email))
+        self.redis.get.assert_awaited_once_with('user:deadpool@example.com')
+
+    async def test_set_then_local_hit(self):
+        await self.cache.set(self.user)
+        key, raw = self.redis.set.call_args.args
+        self.assertEqual(key, 'user:deadpool@example.com')
+        self.assertEqual(json.loads(raw)['v'], UserCache.VERSION)
+        self.assertEqual(self.redis.set.call_args.kwargs, {'ex': 900})
+
+        cached = await self.cache.get(self.user.email)
+        self.assertIsNot(cached, self.user)
+        self.assertEqual((cached.id, cached.email, cached.created_at, cached.confirmed),
+                         (1, 'deadpool@example.com', datetime(2023, 3, 20, 10, 0), True))
+        self.redis.get.assert_not_awaited()
+
+    async def test_redis_hit_fills_local_tier(self):
+        await self.cache.set(self.user)
+        raw = self.redis.set.call_args.args[1]
+        cache = UserCache(self.redis)
+        self.redis.get.return_value = raw.encode()
+        self.assertEqual((await cache.get(self.user.email)).username, 'deadpool')
+        self.assertEqual((await cache.get(self.user.email)).username, 'deadpool')
+        self.redis.get.assert_awaited_once()
+
+    async def test_other_version_is_a_miss(self):
+        self.redis.get.return_value = json.dumps({'v': UserCache.VERSION + 1, 'email': self.user.email})
+        self.assertIsNone(await self.cache.get(self.user.email))
+
+    async def test_invalidate(self):
+        await self.cache.set(self.user)
+        await self.cache.invalidate(self.user.email)
+        self.assertIsNone(await self.cache.get(self.user.email))
+        self.redis.delete.assert_awaited_once_with('user:deadpool@example.com')
+
+    async def test_lru_eviction(self):
+        for user_id in range(3):
+            await self.cache.set(User(id=user_id, email=f'{user_id}@example.com', created_at=None))
+        self.assertIsNone(await self.cache.get('0@example.com'))
+        self.assertEqual((await self.cache.get('2@example.com')).id, 2)
+
+    async def test_without_redis(self):
+        cache = UserCache()
+        self.assertIsNone(await cache.get(self.user.email))
+        await cache.set(self.user)
+        self.assertEqual((await cache.get(self.user.email)).id, 1)
+        await cache.invalidate(self.user.email)
+        self.assertIsNone(await cache.get(self.user.email))
+
+    async def test_redis_down(self):
+        self.redis.get.side_effect = redis.ConnectionError()
+        self.redis.set.side_effect = redis.ConnectionError()
+        self.assertIsNone(await self.cache.get(self.user.email))
+        await self.cache.set(self.user)
+        self.assertEqual((await self.cache.get(self.user.email)).id, 1)
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TokenCache(maxsize=2)
+        self.payload = {'sub': 'deadpool@example.com', 'scope': 'access_token', 'exp': time.time() + 60}
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(self.cache.get('token'))
+        self.cache.set('token', self.payload)
+        self.assertEqual(self.cache.get('token'), self.payload)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+        self.assertEqual(self.cache.stats()['hit_rate'], 0.5)
+
+    def test_expired_entry_is_dropped(self):
+        self.cache.set('token', {**self.payload, 'exp': time.time() - 1})
+        self.assertIsNone(self.cache.get('token'))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_without_exp_is_not_cached(self):
+        self.cache.set('token', {'sub': 'deadpool@example.com'})
+        self.assertIsNone(self.cache.get('token'))
+
+    def test_lru_eviction(self):
+        for token in ('a', 'b', 'c'):
+            self.cache.set(token, self.payload)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+    def test_disabled(self):
+        cache = TokenCache(maxsize=0)
+        cache.set('token', self.payload)
+        self.assertIsNone(cache.get('token'))
+
+
+class TestContactVersions(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.versions = ContactVersions()
+
+    async def test_stable_until_bumped(self):
+        collection, contact = await self.versions.collection(1), await self.versions.contact(1, 5)
+        self.assertEqual(await self.versions.collection(1), collection)
+        self.assertNotEqual(await self.versions.collection(2), collection)
+
+        await self.versions.bump(1, 5)
+        self.assertNotEqual(await self.versions.collection(1), collection)
+        self.assertNotEqual(await self.versions.contact(1, 5), contact)
+
+    async def test_bump_collection_only(self):
+        contact = await self.versions.contact(1, 5)
+        await self.versions.bump(1)
+        self.assertEqual(await self.versions.contact(1, 5), contact)
+
+    async def test_local_versions_are_bounded(self):
+        self.versions.maxsize = 2
+        first = await self.versions.contact(1, 1)
+        await self.versions.contact(1, 2)
+        await self.versions.contact(1, 3)
+        self.assertEqual(len(self.versions._local), 2)
+        self.assertNotEqual(await self.versions.contact(1, 1), first)
+
+    async def test_missing_key_gets_fresh_version(self):
+        self.versions.redis = AsyncMock()
+        self.versions.redis.get.return_value = None
+        self.versions.redis.set.return_value = True
+        version = await self.versions.collection(1)
+        key, token = self.versions.redis.set.call_args.args
+        self.assertEqual((key, token), ('contacts:version:1', version))
+        self.assertTrue(self.versions.redis.set.call_args.kwargs['nx'])
+
+    async def test_redis_down(self):
+        self.versions.redis = AsyncMock()
+        self.versions.redis.get.side_effect = redis.ConnectionError('down')
+        self.assertIsNone(await self.versions.contact(1, 5))
+
+    def failing_pipeline(self):
+        pipe = AsyncMock()
+        pipe.__aenter__.return_value = pipe
+        pipe.set = MagicMock()
+        pipe.execute.side_effect = redis.ConnectionError('down')
+        self.versions.redis = AsyncMock()
+        self.versions.redis.pipeline = MagicMock(return_value=pipe)
+
+    async def test_failed_bump_deletes_versions(self):
+        self.failing_pipeline()
+        await self.versions.bump(1, 5)
+        self.versions.redis.delete.assert_awaited_once()
+        self.assertEqual(set(self.versions.redis.delete.call_args.args),
+                         {'contacts:version:1', 'contact:version:1:5'})
+
+    async def test_failed_delete_is_retried_before_reads(self):
+        self.failing_pipeline()
+        self.versions.redis.delete.side_effect = redis.ConnectionError('down')
+        await self.versions.bump(1, 5)
+        self.versions.redis.get.return_value = b'stale'
+        self.assertIsNone(await self.versions.collection(1))
+
+        self.versions.redis.delete.side_effect = None
+        self.versions.redis.get.return_value = None
+        self.versions.redis.set.return_value = True
+        self.assertNotIn(await self.versions.collection(1), (None, 'stale'))
+        self.assertEqual(set(self.versions.redis.delete.call_args.args),
+                         {'contacts:version:1', 'contact:version:1:5'})
+
+    async def test_forget(self):
+        contact = await self.versions.contact(1, 5)
+        await self.versions.forget(1, 5)
+        self.assertNotIn('contact:version:1:5', self.versions._local)
+        self.assertNotEqual(await self.versions.contact(1, 5), contact)
+
+
+class TestEtagMatches(unittest.TestCase):
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('"a"', '"a"'))
+        self.assertTrue(etag_matches('"b", W/"a"', '"a"'))
+        self.assertTrue(etag_matches('*', '"a"'))
+        self.assertFalse(etag_matches('"b"', '"a"'))
+        self.assertFalse(etag_matches(None, '"a"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
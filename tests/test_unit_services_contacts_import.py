@@ -0,0 +1,62 @@
+import io
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from src.database.models import User
+from src.services.contacts_import import read_rows, import_contacts
+
+ROW = '{"first_name": "Contact", "last_name": "Test", "email": "%s", "phone": "%s", ' \
+      '"birthday": "1987-05-29", "additional_info": "test info"}\n'
+
+
+class TestContactsImport(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.user = User(id=1)
+        self.session = AsyncMock()
+
+    def test_read_rows_csv(self):
+        file = io.BytesIO(b'first_name,last_name\nContact,"Test, Jr"\n')
+        self.assertEqual(list(read_rows(file, 'csv')), [(1, {'first_name': 'Contact', 'last_name': 'Test, Jr'})])
+
+    def test_read_rows_csv_empty_optional_cell(self):
+        file = io.BytesIO(b'first_name,last_name,additional_info\nContact,,\n')
+        self.assertEqual(list(read_rows(file, 'csv')),
+                         [(1, {'first_name': 'Contact', 'last_name': '', 'additional_info': None})])
+
+    async def test_import_contacts_csv_without_additional_info(self):
+        file = io.BytesIO(b'first_name,last_name,email,phone,birthday,additional_info\n'
+                          b'Contact,Test,a@gmail.com,0950000001,1987-05-29,\n')
+        with patch('src.services.contacts_import.repository_contacts') as repository:
+            repository.create_contacts = AsyncMock(return_value=[1])
+            repository.get_taken_emails_and_phones = AsyncMock(return_value=(set(), set()))
+            result = await import_contacts(file, 'csv', self.user, self.session)
+
+        self.assertEqual(result, {'inserted': 1, 'errors': []})
+        self.assertIsNone(repository.create_contacts.call_args.args[0][0].additional_info)
+
+    def test_read_rows_ndjson(self):
+        file = io.BytesIO(b'{"first_name": "Contact"}\n\n[1]\n{oops\n')
+        self.assertEqual(list(read_rows(file, 'ndjson')),
+                         [(1, {'first_name': 'Contact'}), (2, 'Expected a JSON object'), (3, 'Invalid JSON')])
+
+    async def test_import_contacts(self):
+        file = io.BytesIO((ROW % ('a@gmail.com', '0950000001') +
+                           ROW % ('b@gmail.com', '0950000002') +
+                           ROW % ('a@gmail.com', '0950000003') +
+                           ROW % ('c@gmail.com', '0950000004') +
+                           '{"first_name": "C"}\n').encode())
+        with patch('src.services.contacts_import.repository_contacts') as repository:
+            repository.create_contacts = AsyncMock(side_effect=[[1, None], [3]])
+            repository.get_taken_emails_and_phones = AsyncMock(return_value=({'b@gmail.com'}, set()))
+            result = await import_contacts(file, 'ndjson', self.user, self.session, chunk_size=2)
+
+        self.assertEqual(result['inserted'], 2)
+        self.assertEqual([error['row'] for error in result['errors']], [2, 3, 5])
+        self.assertEqual(result['errors'][0]['error'], 'Email already exists')
+        self.assertEqual(result['errors'][1]['error'], 'Duplicate email in upload')
+        self.assertEqual(repository.create_contacts.await_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
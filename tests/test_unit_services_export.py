@@ -0,0 +1,47 @@
+import unittest
+from datetime import datetime
+
+import orjson
+
+from src.schemas import ContactResponse
+from src.services.export import EXPORT_FIELDS, contact_dicts, ndjson_lines, csv_lines
+
+
+async def rows_of(rows):
+    for row in rows:
+        yield row
+
+
+class TestExport(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.rows = [
+            (1, 'Contact', 'Test', 'contact@gmail.com', '0952589654', datetime(1987, 5, 29), 'test info'),
+            (2, 'Other', 'Test', 'other@gmail.com', '0952589655', datetime(1990, 1, 2), 'more, info'),
+        ]
+
+    async def test_ndjson_lines(self):
+        chunks = [chunk async for chunk in ndjson_lines(rows_of(self.rows), batch_size=1)]
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(chunks[0], '{"id": 1, "first_name": "Contact", "last_name": "Test", '
+                                    '"email": "contact@gmail.com", "phone": "0952589654", '
+                                    '"birthday": "1987-05-29", "additional_info": "test info"}\n')
+
+    async def test_csv_lines(self):
+        text = "".join([chunk async for chunk in csv_lines(rows_of(self.rows))])
+        lines = text.splitlines()
+        self.assertEqual(lines[0], ",".join(EXPORT_FIELDS))
+        self.assertEqual(lines[2], '2,Other,Test,other@gmail.com,0952589655,1990-01-02,"more, info"')
+
+    def test_contact_dicts_match_response_model(self):
+        expected = [ContactResponse(**dict(zip(EXPORT_FIELDS, row))).json(separators=(",", ":"))
+                    for row in self.rows]
+        self.assertEqual([orjson.dumps(contact).decode() for contact in contact_dicts(self.rows)], expected)
+
+    async def test_empty(self):
+        self.assertEqual([chunk async for chunk in ndjson_lines(rows_of([]))], [])
+        self.assertEqual([chunk async for chunk in csv_lines(rows_of([]))], [",".join(EXPORT_FIELDS) + "\r\n"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+from src.services.fuzzy import trigrams, similarity, name_similarity, rank_names, index_trigrams
+
+
+class TestFuzzy(unittest.TestCase):
+
+    def test_trigrams(self):
+        self.assertEqual(trigrams("Cat"), {"  c", " ca", "cat", "at "})
+        self.assertEqual(trigrams("a-B"), {"  a", " a ", "  b", " b "})
+        self.assertEqual(trigrams("!?"), set())
+
+    def test_similarity(self):
+        # the examples of the pg_trgm documentation
+        self.assertAlmostEqual(similarity("word", "two words"), 4 / 11)
+        self.assertEqual(similarity("Wilson", "wilson"), 1.0)
+        self.assertEqual(similarity("wilson", "xyz"), 0.0)
+        self.assertEqual(similarity("", "wilson"), 0.0)
+
+    def test_name_similarity(self):
+        self.assertEqual(name_similarity("wade wilson", "Wade", "Wilson"), 1.0)
+        self.assertEqual(name_similarity("wilsn", "Wade", "Wilsn"), 1.0)
+        self.assertGreater(name_similarity("wilsn", "Wade", "Wilson"), 0.3)
+        self.assertLess(name_similarity("wilsn", "Logan", "Howlett"), 0.1)
+
+    def test_rank_names(self):
+        names = [(1, "Wade", "Wilson"), (2, "Logan", "Howlett"), (3, "Wanda", "Wilsn"), (4, "Wade", "Winston")]
+        self.assertEqual(rank_names("Wilsn", names, 0.3, 10), [3, 1])
+        self.assertEqual(rank_names("wade", names, 0.3, 10), [1, 4])
+        self.assertEqual(rank_names("wade", names, 0.3, 1), [1])
+        self.assertEqual(rank_names("wade", names, 1.1, 10), [])
+
+    def test_index_trigrams(self):
+        self.assertEqual(index_trigrams("Wilsn wil"), ["wil", "ils", "lsn"])
+        self.assertEqual(index_trigrams("Al O"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
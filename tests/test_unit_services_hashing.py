@@ -0,0 +1,41 @@
+import asyncio
+import threading
+import unittest
+
+from src.services.hashing import PasswordHashPool, PoolBusyError
+
+
+class TestPasswordHashPool(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.pool = PasswordHashPool(workers=1, max_queue=1)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.pool.executor.shutdown()
+
+    async def test_run(self):
+        result = await self.pool.run(lambda a, b: a + b, 2, 3)
+        self.assertEqual(result, 5)
+        stats = self.pool.stats()
+        self.assertEqual(stats["completed_total"], 1)
+        self.assertEqual((stats["running"], stats["queued"]), (0, 0))
+
+    async def test_queue_and_reject(self):
+        running = asyncio.ensure_future(self.pool.run(self.release.wait))
+        queued = asyncio.ensure_future(self.pool.run(self.release.wait))
+        await asyncio.sleep(0)
+        self.assertEqual((self.pool.stats()["running"], self.pool.stats()["queued"]), (1, 1))
+
+        with self.assertRaises(PoolBusyError):
+            await self.pool.run(self.release.wait)
+        self.assertEqual(self.pool.stats()["rejected_total"], 1)
+
+        self.release.set()
+        await asyncio.gather(running, queued)
+        self.assertEqual(self.pool.stats()["completed_total"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
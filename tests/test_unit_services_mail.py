@@ -0,0 +1,129 @@
+import asyncio
+import socket
+import unittest
+from unittest.mock import AsyncMock
+from email.message import EmailMessage
+
+from aiosmtpd.controller import Controller
+from aiosmtplib import SMTPServerDisconnected
+
+from src.services.mail import SMTPPool, Mailer
+
+
+class RecordingHandler:
+
+    def __init__(self, reject: set[str] = frozenset()):
+        self.reject = reject
+        self.received = []
+        self.sessions = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.reject:
+            return "550 mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.extend(envelope.rcpt_tos)
+        self.sessions.add(id(session))
+        return "250 Message accepted for delivery"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def message(to: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = "Confirm your email "
+    msg["From"] = "app@example.com"
+    msg["To"] = to
+    msg.set_content("<p>Hi</p>", subtype="html")
+    return msg
+
+
+class TestMailer(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.handler = RecordingHandler(reject={"nobody@example.com"})
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=free_port())
+        self.controller.start()
+        self.pool = SMTPPool(2, hostname="127.0.0.1", port=self.controller.port, timeout=5)
+
+    def tearDown(self):
+        self.controller.stop()
+
+    async def test_batch_shares_a_connection(self):
+        mailer = Mailer(self.pool, backoff=0)
+        recipients = [f"user{i}@example.com" for i in range(20)]
+        self.assertEqual(await mailer.deliver([message(to) for to in recipients]), [])
+        await mailer.close()
+
+        self.assertCountEqual(self.handler.received, recipients)
+        stats = mailer.stats()
+        self.assertEqual((stats["sent_total"], stats["batches_total"]), (20, 1))
+        self.assertEqual(stats["connections_opened_total"], 1)
+        self.assertEqual(len(self.handler.sessions), 1)
+
+    async def test_deliver_all_spreads_batches_over_the_pool(self):
+        mailer = Mailer(self.pool, batch_size=5, backoff=0)
+        recipients = [f"user{i}@example.com" for i in range(20)]
+        self.assertEqual(await mailer.deliver_all([message(to) for to in recipients]), [])
+        await mailer.close()
+
+        self.assertCountEqual(self.handler.received, recipients)
+        self.assertEqual(mailer.batches_total, 4)
+        self.assertEqual(self.pool.opened_total, 2)
+        self.assertEqual(len(self.handler.sessions), 2)
+
+    async def test_nothing_is_sent_past_the_deadline(self):
+        mailer = Mailer(self.pool, batch_size=5, backoff=0)
+        messages = [message(f"user{i}@example.com") for i in range(10)]
+        deadline = asyncio.get_running_loop().time() - 1
+        self.assertEqual(await mailer.deliver_all(messages, deadline), messages)
+
+        self.assertEqual(self.handler.received, [])
+        self.assertEqual((mailer.sent_total, mailer.failed_total), (0, 10))
+
+    async def test_no_retry_past_the_deadline(self):
+        pool = SMTPPool(1, hostname="127.0.0.1", port=free_port(), timeout=5)
+        mailer = Mailer(pool, max_retries=3, backoff=10)
+        deadline = asyncio.get_running_loop().time() + 5
+        await mailer.deliver([message("user@example.com")], deadline)
+
+        self.assertEqual((mailer.sent_total, mailer.failed_total, mailer.retries_total), (0, 1, 0))
+
+    async def test_rejected_recipient_is_not_retried(self):
+        mailer = Mailer(self.pool, backoff=0)
+        await mailer.deliver([message("nobody@example.com"), message("user@example.com")])
+        await self.pool.close()
+
+        self.assertEqual(self.handler.received, ["user@example.com"])
+        self.assertEqual((mailer.sent_total, mailer.failed_total, mailer.retries_total), (1, 1, 0))
+
+    async def test_retry_after_connection_error(self):
+        mailer = Mailer(self.pool, max_retries=2, backoff=0)
+        smtp = await self.pool.acquire()
+        await self.pool.release(smtp)
+        # the server drops the idle pooled connection while it is being used
+        smtp.send_message = AsyncMock(side_effect=SMTPServerDisconnected("Connection lost"))
+
+        await mailer.deliver([message("user@example.com")])
+        await self.pool.close()
+
+        self.assertEqual(self.handler.received, ["user@example.com"])
+        self.assertEqual((mailer.sent_total, mailer.failed_total, mailer.retries_total), (1, 0, 1))
+        self.assertEqual(self.pool.opened_total, 2)
+
+    async def test_gives_up_after_max_retries(self):
+        pool = SMTPPool(1, hostname="127.0.0.1", port=free_port(), timeout=5)
+        mailer = Mailer(pool, max_retries=2, backoff=0)
+        await mailer.deliver([message("user@example.com")])
+
+        self.assertEqual((mailer.sent_total, mailer.failed_total, mailer.retries_total), (0, 1, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from prometheus_client import CollectorRegistry
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.services import metrics
+
+
+class TestRequestMetrics(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        metrics.instrument_engine(self.engine)
+        metrics.instrument_engine(self.engine)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_queries_are_counted_against_the_request(self):
+        stats = metrics.start_request()
+        async with self.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            await conn.execute(text("SELECT 2"))
+        self.assertEqual(stats.db_queries, 2)
+        self.assertGreater(stats.db_ns, 0)
+        self.assertEqual(stats.statements, {"SELECT 1": 1, "SELECT 2": 1})
+        self.assertRegex(metrics.server_timing(stats, stats.db_ns + 1_000_000),
+                         r'^total;dur=\d+\.\d\d, app;dur=1\.00, db;dur=\d+\.\d\d;desc="2 queries", '
+                         r'redis;dur=0\.00;desc="0 commands"$')
+
+    async def test_queries_outside_a_request(self):
+        metrics.current_request.set(None)
+        async with self.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    def test_observe_redis(self):
+        stats = metrics.start_request()
+        metrics.observe_redis("get", 2_000_000)
+        self.assertEqual((stats.redis_commands, stats.redis_ns), (1, 2_000_000))
+
+    def test_observe_request(self):
+        stats = metrics.RequestMetrics()
+        stats.db_queries, stats.db_ns = 3, 500_000_000
+        before = metrics.DB_QUERIES.labels("/test")._value.get()
+        metrics.observe_request("GET", "/test", 200, 10_000_000, stats)
+        self.assertEqual(metrics.DB_QUERIES.labels("/test")._value.get(), before + 3)
+        self.assertEqual(metrics.REQUESTS.labels("GET", "/test", 200)._value.get(), 1)
+
+
+class TestRouteLabel(unittest.TestCase):
+
+    def test_route_label(self):
+        def endpoint():
+            pass
+
+        app = MagicMock(routes=[MagicMock(endpoint=endpoint, path="/api/contacts/{contact_id}")])
+        self.assertEqual(metrics.route_label({"app": app, "endpoint": endpoint}), "/api/contacts/{contact_id}")
+        self.assertEqual(metrics.route_label({"app": app}), metrics.UNMATCHED)
+
+
+class TestTimingMiddleware(unittest.IsolatedAsyncioTestCase):
+
+    async def test_http_request(self):
+        async def app(scope, receive, send):
+            metrics.current_request.get().db_queries += 1
+            await send({"type": "http.response.start", "status": 201, "headers": [(b"x-test", b"1")]})
+            await send({"type": "http.response.body", "body": b""})
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        before = metrics.REQUESTS.labels("POST", metrics.UNMATCHED, 201)._value.get()
+        await metrics.TimingMiddleware(app)({"type": "http", "method": "POST"}, None, send)
+        headers = dict(sent[0]["headers"])
+        self.assertEqual(headers[b"x-test"], b"1")
+        self.assertGreater(float(headers[b"my-process-time"]), 0)
+        self.assertIn(b'desc="1 queries"', headers[b"server-timing"])
+        self.assertEqual(metrics.REQUESTS.labels("POST", metrics.UNMATCHED, 201)._value.get(), before + 1)
+
+    async def test_other_scopes_pass_through(self):
+        app = AsyncMock()
+        await metrics.TimingMiddleware(app)({"type": "lifespan"}, "receive", "send")
+        app.assert_awaited_once_with({"type": "lifespan"}, "receive", "send")
+
+
+class TestStatsCollector(unittest.TestCase):
+
+    def test_collect(self):
+        registry = CollectorRegistry()
+        registry.register(metrics.StatsCollector({"token_cache": lambda: {"hits": 3, "hit_rate": 0.75},
+                                                  "redis_pool": dict}))
+        self.assertEqual(registry.get_sample_value("token_cache_hits"), 3)
+        self.assertEqual(registry.get_sample_value("token_cache_hit_rate"), 0.75)
+
+    def test_engine_pool_stats(self):
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=AsyncAdaptedQueuePool, pool_size=3)
+        self.assertEqual(metrics.engine_pool_stats(engine), {"checked_out": 0, "overflow": 0, "size": 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
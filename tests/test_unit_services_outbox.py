@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.database.models import OutboxEmail
+from src.services.outbox import OutboxWorker
+
+
+class TestOutboxWorker(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.session = AsyncMock()
+        self.session_factory = MagicMock()
+        self.session_factory.return_value.__aenter__.return_value = self.session
+        self.mailer = MagicMock()
+        self.mailer.deliver_all = AsyncMock(return_value=[])
+        self.mailer.close = AsyncMock()
+        self.worker = OutboxWorker(self.session_factory, self.mailer, batch_size=10, poll_interval=0,
+                                   retry_delay=30)
+        self.rows = [OutboxEmail(id=1, kind="confirm_email", email="a@example.com", username="a", host="http://t/"),
+                     OutboxEmail(id=2, kind="password_updated", email="b@example.com", username="b",
+                                 host="http://t/"),
+                     OutboxEmail(id=3, kind="unknown", email="c@example.com", username="c", host="http://t/")]
+
+    @patch("src.services.outbox.repository_outbox")
+    async def test_run_once(self, repository):
+        repository.claim_emails = AsyncMock(return_value=self.rows)
+        repository.mark_sent = AsyncMock()
+        repository.retry_later = AsyncMock()
+        self.mailer.deliver_all.side_effect = lambda messages, deadline: messages[1:]
+
+        claimed = await self.worker.run_once()
+
+        self.assertEqual(claimed, 3)
+        messages, deadline = self.mailer.deliver_all.call_args.args
+        self.assertAlmostEqual(deadline - asyncio.get_running_loop().time(), self.worker.lease / 2, delta=1)
+        self.assertEqual([message["To"] for message in messages], ["a@example.com", "b@example.com"])
+        self.assertEqual(messages[0]["Subject"], "Confirm your email ")
+        repository.mark_sent.assert_awaited_once_with([1], self.session)
+        repository.retry_later.assert_awaited_once_with([3, 2], 30, self.session)
+        self.assertEqual(self.worker.stats(), {"batches_total": 1, "claimed_total": 3, "sent_total": 1,
+                                               "retried_total": 2})
+
+    @patch("src.services.outbox.repository_outbox")
+    async def test_run_once_empty(self, repository):
+        repository.claim_emails = AsyncMock(return_value=[])
+        repository.mark_sent = AsyncMock()
+
+        self.assertEqual(await self.worker.run_once(), 0)
+        self.mailer.deliver_all.assert_not_called()
+        repository.mark_sent.assert_not_called()
+
+    async def test_run_until_stopped(self):
+        async def run_once():
+            self.worker.stop()
+            return 0
+
+        with patch.object(self.worker, "run_once", side_effect=run_once) as mock_run_once:
+            await self.worker.run()
+        mock_run_once.assert_called_once()
+        self.mailer.close.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
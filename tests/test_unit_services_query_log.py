@@ -0,0 +1,59 @@
+import logging
+import unittest
+from unittest.mock import patch
+
+from src.services.query_log import QueryLog
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestQueryLog(unittest.TestCase):
+
+    def setUp(self):
+        self.query_log = QueryLog(slow_ms=50, sample_rate=0.1, repeat_threshold=3,
+                                  logger=logging.getLogger("test.sql"))
+
+    def test_slow_query(self):
+        with self.assertLogs("test.sql", level="WARNING") as logs:
+            self.query_log.observe("SELECT 1", 0.2)
+        self.assertEqual(logs.output, ["WARNING:test.sql:slow query 200.0ms: SELECT 1"])
+
+    def test_sampling(self):
+        with self.assertLogs("test.sql", level="INFO") as logs, \
+                patch("src.services.query_log.random.random", side_effect=[0.05, 0.5]):
+            self.query_log.observe("SELECT 1", 0.001)
+            self.query_log.observe("SELECT 2", 0.001)
+        self.assertEqual(logs.output, ["INFO:test.sql:sampled query 1.0ms: SELECT 1"])
+
+    def test_not_logged(self):
+        self.query_log.sample_rate = 0
+        with self.assertNoLogs("test.sql"):
+            self.query_log.observe("SELECT 1", 0.001)
+            self.query_log.check_request("GET", "/api/contacts/all", {"SELECT 1": 2})
+
+    def test_repeated_statement(self):
+        with self.assertLogs("test.sql", level="WARNING") as logs:
+            self.query_log.check_request("GET", "/api/contacts/all", {"SELECT 1": 1, "SELECT 2": 5})
+        self.assertEqual(logs.output, ["WARNING:test.sql:possible N+1 in GET /api/contacts/all: 5 x SELECT 2"])
+
+    def test_queue_listener(self):
+        handler = ListHandler()
+        self.query_log.start(handler)
+        try:
+            self.query_log.observe("SELECT 1", 0.2)
+        finally:
+            self.query_log.stop()
+        self.assertEqual([record.getMessage() for record in handler.records], ["slow query 200.0ms: SELECT 1"])
+        self.assertEqual(self.query_log.logger.handlers, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
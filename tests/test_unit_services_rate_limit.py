@@ -0,0 +1,137 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+import fakeredis
+import fakeredis.aioredis
+import redis.asyncio as redis
+
+from src.services.rate_limit import RateLimitEngine
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimitEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.engine = RateLimitEngine(clock=self.clock)
+
+    def test_bucket_empties_and_refills(self):
+        for _ in range(10):
+            self.assertEqual(self.engine.acquire("/contacts", "1", 10, 60), 0)
+        self.assertAlmostEqual(self.engine.acquire("/contacts", "1", 10, 60), 6)
+        self.clock.now += 6
+        self.assertEqual(self.engine.acquire("/contacts", "1", 10, 60), 0)
+        self.assertGreater(self.engine.acquire("/contacts", "1", 10, 60), 0)
+        self.assertEqual(self.engine.stats()["allowed"], 11)
+
+    def test_buckets_are_per_route_and_user(self):
+        for _ in range(2):
+            self.engine.acquire("/contacts", "1", 2, 60)
+        self.assertGreater(self.engine.acquire("/contacts", "1", 2, 60), 0)
+        self.assertEqual(self.engine.acquire("/contacts", "2", 2, 60), 0)
+        self.assertEqual(self.engine.acquire("/birthdays", "1", 2, 60), 0)
+
+    def test_sweep_without_redis(self):
+        self.engine.acquire("/contacts", "1", 10, 60)
+        self.engine.acquire("/contacts", "2", 10, 60)
+        self.clock.now += 6
+        self.engine.acquire("/contacts", "2", 10, 60)
+        self.assertEqual(self.engine.sweep(), 1)
+        self.assertEqual(list(self.engine._buckets), [("/contacts", "2")])
+
+    def test_disabled(self):
+        self.engine.enabled = False
+        for _ in range(5):
+            self.assertEqual(self.engine.acquire("/contacts", "1", 1, 60), 0)
+
+
+class TestRateLimitSync(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.clock = Clock()
+        server = fakeredis.FakeServer()
+        self.workers = [RateLimitEngine(fakeredis.aioredis.FakeRedis(server=server), clock=self.clock)
+                        for _ in range(4)]
+
+    async def sync_all(self):
+        for worker in self.workers:
+            await worker.sync()
+
+    async def test_workers_share_the_limit(self):
+        times, seconds, allowed = 20, 60, 0
+        # a client spreads its requests over all workers, as a load balancer would
+        for step in range(600):
+            worker = self.workers[step % len(self.workers)]
+            allowed += worker.acquire("/contacts", "1", times, seconds) == 0
+            self.clock.now += 0.1
+            if step % 10 == 9:
+                await self.sync_all()
+        # 60 seconds allow the burst plus one refill; each worker may overshoot by one sync interval
+        self.assertGreaterEqual(allowed, 2 * times)
+        self.assertLessEqual(allowed, 2 * times + len(self.workers) * 3)
+
+    async def test_without_sync_each_worker_enforces_alone(self):
+        for worker in self.workers:
+            for _ in range(5):
+                worker.acquire("/contacts", "1", 5, 60)
+        self.assertTrue(all(worker.acquire("/contacts", "1", 5, 60) > 0 for worker in self.workers))
+
+    async def test_remote_usage_is_taken_from_local_bucket(self):
+        first, second = self.workers[:2]
+        first.acquire("/contacts", "1", 10, 60)
+        second.acquire("/contacts", "1", 10, 60)
+        await self.sync_all()
+        for _ in range(8):
+            first.acquire("/contacts", "1", 10, 60)
+        await self.sync_all()
+        self.assertEqual(second.acquire("/contacts", "1", 10, 60), 0)
+        self.assertGreater(second.acquire("/contacts", "1", 10, 60), 0)
+
+    async def test_idle_full_buckets_are_dropped(self):
+        worker = self.workers[0]
+        worker.acquire("/contacts", "1", 10, 60)
+        await worker.sync()
+        self.clock.now += 60
+        await worker.sync()
+        self.assertEqual(worker.stats()["buckets"], 0)
+
+    async def test_background_sweep_without_redis(self):
+        engine = RateLimitEngine(sync_interval=0.01, clock=self.clock)
+        engine.start(None)
+        engine.acquire("/contacts", "1", 10, 60)
+        self.clock.now += 6
+        await asyncio.sleep(0.05)
+        self.assertEqual(engine.stats()["buckets"], 0)
+        await engine.stop()
+
+    async def test_redis_error_keeps_pending(self):
+        client = MagicMock()
+        pipe = client.pipeline.return_value.__aenter__.return_value = MagicMock()
+        pipe.execute = AsyncMock(side_effect=redis.ConnectionError("down"))
+        engine = RateLimitEngine(client, clock=self.clock)
+        engine.acquire("/contacts", "1", 10, 60)
+        await engine.sync()
+        self.assertEqual(engine.stats()["sync_errors"], 1)
+        self.assertEqual(engine._buckets[("/contacts", "1")].pending, 1)
+
+    async def test_stop_flushes(self):
+        worker = self.workers[0]
+        worker.start(worker.redis)
+        worker.acquire("/contacts", "1", 10, 60)
+        client = worker.redis
+        await worker.stop()
+        self.assertEqual(await client.get("ratelimit:/contacts:1"), b"1")
+        self.assertIsNone(worker.redis)
+
+
+if __name__ == '__main__':
+    unittest.main()
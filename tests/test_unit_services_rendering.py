@@ -0,0 +1,43 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.services.rendering import TemplateRenderer
+
+
+class TestTemplateRenderer(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name) / "hello.html"
+        self.path.write_text("<p>Hi {{username}}, {{host}}api/{{token}}</p>")
+        self.renderer = TemplateRenderer(Path(self.folder.name), sender="App <app@example.com>")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_build(self):
+        message = self.renderer.template("hello.html", "Hello").build("user@example.com", username="Andrew",
+                                                                     host="http://test/", token="abc")
+        self.assertEqual(message["Subject"], "Hello")
+        self.assertEqual(message["From"], "App <app@example.com>")
+        self.assertEqual(message["To"], "user@example.com")
+        self.assertEqual(message.get_content_type(), "text/html")
+        self.assertEqual(message.get_payload(decode=True).decode(), "<p>Hi Andrew, http://test/api/abc</p>")
+
+    def test_compiled_once(self):
+        template = self.renderer.template("hello.html", "Hello")
+        self.path.write_text("changed")
+        self.assertIs(self.renderer.template("hello.html", "Hello"), template)
+        self.assertEqual(template.render(username="a", host="h/", token="t"), "<p>Hi a, h/api/t</p>")
+
+    def test_build_batch(self):
+        template = self.renderer.template("hello.html", "Hello")
+        messages = template.build_batch([("a@example.com", {"username": "a", "host": "h/", "token": "1"}),
+                                         ("b@example.com", {"username": "b", "host": "h/", "token": "2"})])
+        self.assertEqual([message["To"] for message in messages], ["a@example.com", "b@example.com"])
+        self.assertEqual(messages[1].get_payload(decode=True).decode(), "<p>Hi b, h/api/2</p>")
+
+
+if __name__ == '__main__':
+    unittest.main()